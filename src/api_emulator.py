@@ -0,0 +1,593 @@
+import argparse
+import datetime
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+
+from flask import Flask, jsonify, redirect, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+logger = logging.getLogger(__name__)
+
+# Tidal track ids of the emulated catalog start here
+TIDAL_ID_BASE = 100000000
+TIDAL_USER_ID = 4242
+SPOTIFY_USER_ID = 'emulator'
+# Token both emulated platforms accept; any other bearer token works as well
+ACCESS_TOKEN = 'emulator'
+
+_BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_WORDS = ('after', 'all', 'blue', 'body', 'bright', 'city', 'cold', 'dance', 'dark', 'days', 'dream', 'echo',
+          'electric', 'fire', 'forever', 'ghost', 'gold', 'heart', 'high', 'home', 'light', 'lost', 'love',
+          'midnight', 'moon', 'night', 'ocean', 'paper', 'rain', 'river', 'run', 'silver', 'sky', 'slow',
+          'star', 'summer', 'sun', 'sweet', 'wild', 'wind')
+
+
+def _base62_id(number):
+    # 22 characters, like Spotify ids
+    digits = []
+    while number:
+        number, digit = divmod(number, 62)
+        digits.append(_BASE62[digit])
+    return ''.join(reversed(digits)).rjust(22, '0')
+
+
+def _timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _title(rng, words):
+    return ' '.join(rng.choice(_WORDS) for _ in range(words)).title()
+
+
+class Library:
+    # A made-up music catalog and the user's library on both platforms,
+    # generated from `seed`. Spotify has `playlists` playlists of
+    # `tracks_per_playlist` tracks; the first `shared` share of them also
+    # exist on Tidal, with `drift` of their tracks differing, so a sync has
+    # work to do. `unavailable` of the catalog is missing from Tidal.
+    def __init__(self, playlists=10, tracks_per_playlist=100, favorite_tracks=100, shared=0.5, drift=0.1,
+                 unavailable=0.05, seed=0):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        catalog_size = max(tracks_per_playlist, favorite_tracks, playlists * tracks_per_playlist // 2, 1)
+        artists = [_title(rng, 2) for _ in range(max(10, catalog_size // 10))]
+        albums = [_title(rng, 2) for _ in range(max(10, catalog_size // 12))]
+
+        # (title, artist, album, isrc, duration in seconds, on Tidal)
+        self.songs = []
+        for index in range(catalog_size):
+            self.songs.append((_title(rng, rng.randint(1, 3)), rng.choice(artists), rng.choice(albums),
+                               f'QZEMU{index:07d}', rng.randint(120, 360), rng.random() >= unavailable))
+        self.spotify_ids = [_base62_id(index + 1) for index in range(catalog_size)]
+        self.song_by_spotify_id = {track_id: index for index, track_id in enumerate(self.spotify_ids)}
+        self.song_by_isrc = {song[3]: index for index, song in enumerate(self.songs)}
+        on_tidal = [index for index, song in enumerate(self.songs) if song[5]]
+
+        self.words = {}
+        for index, (title, artist, *_) in enumerate(self.songs):
+            for word in f'{title} {artist}'.lower().split():
+                self.words.setdefault(word, set()).add(index)
+
+        self.spotify_playlists = {}
+        self.tidal_playlists = {}
+        self.next_playlist = 0
+        for number in range(playlists):
+            name = f'{_title(rng, 2)} #{number + 1}'
+            tracks = rng.sample(range(catalog_size), min(tracks_per_playlist, catalog_size))
+            self.spotify_playlists[self.new_playlist_id('spotify')] = {'name': name, 'tracks': tracks, 'version': 1}
+            if number < round(playlists * shared):
+                kept = [index for index in tracks if self.songs[index][5] and rng.random() >= drift]
+                added = rng.sample(on_tidal, min(len(tracks) - len(kept), len(on_tidal)))
+                self.tidal_playlists[self.new_playlist_id('tidal', rng)] = self.tidal_playlist(name, kept + added)
+        self.tidal_favorite_tracks = rng.sample(on_tidal, min(favorite_tracks, len(on_tidal)))
+        self.tidal_favorite_playlists = []
+
+    def new_playlist_id(self, platform, rng=random):
+        self.next_playlist += 1
+        if platform == 'spotify':
+            return _base62_id(62 ** 21 + self.next_playlist)
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    @staticmethod
+    def tidal_playlist(name, tracks, description=''):
+        now = _timestamp()
+        return {'name': name, 'tracks': tracks, 'version': 1, 'description': description, 'created': now,
+                'updated': now}
+
+    def search(self, query, tidal=False):
+        # Songs having every word of the query in their title or artist, the
+        # ones named exactly as the query first
+        words = [word for word in query.lower().split() if ':' not in word]
+        found = None
+        for word in sorted(words, key=lambda word: len(self.words.get(word, ()))):
+            found = self.words.get(word, set()) if found is None else found & self.words.get(word, set())
+            if not found:
+                return []
+
+        def rank(index):
+            title, artist = self.songs[index][:2]
+            return f'{title} {artist}'.lower().split() != words, len(title), index
+
+        return sorted((index for index in found or () if self.songs[index][5] or not tidal), key=rank)
+
+    def spotify_track(self, index):
+        title, artist, album, isrc, duration, _ = self.songs[index]
+        track_id = self.spotify_ids[index]
+        return {'id': track_id, 'name': title, 'uri': f'spotify:track:{track_id}', 'duration_ms': duration * 1000,
+                'artists': [{'name': artist}], 'album': {'name': album}, 'external_ids': {'isrc': isrc}}
+
+    def tidal_track(self, index):
+        title, artist, album, isrc, duration, _ = self.songs[index]
+        artist_json = {'id': zlib.crc32(artist.encode()), 'name': artist}
+        return {'id': TIDAL_ID_BASE + index, 'title': title, 'duration': duration, 'isrc': isrc,
+                'artist': artist_json, 'artists': [artist_json],
+                'album': {'id': zlib.crc32(album.encode()), 'title': album, 'cover': None, 'videoCover': None},
+                'explicit': False, 'allowStreaming': True, 'streamReady': True, 'stemReady': False,
+                'djReady': False, 'adSupportedStreamReady': True, 'trackNumber': 1, 'volumeNumber': 1,
+                'popularity': 0, 'audioQuality': 'LOSSLESS'}
+
+    def tidal_song(self, track_id):
+        index = int(track_id) - TIDAL_ID_BASE
+        if 0 <= index < len(self.songs) and self.songs[index][5]:
+            return index
+        return None
+
+    def tidal_playlist_json(self, playlist_id):
+        playlist = self.tidal_playlists[playlist_id]
+        return {'uuid': playlist_id, 'title': playlist['name'], 'description': playlist['description'],
+                'numberOfTracks': len(playlist['tracks']), 'numberOfVideos': 0,
+                'duration': sum(self.songs[index][4] for index in playlist['tracks']),
+                'created': playlist['created'], 'lastUpdated': playlist['updated'], 'publicPlaylist': False,
+                'popularity': 0, 'type': 'USER', 'image': None, 'squareImage': None, 'promotedArtists': [],
+                'creator': {'id': TIDAL_USER_ID}}
+
+
+class _Quota:
+    # Server side of a rate limit: a token bucket that turns requests away
+    # instead of making them wait
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        # Returns None if the request may go through, or else the seconds
+        # until it would
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    # Logging every request would slow a benchmark down more than the emulated latency
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ApiEmulator:
+    # Local stand-in for the Spotify Web API and the Tidal API endpoints the
+    # clients use, serving a generated Library. Every request is delayed by
+    # `latency` plus up to `jitter` seconds; `rate_limits` maps a platform to
+    # the requests per second it allows before answering 429 with
+    # Retry-After; `error_rate` of the requests fail with `error_status`.
+    def __init__(self, library=None, latency=0.0, jitter=0.0, rate_limits=None, error_rate=0.0, error_status=503,
+                 seed=0):
+        self.library = library or Library(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.quotas = {platform: _Quota(rate) for platform, rate in (rate_limits or {}).items() if rate}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.server = None
+        self.url = None
+        self.app = self._create_app()
+
+    @property
+    def spotify_url(self):
+        return f'{self.url}spotify/'
+
+    @property
+    def tidal_url(self):
+        return f'{self.url}tidal/'
+
+    def start(self, host='localhost', port=0):
+        # Serves from a background thread; port 0 picks a free port
+        self.server = make_server(host, port, self.app, threaded=True, request_handler=_QuietRequestHandler)
+        self.url = f'http://{host}:{self.server.server_port}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"API emulator listening on {self.url}")
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def client_config(self, config):
+        # A copy of `config` pointing both clients at this emulator
+        config = {section: dict(values) for section, values in config.items()}
+        config.setdefault('spotify', {})['base_url'] = self.spotify_url
+        config.setdefault('tidal', {})['base_url'] = self.tidal_url
+        return config
+
+    def stats(self):
+        return {'requests': dict(self.requests), 'statuses': dict(self.statuses)}
+
+    def _error(self, platform, status, message):
+        if platform == 'spotify':
+            response = jsonify({'error': {'status': status, 'message': message}})
+        else:
+            response = jsonify({'status': status, 'subStatus': 0, 'userMessage': message})
+        response.status_code = status
+        return response
+
+    def _before_request(self):
+        platform = request.path.split('/')[1]
+        if platform not in ('spotify', 'tidal'):
+            return None
+        endpoint = request.url_rule.rule if request.url_rule else request.path
+        self.requests[f'{platform} {request.method} {endpoint}'] += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        quota = self.quotas.get(platform)
+        wait = quota.take() if quota else None
+        if wait is not None:
+            response = self._error(platform, 429, 'API rate limit exceeded')
+            response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+            return response
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self._error(platform, self.error_status, 'Injected fault')
+        signing_in = request.path.endswith(('/authorize', '/api/token', '/oauth2/token'))
+        if not signing_in and not request.headers.get('Authorization'):
+            return self._error(platform, 401, 'No token provided')
+        return None
+
+    def _after_request(self, response):
+        platform = request.path.split('/')[1]
+        if platform in ('spotify', 'tidal'):
+            # Spotify answers unchanged GETs with 304, as its Web API does
+            if platform == 'spotify' and request.method == 'GET' and response.status_code == 200:
+                response.add_etag()
+                response.make_conditional(request)
+            self.statuses[f'{platform} {response.status_code}'] += 1
+        return response
+
+    def _create_app(self):
+        app = Flask(__name__)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/emulator/stats', 'stats', lambda: jsonify(self.stats()))
+        self._spotify_routes(app)
+        self._tidal_routes(app)
+        return app
+
+    def _spotify_routes(self, app):
+        library = self.library
+
+        def page(items, limit, offset, maximum):
+            if limit > maximum:
+                return self._error('spotify', 400, f'Invalid limit, at most {maximum} allowed')
+            return jsonify({'items': items[offset:offset + limit], 'total': len(items), 'limit': limit,
+                            'offset': offset, 'next': None})
+
+        def playlist_or_404(playlist_id):
+            playlist = library.spotify_playlists.get(playlist_id)
+            if playlist is None:
+                return None, self._error('spotify', 404, 'Resource not found')
+            return playlist, None
+
+        @app.route('/spotify/authorize')
+        def spotify_authorize():
+            return redirect(f"{request.args['redirect_uri']}?code=emulator&state={request.args.get('state', '')}")
+
+        @app.route('/spotify/api/token', methods=['POST'])
+        def spotify_token():
+            return jsonify({'access_token': ACCESS_TOKEN, 'token_type': 'Bearer', 'expires_in': 3600,
+                            'refresh_token': ACCESS_TOKEN, 'scope': request.form.get('scope', '')})
+
+        @app.route('/spotify/v1/me')
+        def spotify_me():
+            return jsonify({'id': SPOTIFY_USER_ID, 'display_name': 'Emulator'})
+
+        @app.route('/spotify/v1/me/playlists')
+        def spotify_playlists():
+            with library.lock:
+                items = [{'id': playlist_id, 'name': playlist['name'], 'snapshot_id': str(playlist['version']),
+                          'tracks': {'total': len(playlist['tracks'])}}
+                         for playlist_id, playlist in library.spotify_playlists.items()]
+            return page(items, request.args.get('limit', 20, int), request.args.get('offset', 0, int), 50)
+
+        @app.route('/spotify/v1/users/<user_id>/playlists', methods=['POST'])
+        def spotify_create_playlist(user_id):
+            with library.lock:
+                playlist_id = library.new_playlist_id('spotify')
+                library.spotify_playlists[playlist_id] = {'name': request.get_json()['name'], 'tracks': [],
+                                                          'version': 1}
+            response = jsonify({'id': playlist_id, 'name': library.spotify_playlists[playlist_id]['name'],
+                                'snapshot_id': '1'})
+            response.status_code = 201
+            return response
+
+        @app.route('/spotify/v1/playlists/<playlist_id>/items', methods=['GET'])
+        def spotify_playlist_items(playlist_id):
+            playlist, error = playlist_or_404(playlist_id)
+            if error:
+                return error
+            with library.lock:
+                items = [{'track': library.spotify_track(index)} for index in playlist['tracks']]
+            return page(items, request.args.get('limit', 100, int), request.args.get('offset', 0, int), 100)
+
+        @app.route('/spotify/v1/playlists/<playlist_id>/items', methods=['POST'])
+        def spotify_add_items(playlist_id):
+            playlist, error = playlist_or_404(playlist_id)
+            if error:
+                return error
+            uris = request.get_json()
+            if len(uris) > 100:
+                return self._error('spotify', 400, 'You can add a maximum of 100 tracks per request.')
+            songs = [library.song_by_spotify_id.get(uri.rsplit(':', 1)[-1]) for uri in uris]
+            if None in songs:
+                return self._error('spotify', 400, 'Invalid track uri')
+            with library.lock:
+                position = request.args.get('position', len(playlist['tracks']), int)
+                playlist['tracks'][position:position] = songs
+                playlist['version'] += 1
+                response = jsonify({'snapshot_id': str(playlist['version'])})
+            response.status_code = 201
+            return response
+
+        @app.route('/spotify/v1/playlists/<playlist_id>/items', methods=['DELETE'])
+        def spotify_remove_items(playlist_id):
+            playlist, error = playlist_or_404(playlist_id)
+            if error:
+                return error
+            items = request.get_json()['items']
+            if len(items) > 100:
+                return self._error('spotify', 400, 'You can remove a maximum of 100 tracks per request.')
+            with library.lock:
+                removed = set()
+                for item in items:
+                    song = library.song_by_spotify_id.get(item['uri'].rsplit(':', 1)[-1])
+                    positions = item.get('positions')
+                    removed.update(position for position, index in enumerate(playlist['tracks'])
+                                   if index == song and (positions is None or position in positions))
+                playlist['tracks'] = [index for position, index in enumerate(playlist['tracks'])
+                                      if position not in removed]
+                playlist['version'] += 1
+                return jsonify({'snapshot_id': str(playlist['version'])})
+
+        @app.route('/spotify/v1/tracks', strict_slashes=False)
+        def spotify_tracks():
+            ids = request.args.get('ids', '').split(',')
+            if len(ids) > 50:
+                return self._error('spotify', 400, 'Too many ids requested')
+            songs = [library.song_by_spotify_id.get(track_id) for track_id in ids]
+            return jsonify({'tracks': [library.spotify_track(index) if index is not None else None
+                                       for index in songs]})
+
+        @app.route('/spotify/v1/search')
+        def spotify_search():
+            query = request.args.get('q', '')
+            limit, offset = request.args.get('limit', 10, int), request.args.get('offset', 0, int)
+            if query.startswith('isrc:'):
+                index = library.song_by_isrc.get(query[5:])
+                found = [index] if index is not None else []
+            else:
+                found = library.search(query)
+            return jsonify({'tracks': {'items': [library.spotify_track(index) for index in found[offset:offset + limit]],
+                                       'total': len(found), 'limit': limit, 'offset': offset}})
+
+    def _tidal_routes(self, app):
+        library = self.library
+
+        def page(items, status=200):
+            limit, offset = request.args.get('limit', 50, int), request.args.get('offset', 0, int)
+            return jsonify({'limit': limit, 'offset': offset, 'totalNumberOfItems': len(items),
+                            'items': items[offset:offset + limit]}), status
+
+        def user_or_404(user_id):
+            if user_id != TIDAL_USER_ID:
+                return self._error('tidal', 404, 'User not found')
+            return None
+
+        def playlist_or_error(playlist_id, check_etag=False):
+            playlist = library.tidal_playlists.get(playlist_id)
+            if playlist is None:
+                return None, self._error('tidal', 404, 'Playlist not found')
+            etag = request.headers.get('If-None-Match')
+            # Writes name the version they were based on, and fail if the playlist has changed since
+            if check_etag and etag and etag != f'"{playlist["version"]}"':
+                return None, self._error('tidal', 412, 'The playlist has been modified')
+            return playlist, None
+
+        def changed(playlist):
+            playlist['version'] += 1
+            playlist['updated'] = _timestamp()
+
+        @app.route('/tidal/v1/oauth2/token', methods=['POST'])
+        def tidal_token():
+            return jsonify({'access_token': ACCESS_TOKEN, 'refresh_token': ACCESS_TOKEN, 'token_type': 'Bearer',
+                            'expires_in': 86400, 'user': {'userId': TIDAL_USER_ID}})
+
+        @app.route('/tidal/v1/sessions')
+        def tidal_session():
+            return jsonify({'sessionId': str(uuid.uuid4()), 'userId': TIDAL_USER_ID, 'countryCode': 'US'})
+
+        @app.route('/tidal/v1/users/<int:user_id>')
+        def tidal_user(user_id):
+            return user_or_404(user_id) or jsonify({'id': user_id, 'username': 'emulator', 'firstName': 'Tidal',
+                                                    'lastName': 'Emulator', 'email': 'emulator@localhost'})
+
+        @app.route('/tidal/v1/users/<int:user_id>/subscription')
+        def tidal_subscription(user_id):
+            return user_or_404(user_id) or jsonify({'subscription': {'type': 'HIFI'}, 'status': 'ACTIVE'})
+
+        @app.route('/tidal/v1/users/<int:user_id>/playlists')
+        def tidal_playlists(user_id):
+            with library.lock:
+                items = [library.tidal_playlist_json(playlist_id) for playlist_id in library.tidal_playlists]
+            return user_or_404(user_id) or page(items)
+
+        @app.route('/tidal/v1/users/<int:user_id>/favorites/playlists')
+        def tidal_favorite_playlists(user_id):
+            with library.lock:
+                items = [{'created': _timestamp(), 'item': library.tidal_playlist_json(playlist_id)}
+                         for playlist_id in library.tidal_favorite_playlists]
+            return user_or_404(user_id) or page(items)
+
+        @app.route('/tidal/v1/users/<int:user_id>/favorites/tracks')
+        def tidal_favorite_tracks(user_id):
+            items = [{'created': _timestamp(), 'item': library.tidal_track(index)}
+                     for index in library.tidal_favorite_tracks]
+            return user_or_404(user_id) or page(items)
+
+        @app.route('/tidal/v2/my-collection/playlists/folders/create-playlist', methods=['PUT'])
+        def tidal_create_playlist():
+            with library.lock:
+                playlist_id = library.new_playlist_id('tidal')
+                library.tidal_playlists[playlist_id] = library.tidal_playlist(
+                    request.args['name'], [], request.args.get('description', ''))
+                return jsonify({'data': library.tidal_playlist_json(playlist_id)})
+
+        @app.route('/tidal/v1/playlists/<playlist_id>')
+        def tidal_playlist(playlist_id):
+            with library.lock:
+                playlist, error = playlist_or_error(playlist_id)
+                if error:
+                    return error
+                response = jsonify(library.tidal_playlist_json(playlist_id))
+                response.headers['ETag'] = f'"{playlist["version"]}"'
+                return response
+
+        @app.route('/tidal/v1/playlists/<playlist_id>/tracks')
+        def tidal_playlist_tracks(playlist_id):
+            with library.lock:
+                playlist, error = playlist_or_error(playlist_id)
+                if error:
+                    return error
+                return page([library.tidal_track(index) for index in playlist['tracks']])
+
+        @app.route('/tidal/v1/playlists/<playlist_id>/items', methods=['POST'])
+        def tidal_add_items(playlist_id):
+            with library.lock:
+                playlist, error = playlist_or_error(playlist_id, check_etag=True)
+                if error:
+                    return error
+                songs = [library.tidal_song(track_id) for track_id in request.form['trackIds'].split(',')]
+                if None in songs and request.form.get('onArtifactNotFound') != 'SKIP':
+                    return self._error('tidal', 404, 'Track not found')
+                present = set(playlist['tracks']) if request.form.get('onDupes') == 'SKIP' else set()
+                added = [index for index in songs if index is not None and index not in present]
+                position = request.form.get('toIndex', len(playlist['tracks']), int)
+                playlist['tracks'][position:position] = added
+                changed(playlist)
+                return jsonify({'lastUpdated': playlist['updated'],
+                                'addedItemIds': [TIDAL_ID_BASE + index for index in added]})
+
+        @app.route('/tidal/v1/playlists/<playlist_id>/items/<indices>', methods=['DELETE'])
+        def tidal_remove_items(playlist_id, indices):
+            with library.lock:
+                playlist, error = playlist_or_error(playlist_id, check_etag=True)
+                if error:
+                    return error
+                removed = {int(index) for index in indices.split(',')}
+                playlist['tracks'] = [index for position, index in enumerate(playlist['tracks'])
+                                      if position not in removed]
+                changed(playlist)
+                return jsonify({})
+
+        @app.route('/tidal/v1/tracks/<int:track_id>')
+        def tidal_track(track_id):
+            index = library.tidal_song(track_id)
+            if index is None:
+                return self._error('tidal', 404, 'Track not found')
+            return jsonify(library.tidal_track(index))
+
+        @app.route('/tidal/v1/search')
+        def tidal_search():
+            limit, offset = request.args.get('limit', 50, int), request.args.get('offset', 0, int)
+            found = library.search(request.args.get('query', ''), tidal=True)
+            empty = {'limit': limit, 'offset': offset, 'totalNumberOfItems': 0, 'items': []}
+            return jsonify({'artists': empty, 'albums': empty, 'videos': empty, 'playlists': empty, 'topHit': None,
+                            'tracks': dict(empty, totalNumberOfItems=len(found),
+                                           items=[library.tidal_track(index)
+                                                  for index in found[offset:offset + limit]])})
+
+        @app.route('/tidal/openapi/v2/tracks')
+        def tidal_tracks_by_isrc():
+            index = library.song_by_isrc.get(request.args.get('filter[isrc]'))
+            found = [index] if index is not None and library.songs[index][5] else []
+            return jsonify({'data': [{'id': str(TIDAL_ID_BASE + index), 'type': 'tracks'} for index in found]})
+
+
+def store_tokens(db):
+    # Emulator tokens for both platforms, so the clients sign in without the OAuth flows
+    expires_at = (datetime.datetime.now() + datetime.timedelta(days=365)).isoformat()
+    db.store_token('spotify', ACCESS_TOKEN, expires_at)
+    session_data = {'token_type': 'Bearer', 'access_token': ACCESS_TOKEN, 'refresh_token': ACCESS_TOKEN,
+                    'expiry_time': expires_at}
+    db.store_token('tidal', str(session_data), expires_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Spotify and Tidal API emulator")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--playlists", type=int, default=10, help="Spotify playlists in the library")
+    parser.add_argument("--tracks", type=int, default=100, help="Tracks per playlist")
+    parser.add_argument("--favorites", type=int, default=100, help="Tidal favorite tracks")
+    parser.add_argument("--shared", type=float, default=0.5, help="Share of the playlists also on Tidal")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many more seconds at random")
+    parser.add_argument("--spotify-rate", type=float, default=0.0,
+                        help="Spotify requests per second before answering 429 (0: unlimited)")
+    parser.add_argument("--tidal-rate", type=float, default=0.0,
+                        help="Tidal requests per second before answering 429 (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="Status of the failing requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-tokens", action="store_true",
+                        help="Store emulator tokens in the configured database, signing both clients in")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    library = Library(args.playlists, args.tracks, args.favorites, args.shared, seed=args.seed)
+    emulator = ApiEmulator(library, args.latency, args.jitter,
+                           {'spotify': args.spotify_rate, 'tidal': args.tidal_rate},
+                           args.error_rate, args.error_status, args.seed)
+    if args.store_tokens:
+        from config import load_config
+        from database import Database
+        store_tokens(Database(load_config()))
+
+    emulator.start(args.host, args.port)
+    print(f"SPOTIFY_BASE_URL={emulator.spotify_url} TIDAL_BASE_URL={emulator.tidal_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        print(emulator.stats())
+
+
+if __name__ == '__main__':
+    main()
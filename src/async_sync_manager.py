@@ -0,0 +1,405 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import playlist_diff
+import utils
+from models import compact
+from sync_manager import BOTH, SyncError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPlatformClient:
+    # Async facade over a blocking SpotifyClient/TidalClient. Any number of tasks can
+    # await it; only `concurrency` calls are in flight at once, on a fixed pool of
+    # that many threads. Rate limits are honoured by the clients' pooled sessions.
+    def __init__(self, client, concurrency):
+        self.client = client
+        self.write_chunk_size = client.write_chunk_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def call(self, method, *args):
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, partial(getattr(self.client, method), *args))
+
+    async def get_playlists(self):
+        return await self.call('get_playlists')
+
+    async def get_playlist_tracks(self, playlist_id):
+        return await self.call('get_playlist_tracks', playlist_id)
+
+    async def search_tracks(self, query, limit=1):
+        return await self.call('search_tracks', query, limit)
+
+    async def search_candidates(self, track, limit):
+        try:
+            return await self.search_tracks(utils.build_search_query(track), limit)
+        except Exception as e:
+            logger.exception(f"Error searching candidates for {utils.build_search_query(track)}: {str(e)}")
+            return None
+
+    async def search_by_isrc(self, isrc):
+        return await self.call('search_by_isrc', isrc)
+
+    async def get_track_isrcs(self, track_ids):
+        return await self.call('get_track_isrcs', track_ids)
+
+    async def find_track_by_isrc(self, track, isrc):
+        try:
+            return utils.select_matching_track(track, await self.search_by_isrc(isrc))
+        except Exception as e:
+            logger.exception(f"Error finding track by ISRC {isrc}: {str(e)}")
+            return None
+
+    async def create_playlist(self, name):
+        return await self.call('create_playlist', name)
+
+    async def add_tracks_to_playlist(self, playlist_id, track_ids):
+        return await self.call('add_tracks_to_playlist', playlist_id, track_ids)
+
+    async def remove_tracks_from_playlist(self, playlist_id, track_ids, positions=None):
+        return await self.call('remove_tracks_from_playlist', playlist_id, track_ids, positions)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncLibrarySnapshot:
+    # asyncio counterpart of LibrarySnapshot: concurrent tasks asking for the same
+    # listing or track list await a single shared fetch
+    def __init__(self, clients):
+        self.clients = clients
+        self._playlists = {}
+        self._by_name = {}
+        self._tracks = {}
+
+    async def playlists(self, platform):
+        if platform not in self._playlists:
+            self._playlists[platform] = asyncio.ensure_future(self.clients[platform].get_playlists())
+        playlists = await self._playlists[platform]
+        if platform not in self._by_name:
+            self._by_name[platform] = {}
+            for playlist in playlists:
+                self._by_name[platform].setdefault(playlist['name'], playlist)
+        return playlists
+
+    async def reload_playlists(self, platform):
+        self._playlists.pop(platform, None)
+        self._by_name.pop(platform, None)
+        return await self.playlists(platform)
+
+    async def playlist_by_name(self, platform, name):
+        await self.playlists(platform)
+        return self.listed_playlist_by_name(platform, name)
+
+    def listed_playlist_by_name(self, platform, name):
+        # Lookup in a listing already awaited
+        return self._by_name[platform].get(name)
+
+    async def playlist_by_id(self, platform, playlist_id):
+        return next((p for p in await self.playlists(platform) if p['id'] == playlist_id), None)
+
+    async def add_playlist(self, platform, playlist):
+        (await self.playlists(platform)).append(playlist)
+        self._by_name[platform].setdefault(playlist['name'], playlist)
+        empty = asyncio.get_running_loop().create_future()
+        empty.set_result([])
+        self._tracks[(platform, playlist['id'])] = empty
+
+    async def tracks(self, platform, playlist_id):
+        key = (platform, playlist_id)
+        if key not in self._tracks:
+            self._tracks[key] = asyncio.ensure_future(self._fetch_tracks(platform, playlist_id))
+        return await self._tracks[key]
+
+    async def _fetch_tracks(self, platform, playlist_id):
+        return compact(await self.clients[platform].get_playlist_tracks(playlist_id))
+
+    def invalidate_tracks(self, platform, playlist_id):
+        self._tracks.pop((platform, playlist_id), None)
+
+
+class AsyncSyncManager:
+    # Runs the same sync as SyncManager, but overlaps all fetches, searches and
+    # writes of a run on one event loop. Reuses the SyncManager's database and
+    # authenticated clients; database work runs on a thread of its own so it
+    # never blocks the loop.
+    def __init__(self, sync_manager):
+        self.sync_manager = sync_manager
+        self.db = sync_manager.db
+        self.platform_concurrency = sync_manager.platform_concurrency
+        self.clients = None
+        self.snapshot = None
+        self._db_executor = None
+        # Track lookups of the run, settled or in flight, by (platform, track id)
+        self.track_lookups = {}
+
+    def open_clients(self):
+        self.clients = {
+            platform: AsyncPlatformClient(self.sync_manager.get_client(platform),
+                                          self.platform_concurrency[platform])
+            for platform in ('spotify', 'tidal')
+        }
+        self.snapshot = AsyncLibrarySnapshot(self.clients)
+        self.track_lookups = {}
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+
+    def close_clients(self):
+        for client in self.clients.values():
+            client.close()
+        self._db_executor.shutdown(wait=True)
+        self.clients = None
+        self.snapshot = None
+        self._db_executor = None
+
+    async def in_database(self, function, *args):
+        # Runs blocking database (and match index) work off the event loop, one
+        # call at a time
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, partial(function, *args))
+
+    async def sync_all_playlists(self):
+        self.open_clients()
+        try:
+            spotify_playlists, tidal_playlists = await asyncio.gather(self.snapshot.playlists('spotify'),
+                                                                      self.snapshot.playlists('tidal'))
+            spotify_playlists, tidal_playlists = list(spotify_playlists), list(tidal_playlists)
+            await self.in_database(self.db.cache_playlists, 'spotify', spotify_playlists)
+            await self.in_database(self.db.cache_playlists, 'tidal', tidal_playlists)
+            work, skipped = await self.in_database(self.sync_manager.select_changed_playlists, spotify_playlists,
+                                                   tidal_playlists)
+            report = await self.sync_many(work)
+            report['skipped'] = skipped
+
+            if any(result['added'] or result['removed'] for result in report['synced']):
+                spotify_playlists, tidal_playlists = await asyncio.gather(
+                    self.snapshot.reload_playlists('spotify'), self.snapshot.reload_playlists('tidal'))
+            await self.in_database(self.sync_manager.record_playlist_versions, report, spotify_playlists,
+                                   tidal_playlists)
+            return report
+        finally:
+            self.close_clients()
+
+    async def sync_specific_playlists(self, playlist_names):
+        self.open_clients()
+        try:
+            await asyncio.gather(self.snapshot.playlists('spotify'), self.snapshot.playlists('tidal'))
+            work = self.sync_manager.select_named_playlists(playlist_names, self.snapshot.listed_playlist_by_name)
+            return await self.sync_many(work)
+        finally:
+            self.close_clients()
+
+    async def sync_many(self, work):
+        groups = {}
+        for item, source_platform in work:
+            groups.setdefault(item['name'], []).append((item, source_platform))
+
+        report = {'synced': [], 'failed': []}
+
+        async def sync_group(group):
+            for item, source_platform in group:
+                try:
+                    if source_platform == BOTH:
+                        result = await self.sync_pair(item['spotify'], item['tidal'])
+                    else:
+                        result = await self.sync_playlist(item, source_platform)
+                    report['synced'].append(result)
+                except SyncError as e:
+                    report['failed'].append({'playlist': item['name'], 'platform': source_platform,
+                                             'error': str(e)})
+
+        await asyncio.gather(*(sync_group(group) for group in groups.values()))
+        logger.info(f"Synced {len(report['synced'])} playlists, {len(report['failed'])} failed")
+        return report
+
+    async def fetch_tracks(self, platform, playlist_id):
+        tracks = await self.snapshot.tracks(platform, playlist_id)
+        await self.in_database(self.sync_manager.catalog_tracks, platform, tracks)
+        return tracks
+
+    async def match_tracks(self, operations, source_platform):
+        # Each track is looked up once per run: a track another playlist is
+        # already looking up, or looked up earlier, is awaited instead
+        loop = asyncio.get_running_loop()
+        owned = {}
+        waiting = {}
+        for op in playlist_diff.inserts(operations):
+            track = op['track']
+            key = (source_platform, track['id'])
+            if track['id'] in owned or track['id'] in waiting:
+                continue
+            if key in self.track_lookups:
+                waiting[track['id']] = self.track_lookups[key]
+            else:
+                self.track_lookups[key] = loop.create_future()
+                owned[track['id']] = track
+
+        try:
+            matches = await self.lookup_tracks(list(owned.values()), source_platform)
+        except BaseException as e:
+            for track_id in owned:
+                self.track_lookups.pop((source_platform, track_id)).set_exception(e)
+            raise
+        for track_id in owned:
+            self.track_lookups[(source_platform, track_id)].set_result(matches.get(track_id))
+        for track_id, lookup in waiting.items():
+            matches[track_id] = await lookup
+        return matches
+
+    async def lookup_tracks(self, tracks, source_platform):
+        # Same resolution order as SyncManager.lookup_tracks, with the lookups
+        # of all tracks in flight together
+        target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+        matches = {}
+
+        def known_matches():
+            unknown = []
+            for track in tracks:
+                matches[track['id']] = self.sync_manager.known_match(track, source_platform, target_platform)
+                if matches[track['id']] is None:
+                    unknown.append(track)
+            return self.sync_manager.skip_recent_misses(unknown, source_platform, target_platform, matches)
+
+        unknown = await self.in_database(known_matches)
+
+        isrcs = await self.hydrate_isrcs(unknown, source_platform)
+        found = await asyncio.gather(*(self.match_track(track, isrcs.get(track['id']), source_platform,
+                                                        target_platform) for track in unknown))
+        matches.update(zip((track['id'] for track in unknown), found))
+
+        # Text search for the rest, with all their candidates scored in one batch
+        unresolved = [track for track in unknown if matches[track['id']] is None]
+        if unresolved:
+            target_client = self.clients[target_platform]
+            candidate_lists = await asyncio.gather(*(
+                target_client.search_candidates(track, self.sync_manager.search_candidates) for track in unresolved))
+            scored = utils.score_matches(unresolved, candidate_lists, self.sync_manager.match_threshold)
+
+            def store_results():
+                missed = []
+                for track in unresolved:
+                    match, score = scored[track['id']]
+                    if match:
+                        self.sync_manager.remember_match(track, source_platform, match, target_platform, 'search',
+                                                         score)
+                    elif score is not None:
+                        missed.append(track['id'])
+                    matches[track['id']] = match
+                self.db.store_track_misses(source_platform, missed)
+
+            await self.in_database(store_results)
+        return matches
+
+    async def hydrate_isrcs(self, tracks, source_platform):
+        isrcs = await self.in_database(self.sync_manager.known_isrcs, tracks, source_platform)
+        missing = [track['id'] for track in tracks if track['id'] not in isrcs]
+        if missing:
+            try:
+                fetched = await self.clients[source_platform].get_track_isrcs(missing)
+            except Exception as e:
+                logger.error(f"Error fetching ISRCs from {source_platform}: {str(e)}")
+                return isrcs
+            await self.in_database(self.sync_manager.store_isrcs, source_platform, missing, fetched)
+            isrcs.update(fetched)
+        return isrcs
+
+    async def match_track(self, track, isrc, source_platform, target_platform):
+        # Resolves a track from the local index or by ISRC, None if neither knows it
+        match, method, confidence = await self.in_database(self.sync_manager.index_match, track, isrc,
+                                                           target_platform)
+        if match is None and isrc:
+            match = await self.clients[target_platform].find_track_by_isrc(track, isrc)
+            method = 'isrc'
+        if match:
+            await self.in_database(self.sync_manager.remember_match, track, source_platform, match, target_platform,
+                                   method, confidence)
+        return match
+
+    async def sync_playlist(self, playlist, source_platform='spotify'):
+        target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+        with self.sync_manager._sync_errors(playlist['name']):
+            source_tracks, target_playlist = await asyncio.gather(
+                self.fetch_tracks(source_platform, playlist['id']),
+                self.snapshot.playlist_by_name(target_platform, playlist['name']))
+            target_tracks = [] if target_playlist is None else await self.fetch_tracks(target_platform,
+                                                                                           target_playlist['id'])
+
+            operations = await self.in_database(self.sync_manager.diff_playlist_tracks, source_tracks,
+                                                source_platform, target_tracks, target_platform)
+            matches = await self.match_tracks(operations, source_platform)
+            entry = self.sync_manager.build_plan_entry(playlist, source_platform, target_playlist, target_tracks,
+                                                       operations, matches, source_tracks=source_tracks)
+            return await self.apply_entry(entry)
+
+    async def sync_pair(self, spotify_playlist, tidal_playlist):
+        with self.sync_manager._sync_errors(spotify_playlist['name']):
+            spotify_tracks, tidal_tracks = await asyncio.gather(
+                self.fetch_tracks('spotify', spotify_playlist['id']),
+                self.fetch_tracks('tidal', tidal_playlist['id']))
+            tidal_operations, spotify_operations = await self.in_database(
+                self.sync_manager.merge_pair_tracks, spotify_playlist, tidal_playlist, spotify_tracks, tidal_tracks)
+
+            matches = await asyncio.gather(self.match_tracks(tidal_operations, 'spotify'),
+                                           self.match_tracks(spotify_operations, 'tidal'))
+            entries = self.sync_manager.build_pair_entries(spotify_playlist, tidal_playlist, spotify_tracks,
+                                                           tidal_tracks, (tidal_operations, spotify_operations),
+                                                           matches)
+
+            results = await asyncio.gather(*(self.apply_entry(entry) for entry in entries))
+            await self.in_database(self.sync_manager.record_pair_base, entries, results)
+            return self.sync_manager.pair_result(entries, results)
+
+    async def create_target_playlist(self, platform, name):
+        try:
+            playlist_id = await self.clients[platform].create_playlist(name)
+        except Exception as e:
+            raise self.sync_manager.creation_error(platform, name, e)
+        await self.snapshot.add_playlist(platform, {'id': playlist_id, 'name': name, 'tracks': 0})
+        return playlist_id
+
+    async def write_in_chunks(self, write, playlist_id, items, chunk_size, action, playlist_name, platform):
+        # SyncManager._write_in_chunks, with each write awaited
+        written = 0
+        errors = []
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            try:
+                await write(playlist_id, chunk)
+                written += len(chunk)
+            except Exception as e:
+                errors.append(self.sync_manager.chunk_write_error(action, start, chunk, playlist_name, platform, e))
+        return written, errors
+
+    async def apply_entry(self, entry):
+        # Same steps as SyncManager.apply_playlist_plan. Chunks of one playlist
+        # are written in order: removals first, highest position first
+        with self.sync_manager._sync_errors(entry['name']):
+            target_platform = entry['target_platform']
+            target_client = self.clients[target_platform]
+
+            if entry['create']:
+                target_playlist_id = await self.create_target_playlist(target_platform, entry['name'])
+            else:
+                target_playlist_id = entry['target_id']
+
+            self.sync_manager.check_target_version(
+                entry, await self.snapshot.playlist_by_id(target_platform, target_playlist_id))
+
+            removals = entry['remove']
+            uris_to_add = [track['id'] for track in entry['add']]
+
+            removed, removal_errors = await self.write_in_chunks(
+                self.sync_manager._removal_writer(target_client), target_playlist_id, removals,
+                target_client.write_chunk_size, 'removing', entry['name'], target_platform)
+            added, add_errors = await self.write_in_chunks(
+                target_client.add_tracks_to_playlist, target_playlist_id, uris_to_add, target_client.write_chunk_size,
+                'adding', entry['name'], target_platform)
+            errors = removal_errors + add_errors
+            if removals or uris_to_add:
+                self.snapshot.invalidate_tracks(target_platform, target_playlist_id)
+            return await self.in_database(self.sync_manager.record_applied_entry, entry, target_playlist_id, added,
+                                          removed, errors)
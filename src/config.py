@@ -8,10 +8,29 @@ def load_config():
         'spotify': {
             'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
             'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
+            'requests_per_second': float(os.getenv('SPOTIFY_REQUESTS_PER_SECOND', '5')),
+            'response_cache_mb': float(os.getenv('SPOTIFY_RESPONSE_CACHE_MB', '64')),
+            'base_url': os.getenv('SPOTIFY_BASE_URL'),
         },
         'tidal': {
             'client_id': os.getenv('TIDAL_CLIENT_ID'),
             'client_secret': os.getenv('TIDAL_CLIENT_SECRET'),
+            'write_chunk_size': int(os.getenv('TIDAL_WRITE_CHUNK_SIZE', '50')),
+            'requests_per_second': float(os.getenv('TIDAL_REQUESTS_PER_SECOND', '5')),
+            'base_url': os.getenv('TIDAL_BASE_URL'),
+        },
+        'sync': {
+            'jobs': int(os.getenv('SYNC_JOBS', '1')),
+            'spotify_concurrency': int(os.getenv('SPOTIFY_CONCURRENCY', '4')),
+            'tidal_concurrency': int(os.getenv('TIDAL_CONCURRENCY', '4')),
+            'page_concurrency': int(os.getenv('PAGE_CONCURRENCY', '4')),
+            'search_candidates': int(os.getenv('SEARCH_CANDIDATES', '5')),
+            'match_threshold': float(os.getenv('MATCH_THRESHOLD', '0.7')),
+            'miss_ttl_days': float(os.getenv('MATCH_MISS_TTL_DAYS', '7')),
+        },
+        'http': {
+            'connect_timeout': float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+            'read_timeout': float(os.getenv('HTTP_READ_TIMEOUT', '30')),
         },
         'database': {
             'path': os.getenv('DATABASE_PATH', 'spotify_tidal_sync.db'),
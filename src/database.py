@@ -1,30 +1,37 @@
+import ast
+import json
 import sqlite3
 import logging
 import utils
 import threading
+import time
+from models import Track, to_json
 
 logger = logging.getLogger(__name__)
 
 class Database:
-    _local = threading.local()
-
     def __init__(self, config):
         self.db_path = config['database']['path']
+        self._local = threading.local()
+        self._shared_conn = None
+        if self.db_path == ':memory:':
+            # An in-memory database only exists on the connection that created it,
+            # so worker threads have to share that connection instead of opening their own
+            self._shared_conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.create_tables()
 
     def get_connection(self):
+        if self._shared_conn is not None:
+            return self._shared_conn
         if not hasattr(self._local, 'conn'):
-            self._local.conn = sqlite3.connect(self.db_path)
+            # Each thread gets its own connection; the timeout lets concurrent
+            # sync workers wait for each other's writes instead of failing
+            self._local.conn = sqlite3.connect(self.db_path, timeout=30)
         return self._local.conn
 
-    def create_tables(self):
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            # ... (rest of the create_tables method remains the same)
-        except sqlite3.Error as e:
-            logger.error(f"Error creating tables: {e}")
-            raise
+    @property
+    def conn(self):
+        return self.get_connection()
 
     def create_tables(self):
         conn = self.get_connection()
@@ -48,6 +55,75 @@ class Database:
                     PRIMARY KEY (platform, track_id)
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS track_isrcs (
+                    platform TEXT,
+                    track_id TEXT,
+                    isrc TEXT,
+                    PRIMARY KEY (platform, track_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS track_misses (
+                    platform TEXT,
+                    track_id TEXT,
+                    missed_at TEXT,
+                    PRIMARY KEY (platform, track_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS track_matches (
+                    spotify_id TEXT,
+                    tidal_id TEXT,
+                    confidence REAL,
+                    method TEXT,
+                    matched_at TEXT,
+                    PRIMARY KEY (spotify_id, tidal_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS track_matches_tidal_id ON track_matches (tidal_id)
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS playlist_pairs (
+                    spotify_id TEXT,
+                    tidal_id TEXT,
+                    spotify_version TEXT,
+                    tidal_version TEXT,
+                    synced_at TEXT,
+                    PRIMARY KEY (spotify_id, tidal_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS playlist_pair_base (
+                    spotify_id TEXT,
+                    tidal_id TEXT,
+                    platform TEXT,
+                    tracks TEXT,
+                    synced_at TEXT,
+                    PRIMARY KEY (spotify_id, tidal_id, platform)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    status TEXT
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_journal (
+                    run_id INTEGER,
+                    item_key TEXT,
+                    name TEXT,
+                    status TEXT,
+                    entries TEXT,
+                    result TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (run_id, item_key)
+                )
+            ''')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS tokens (
                     platform TEXT PRIMARY KEY,
@@ -55,6 +131,19 @@ class Database:
                     expires_at TEXT
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    body BLOB,
+                    size INTEGER,
+                    used_at REAL
+                )
+            ''')
+            # Covers both the total size and the least recently used order
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS http_cache_used_at ON http_cache (used_at, size)
+            ''')
             conn.commit()
         except sqlite3.Error as e:
             logger.error(f"Error creating tables: {e}")
@@ -95,7 +184,237 @@ class Database:
             WHERE platform = ? AND track_id = ?
         ''', (platform, track_id))
         result = cursor.fetchone()
-        return eval(result[0]) if result else None
+        return ast.literal_eval(result[0]) if result else None
+
+    def cache_tracks(self, platform, tracks):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO tracks (platform, track_id, metadata)
+            VALUES (?, ?, ?)
+        ''', [(platform, track['id'], str(track)) for track in tracks])
+        conn.commit()
+
+    def get_cached_tracks(self, platform):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT metadata FROM tracks WHERE platform = ?
+        ''', (platform,))
+        return [Track.from_mapping(ast.literal_eval(metadata)) for metadata, in cursor.fetchall()]
+
+    def store_track_isrcs(self, platform, isrcs):
+        # A None ISRC records that the track has none, so it is not looked up again
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO track_isrcs (platform, track_id, isrc)
+            VALUES (?, ?, ?)
+        ''', [(platform, track_id, isrc) for track_id, isrc in isrcs.items()])
+        conn.commit()
+
+    def get_track_isrcs(self, platform, track_ids):
+        # Returns {track_id: isrc} for the tracks whose ISRC is known, keyed by
+        # the ids as given even though they are stored as text
+        ids_by_text = {str(track_id): track_id for track_id in track_ids}
+        keys = list(ids_by_text)
+        isrcs = {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f'''
+                SELECT track_id, isrc FROM track_isrcs
+                WHERE platform = ? AND track_id IN ({', '.join('?' * len(chunk))})
+            ''', [platform] + chunk)
+            for track_id, isrc in cursor.fetchall():
+                isrcs[ids_by_text[track_id]] = isrc
+        return isrcs
+
+    def store_track_misses(self, platform, track_ids):
+        # Records source tracks for which the other platform had no match
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        missed_at = utils.get_current_timestamp()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO track_misses (platform, track_id, missed_at)
+            VALUES (?, ?, ?)
+        ''', [(platform, track_id, missed_at) for track_id in track_ids])
+        conn.commit()
+
+    def get_track_misses(self, platform, track_ids, since):
+        # Returns the ids among track_ids recorded as missed at or after `since`
+        ids_by_text = {str(track_id): track_id for track_id in track_ids}
+        keys = list(ids_by_text)
+        missed = set()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f'''
+                SELECT track_id FROM track_misses
+                WHERE platform = ? AND missed_at >= ? AND track_id IN ({', '.join('?' * len(chunk))})
+            ''', [platform, since] + chunk)
+            missed.update(ids_by_text[track_id] for track_id, in cursor.fetchall())
+        return missed
+
+    def clear_track_misses(self, platform=None):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if platform is None:
+            cursor.execute('DELETE FROM track_misses')
+        else:
+            cursor.execute('DELETE FROM track_misses WHERE platform = ?', (platform,))
+        conn.commit()
+        return cursor.rowcount
+
+    def store_track_match(self, spotify_id, tidal_id, confidence, method):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO track_matches (spotify_id, tidal_id, confidence, method, matched_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (spotify_id, tidal_id, confidence, method, utils.get_current_timestamp()))
+        conn.commit()
+
+    def get_track_match(self, platform, track_id):
+        # The best and most recent match of a track on either platform
+        column = {'spotify': 'spotify_id', 'tidal': 'tidal_id'}[platform]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT spotify_id, tidal_id, confidence, method, matched_at FROM track_matches
+            WHERE {column} = ?
+            ORDER BY confidence DESC, matched_at DESC
+            LIMIT 1
+        ''', (track_id,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+        return dict(zip(('spotify_id', 'tidal_id', 'confidence', 'method', 'matched_at'), result))
+
+    def get_track_counterparts(self, platform, track_ids):
+        # Returns {track_id: id of its best match on the other platform, as text}
+        # for the tracks matched before
+        column, other = {'spotify': ('spotify_id', 'tidal_id'), 'tidal': ('tidal_id', 'spotify_id')}[platform]
+        ids_by_text = {str(track_id): track_id for track_id in track_ids}
+        keys = list(ids_by_text)
+        counterparts = {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            # Best and most recent last, so it is the one kept
+            cursor.execute(f'''
+                SELECT {column}, {other} FROM track_matches
+                WHERE {column} IN ({', '.join('?' * len(chunk))})
+                ORDER BY confidence, matched_at
+            ''', chunk)
+            for track_id, counterpart_id in cursor.fetchall():
+                counterparts[ids_by_text[track_id]] = counterpart_id
+        return counterparts
+
+    def store_playlist_pair_versions(self, spotify_id, tidal_id, spotify_version, tidal_version):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO playlist_pairs (spotify_id, tidal_id, spotify_version, tidal_version, synced_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (spotify_id, tidal_id, spotify_version, tidal_version, utils.get_current_timestamp()))
+        conn.commit()
+
+    def get_playlist_pair_versions(self, spotify_id, tidal_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT spotify_version, tidal_version FROM playlist_pairs
+            WHERE spotify_id = ? AND tidal_id = ?
+        ''', (spotify_id, tidal_id))
+        result = cursor.fetchone()
+        return tuple(result) if result else None
+
+    def store_playlist_pair_base(self, spotify_id, tidal_id, tracks_by_platform):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        synced_at = utils.get_current_timestamp()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO playlist_pair_base (spotify_id, tidal_id, platform, tracks, synced_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(spotify_id, tidal_id, platform, json.dumps(tracks, default=to_json), synced_at)
+              for platform, tracks in tracks_by_platform.items()])
+        conn.commit()
+
+    def get_playlist_pair_base(self, spotify_id, tidal_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT platform, tracks FROM playlist_pair_base
+            WHERE spotify_id = ? AND tidal_id = ?
+        ''', (spotify_id, tidal_id))
+        rows = cursor.fetchall()
+        return {platform: json.loads(tracks) for platform, tracks in rows} if rows else None
+
+    def start_sync_run(self):
+        # Only the latest unfinished run can be resumed, so a new run drops the
+        # journal of any run it supersedes
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM sync_journal WHERE run_id IN (SELECT run_id FROM sync_runs WHERE status = 'running')
+        ''')
+        cursor.execute("DELETE FROM sync_runs WHERE status = 'running'")
+        cursor.execute('''
+            INSERT INTO sync_runs (started_at, status) VALUES (?, 'running')
+        ''', (utils.get_current_timestamp(),))
+        conn.commit()
+        return cursor.lastrowid
+
+    def get_unfinished_sync_run(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT run_id FROM sync_runs WHERE status = 'running'
+            ORDER BY run_id DESC LIMIT 1
+        ''')
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def finish_sync_run(self, run_id):
+        # A finished run is never resumed, so its journal is dropped with it
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM sync_journal WHERE run_id = ?', (run_id,))
+        cursor.execute('DELETE FROM sync_runs WHERE run_id = ?', (run_id,))
+        conn.commit()
+
+    def store_journal_item(self, run_id, item_key, name, status, entries=None, result=None):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO sync_journal (run_id, item_key, name, status, entries, result, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (run_id, item_key) DO UPDATE SET
+                status = excluded.status,
+                entries = COALESCE(excluded.entries, sync_journal.entries),
+                result = COALESCE(excluded.result, sync_journal.result),
+                updated_at = excluded.updated_at
+        ''', (run_id, item_key, name, status,
+              json.dumps(entries, default=to_json) if entries is not None else None,
+              json.dumps(result, default=to_json) if result is not None else None,
+              utils.get_current_timestamp()))
+        conn.commit()
+
+    def get_journal_item(self, run_id, item_key):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT status, entries FROM sync_journal
+            WHERE run_id = ? AND item_key = ?
+        ''', (run_id, item_key))
+        result = cursor.fetchone()
+        if not result:
+            return None, None
+        return result[0], json.loads(result[1]) if result[1] else None
 
     def store_token(self, platform, token, expires_at):
         conn = self.get_connection()
@@ -147,6 +466,46 @@ class Database:
         cursor.execute('DELETE FROM tracks WHERE platform = ?', (platform,))
         conn.commit()
 
+    def get_cached_response(self, url):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT etag, body FROM http_cache WHERE url = ?', (url,))
+        return cursor.fetchone()
+
+    def store_cached_response(self, url, etag, body, max_bytes):
+        # Stores the body, then, only once the cache holds more than max_bytes,
+        # evicts the least recently used bodies until it fits again
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO http_cache (url, etag, body, size, used_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (url, etag, body, len(body), time.time()))
+        cursor.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache')
+        excess = cursor.fetchone()[0] - max_bytes
+        if excess > 0:
+            evicted = []
+            cursor.execute('SELECT url, size FROM http_cache ORDER BY used_at')
+            for cached_url, size in cursor:
+                evicted.append((cached_url,))
+                excess -= size
+                if excess <= 0:
+                    break
+            cursor.executemany('DELETE FROM http_cache WHERE url = ?', evicted)
+        conn.commit()
+
+    def touch_cached_response(self, url):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE http_cache SET used_at = ? WHERE url = ?', (time.time(), url))
+        conn.commit()
+
+    def clear_cached_responses(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM http_cache')
+        conn.commit()
+
     def clear_token(self, platform):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -0,0 +1,112 @@
+import threading
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limiter import TokenBucket
+
+_sessions = {}
+_lock = threading.Lock()
+
+# Server errors worth sending an idempotent request again for; throttling is
+# left to the limiter, and POSTs are never repeated as they may have landed
+SERVER_ERRORS = (500, 502, 503, 504)
+
+
+class PooledSession(requests.Session):
+    # requests.Session keeping up to `pool_size` connections per host alive,
+    # and applying `timeout` to every request that does not set its own. With
+    # a limiter, every request waits for its token, and a throttled one is
+    # sent again once the limiter's pause is over, up to max_retries times.
+    # With a response cache, GETs are revalidated against the stored copy.
+    # Server errors are retried `server_retries` times with backoff, as the
+    # clients' own sessions would have.
+    def __init__(self, pool_size, timeout, limiter=None, max_retries=5, cache=None, server_retries=3):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.cache = cache
+        retry = Retry(total=server_retries, read=False, status=server_retries, backoff_factor=0.3,
+                      status_forcelist=SERVER_ERRORS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        if self.cache is None or method.upper() != 'GET':
+            return self._send(method, url, **kwargs)
+
+        key = requests.Request(method, url, params=kwargs.get('params')).prepare().url
+        cached = self.cache.get(key)
+        if cached is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'If-None-Match': cached[0]})
+        response = self._send(method, url, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            return self.cache.replay(key, cached[0], cached[1], response)
+        if response.status_code == 200:
+            self.cache.store(key, response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        if self.limiter is None:
+            return super().request(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = super().request(method, url, **kwargs)
+            self.limiter.observe(response.status_code, response.headers)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            attempt += 1
+
+    def close(self):
+        # spotipy closes its session whenever a client is discarded, e.g. on
+        # every new token; the shared pool has to outlive those clients
+        pass
+
+
+def page_concurrency(config):
+    # Pages of one listing a client requests at once
+    return max(1, config.get('sync', {}).get('page_concurrency') or 1)
+
+
+def pool_size(config, platform):
+    # Enough connections for every call the sync may have in flight at once,
+    # each of which may be fetching several pages of a listing
+    sync_config = config.get('sync', {})
+    calls = max(1, sync_config.get(f'{platform}_concurrency', 1), sync_config.get('jobs', 1))
+    return calls * page_concurrency(config)
+
+
+def request_timeout(config):
+    http_config = config.get('http', {})
+    return http_config.get('connect_timeout', 5.0), http_config.get('read_timeout', 30.0)
+
+
+def platform_url(config, platform, path):
+    # URL of `path` on the server standing in for the platform, such as the
+    # API emulator, or None to use the platform itself
+    base_url = config.get(platform, {}).get('base_url')
+    if not base_url:
+        return None
+    return urljoin(base_url.rstrip('/') + '/', path)
+
+
+def platform_limiter(config, platform):
+    return TokenBucket(config.get(platform, {}).get('requests_per_second', 5.0))
+
+
+def platform_session(config, platform):
+    # The platform's session, shared by every client and login for the life
+    # of the process so connections, TLS sessions and the rate limit are too
+    with _lock:
+        if platform not in _sessions:
+            _sessions[platform] = PooledSession(pool_size(config, platform), request_timeout(config),
+                                                platform_limiter(config, platform))
+        return _sessions[platform]
@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from models import compact
+
+logger = logging.getLogger(__name__)
+
+
+class LibrarySnapshot:
+    # Run-scoped view of both libraries. Playlist listings and track lists are
+    # fetched at most once per run and shared by every playlist and direction
+    # synced in it, including across worker threads. Track lists are kept in
+    # compact columns for the rest of the run.
+    def __init__(self, clients):
+        self.clients = clients
+        self._playlists = {}
+        self._by_name = {}
+        self._tracks = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def playlists(self, platform):
+        with self._key_lock(('playlists', platform)):
+            if platform not in self._playlists:
+                playlists = self.clients[platform].get_playlists()
+                self._playlists[platform] = playlists
+                self._by_name[platform] = {}
+                for playlist in playlists:
+                    self._by_name[platform].setdefault(playlist['name'], playlist)
+                logger.info(f"Loaded {len(playlists)} {platform} playlists into the library snapshot")
+            return self._playlists[platform]
+
+    def reload_playlists(self, platform):
+        with self._lock:
+            self._playlists.pop(platform, None)
+        return self.playlists(platform)
+
+    def playlist_by_name(self, platform, name):
+        self.playlists(platform)
+        return self._by_name[platform].get(name)
+
+    def playlist_by_id(self, platform, playlist_id):
+        return next((p for p in self.playlists(platform) if p['id'] == playlist_id), None)
+
+    def add_playlist(self, platform, playlist):
+        self.playlists(platform)
+        with self._lock:
+            self._playlists[platform].append(playlist)
+            self._by_name[platform].setdefault(playlist['name'], playlist)
+            self._tracks[(platform, playlist['id'])] = []
+
+    def tracks(self, platform, playlist_id):
+        key = (platform, playlist_id)
+        with self._key_lock(key):
+            if key not in self._tracks:
+                self._tracks[key] = compact(self.clients[platform].get_playlist_tracks(playlist_id))
+            return self._tracks[key]
+
+    def track_pages(self, platform, playlist_id):
+        # Yields the playlist's tracks page by page as they arrive, or in one
+        # page if already loaded; the full list is kept once the last page is in
+        key = (platform, playlist_id)
+        with self._lock:
+            cached = self._tracks.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        tracks = []
+        for page in self.clients[platform].iter_playlist_track_pages(playlist_id):
+            tracks += page
+            yield page
+        with self._lock:
+            self._tracks.setdefault(key, compact(tracks))
+
+    def replace_tracks(self, platform, playlist_id, tracks):
+        with self._lock:
+            self._tracks[(platform, playlist_id)] = compact(tracks)
+
+    def invalidate_tracks(self, platform, playlist_id):
+        with self._lock:
+            self._tracks.pop((platform, playlist_id), None)
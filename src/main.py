@@ -1,10 +1,14 @@
 import argparse
+import asyncio
 import logging
 import signal
 import sys
 import unittest
 
+import sync_plan
+from async_sync_manager import AsyncSyncManager
 from config import load_config
+from database import Database
 from sync_manager import SyncManager, SyncError
 from tidal_client import AuthenticationError, PlaylistModificationError
 from web_app import app
@@ -15,7 +19,7 @@ logger = logging.getLogger(__name__)
 
 def signal_handler(_, __):
     logger.info('Received interrupt signal. Exiting gracefully...')
-    print('\nExiting gracefully...')
+    print('\nExiting gracefully... A sync started with --journal can be continued with --resume.')
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -34,6 +38,20 @@ def main():
     parser = argparse.ArgumentParser(description="Spotify-Tidal Playlist Sync")
     parser.add_argument("--all", action="store_true", help="Sync all playlists")
     parser.add_argument("--playlists", nargs="+", help="List of playlist names to sync")
+    parser.add_argument("--jobs", type=int, help="Number of playlists to sync in parallel")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use the asyncio sync engine instead of worker threads")
+    parser.add_argument("--plan", metavar="PLAN_FILE",
+                        help="Compute the sync and save it as a plan without writing anything")
+    parser.add_argument("--apply", metavar="PLAN_FILE", help="Apply a plan saved with --plan")
+    parser.add_argument("--journal", action="store_true",
+                        help="Journal the sync so it can be continued with --resume if interrupted")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted journaled sync instead of starting over")
+    parser.add_argument("--clear-unmatched", nargs="?", const="all", choices=["all", "spotify", "tidal"],
+                        metavar="PLATFORM",
+                        help="Forget the tracks from PLATFORM (default: all) that found no match, "
+                             "so the next sync looks them up again")
     parser.add_argument("--gui", action="store_true", help="Launch web GUI")
     parser.add_argument("--run-tests", action="store_true", help="Run all tests")
     args = parser.parse_args()
@@ -60,12 +78,22 @@ def main():
             logger.info("Exiting GUI mode.")
             return
 
-        if not args.all and not args.playlists:
+        if args.clear_unmatched:
+            platform = None if args.clear_unmatched == "all" else args.clear_unmatched
+            cleared = Database(load_config()).clear_track_misses(platform)
+            print(f"Forgot {cleared} unmatched tracks.")
+            return
+
+        if not args.all and not args.playlists and not args.apply:
             logger.warning("No sync option specified")
-            print("Please specify --all or --playlists")
+            print("Please specify --all, --playlists or --apply")
             parser.print_help()
             sys.exit(1)
 
+        if (args.resume or args.journal) and (args.use_async or args.plan or args.apply):
+            print("--journal and --resume cannot be combined with --async, --plan or --apply")
+            sys.exit(1)
+
         try:
             logger.info("Loading configuration")
             config = load_config()
@@ -74,18 +102,53 @@ def main():
             print("Configuration file not found. Using default configuration.")
             config = load_config()  # This will now load the default config
         
+        if args.jobs:
+            # The clients size their connection pools from the configured jobs
+            config.setdefault('sync', {})['jobs'] = args.jobs
+
         logger.info("Initializing SyncManager")
         sync_manager = SyncManager(config)
 
-        if args.all:
+        if args.plan:
+            if args.all:
+                logger.info("Planning sync of all playlists")
+                plan = sync_manager.plan_all_playlists()
+            else:
+                logger.info(f"Planning sync of specific playlists: {args.playlists}")
+                plan = sync_manager.plan_specific_playlists(args.playlists)
+            sync_plan.save_plan(plan, args.plan)
+            for failure in plan['failed']:
+                print(f"Failed to plan '{failure['playlist']}' from {failure['platform']}: {failure['error']}")
+            print(f"Plan saved to {args.plan}: {sync_plan.summarize_plan(plan)}.")
+            return
+
+        if args.apply:
+            logger.info(f"Applying sync plan {args.apply}")
+            report = sync_manager.apply_plan(sync_plan.load_plan(args.apply))
+        elif args.use_async:
+            logger.info("Using asyncio sync engine")
+            async_sync_manager = AsyncSyncManager(sync_manager)
+            if args.all:
+                logger.info("Syncing all playlists")
+                report = asyncio.run(async_sync_manager.sync_all_playlists())
+            else:
+                logger.info(f"Syncing specific playlists: {args.playlists}")
+                report = asyncio.run(async_sync_manager.sync_specific_playlists(args.playlists))
+        elif args.all:
             logger.info("Syncing all playlists")
-            sync_manager.sync_all_playlists()
-        elif args.playlists:
+            report = sync_manager.sync_all_playlists(resume=args.resume, journal=args.journal)
+        else:
             logger.info(f"Syncing specific playlists: {args.playlists}")
-            sync_manager.sync_specific_playlists(args.playlists)
+            report = sync_manager.sync_specific_playlists(args.playlists, resume=args.resume, journal=args.journal)
+
+        if report['failed']:
+            for failure in report['failed']:
+                print(f"Failed to sync '{failure['playlist']}' from {failure['platform']}: {failure['error']}")
+            raise SyncError(f"{len(report['failed'])} of {len(report['synced']) + len(report['failed'])} "
+                            f"playlists failed to sync")
 
         logger.info("Sync completed successfully")
-        print("Sync completed successfully.")
+        print(f"Sync completed successfully ({len(report['synced'])} playlists).")
     except AuthenticationError as e:
         logger.error(f"Authentication error: {str(e)}")
         print(f"Authentication error: {str(e)}")
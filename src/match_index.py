@@ -0,0 +1,153 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from array import array
+
+from models import TrackList
+
+# Title decorations that do not change which recording a track is
+_FEATURING = re.compile(r'\s*[(\[](?:feat\.?|ft\.?|featuring|with)\s[^)\]]*[)\]]', re.IGNORECASE)
+_TRAILING_FEATURING = re.compile(r'\s+(?:feat\.?|ft\.?|featuring)\s.*$', re.IGNORECASE)
+_REMASTERED = re.compile(r'\s*[(\[][^)\]]*remaster[^)\]]*[)\]]', re.IGNORECASE)
+_DASH_REMASTERED = re.compile(r'\s+-\s+[^-]*remaster.*$', re.IGNORECASE)
+_NON_WORD = re.compile(r'[^\w]+')
+
+# Durations further apart than this are taken for different recordings
+MAX_DURATION_DIFFERENCE = 10
+
+
+def normalize(text):
+    # Casefolded, accent-free words separated by single spaces
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def normalize_title(title):
+    for pattern in (_FEATURING, _REMASTERED, _DASH_REMASTERED, _TRAILING_FEATURING):
+        title = pattern.sub('', title)
+    return normalize(title)
+
+
+class _TokenColumn:
+    # Token id sets of every row, flattened into one array with row offsets
+    __slots__ = ('_ids', '_offsets')
+
+    def __init__(self):
+        self._ids = array('L')
+        self._offsets = array('L', [0])
+
+    def append(self, token_ids):
+        self._ids.extend(token_ids)
+        self._offsets.append(len(self._ids))
+
+    def get(self, row):
+        return set(self._ids[self._offsets[row]:self._offsets[row + 1]])
+
+
+class MatchIndex:
+    # In-memory index over the tracks of one platform, used to match tracks
+    # without asking the platform. Tracks are found by ISRC, or by a token
+    # inverted index over normalized titles, checked against the lead artist
+    # and with the closest duration breaking ties. Everything is kept in
+    # columns by row: the tracks as TrackLists, and their title and artist
+    # tokens as ids in flat arrays, so a track is only rebuilt once it passes
+    # the token checks.
+    def __init__(self, tracks=(), threshold=0.8):
+        self.threshold = threshold
+        self._segments = []
+        self._segment_starts = []
+        self._rows = {}
+        self._by_isrc = {}
+        self._token_ids = {}
+        self._postings = []
+        self._titles = _TokenColumn()
+        self._artists = _TokenColumn()
+        self._lock = threading.Lock()
+        self.add_all(tracks)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _token_id(self, token):
+        token_id = self._token_ids.setdefault(token, len(self._token_ids))
+        if token_id == len(self._postings):
+            self._postings.append(array('L'))
+        return token_id
+
+    def add_all(self, tracks):
+        with self._lock:
+            new = {}
+            for track in tracks:
+                if track['id'] in self._rows or track['id'] in new:
+                    continue
+                title_tokens = set(normalize_title(track['name']).split())
+                if title_tokens:
+                    new[track['id']] = (track, title_tokens)
+            if not new:
+                return
+            first = len(self._rows)
+            self._segments.append(TrackList(track for track, _ in new.values()))
+            self._segment_starts.append(first)
+            for row, (track, title_tokens) in enumerate(new.values(), first):
+                self._rows[track['id']] = row
+                if track.get('isrc'):
+                    self._by_isrc.setdefault(track['isrc'], row)
+                title_ids = [self._token_id(token) for token in title_tokens]
+                for token_id in title_ids:
+                    self._postings[token_id].append(row)
+                self._titles.append(title_ids)
+                self._artists.append(self._token_id(token) for artist in track['artists']
+                                     for token in normalize(artist).split())
+
+    def _track(self, row):
+        position = bisect.bisect_right(self._segment_starts, row) - 1
+        return self._segments[position][row - self._segment_starts[position]]
+
+    def find(self, track, isrc=None):
+        # Returns (track, confidence) for the best indexed match, or None
+        isrc = isrc or track.get('isrc')
+        with self._lock:
+            if isrc and isrc in self._by_isrc:
+                return self._track(self._by_isrc[isrc]), 1.0
+
+            title_tokens = set(normalize_title(track['name']).split())
+            lead_artist = set(normalize(track['artists'][0]).split()) if track['artists'] else set()
+            if not title_tokens or not lead_artist:
+                return None
+            if not lead_artist <= self._token_ids.keys():
+                return None
+            # Tokens the index has never seen still count towards the union
+            title_ids = {self._token_ids[token] for token in title_tokens if token in self._token_ids}
+            unknown = len(title_tokens) - len(title_ids)
+            lead_artist = {self._token_ids[token] for token in lead_artist}
+
+            # A candidate reaching the threshold shares at least that share of
+            # the title's tokens, so it holds one of the rarest few of them
+            needed = len(title_tokens) - math.ceil(self.threshold * len(title_tokens) - 1e-9) + 1
+            rarest = sorted(title_ids, key=lambda token_id: len(self._postings[token_id]))[:needed]
+            candidates = set().union(*(self._postings[token_id] for token_id in rarest))
+
+            best = None
+            for row in candidates:
+                candidate_ids = self._titles.get(row)
+                shared = len(title_ids & candidate_ids)
+                score = shared / (len(title_ids | candidate_ids) + unknown)
+                if score < self.threshold or not lead_artist <= self._artists.get(row):
+                    continue
+                candidate = self._track(row)
+                difference = self._duration_difference(track, candidate)
+                if difference is not None and difference > MAX_DURATION_DIFFERENCE:
+                    continue
+                rank = (score, -(difference or 0), -row)
+                if best is None or rank > best[0]:
+                    best = (rank, candidate)
+            return (best[1], best[0][0]) if best else None
+
+    @staticmethod
+    def _duration_difference(track, candidate):
+        if track.get('duration') is None or candidate.get('duration') is None:
+            return None
+        return abs(track['duration'] - candidate['duration'])
@@ -0,0 +1,69 @@
+import numpy as np
+
+from match_index import normalize, normalize_title
+
+# Weights of the title, artist, album and duration similarities
+WEIGHTS = np.array([0.5, 0.3, 0.1, 0.1])
+# Similarity given to album or duration when either side lacks it
+NEUTRAL = 0.5
+# Duration difference, in seconds, at which the duration similarity reaches 0
+DURATION_TOLERANCE = 30
+
+
+def _tokens(track):
+    return (frozenset(normalize_title(track['name']).split()),
+            frozenset(token for artist in track['artists'] for token in normalize(artist).split()),
+            frozenset(normalize(track.get('album') or '').split()))
+
+
+def _ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def score_candidates(tracks, candidate_lists):
+    # Scores every candidate of every track in one pass. Token overlaps are
+    # counted per pair from its own token sets, so the cost grows with the
+    # number of pairs only; the weighting is vectorized. Returns one array of
+    # scores in [0, 1] per track, aligned with its candidates.
+    pairs = [(index, candidate) for index, candidates in enumerate(candidate_lists) for candidate in candidates]
+    if not pairs:
+        return [np.zeros(0) for _ in tracks]
+
+    track_tokens = [_tokens(track) if candidates else None for track, candidates in zip(tracks, candidate_lists)]
+    # Intersection, union and the smaller of the two set sizes, per pair and field
+    overlaps = np.empty((3, 3, len(pairs)))
+    for row, (index, candidate) in enumerate(pairs):
+        for field, (left, right) in enumerate(zip(track_tokens[index], _tokens(candidate))):
+            intersection = len(left & right)
+            overlaps[:, field, row] = intersection, len(left) + len(right) - intersection, min(len(left), len(right))
+    intersection, union, smaller = overlaps
+
+    features = np.empty((len(pairs), len(WEIGHTS)))
+    features[:, 0] = _ratio(intersection[0], union[0])
+    # Featured artists on one side only do not count against a match
+    features[:, 1] = _ratio(intersection[1], smaller[1])
+    features[:, 2] = np.where(smaller[2] > 0, _ratio(intersection[2], union[2]), NEUTRAL)
+
+    durations = np.array([[tracks[index].get('duration'), candidate.get('duration')] for index, candidate in pairs],
+                         dtype=float)
+    known = ~np.isnan(durations).any(axis=1)
+    difference = np.abs(durations[:, 0] - durations[:, 1])
+    features[:, 3] = np.where(known, np.clip(1 - np.nan_to_num(difference) / DURATION_TOLERANCE, 0, 1), NEUTRAL)
+
+    scores = features @ WEIGHTS
+    bounds = np.cumsum([0] + [len(candidates) for candidates in candidate_lists])
+    return [scores[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def best_matches(tracks, candidate_lists, threshold):
+    # Returns (best candidate or None, score) per track; a best candidate
+    # scoring under the threshold leaves the track unmatched
+    results = []
+    for candidates, scores in zip(candidate_lists, score_candidates(tracks, candidate_lists)):
+        if not len(scores):
+            results.append((None, 0.0))
+            continue
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        results.append((candidates[best] if score >= threshold else None, score))
+    return results
@@ -0,0 +1,180 @@
+import operator
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+# Duration column values standing for no duration, and for none given
+_NO_DURATION = -1
+_UNSET_DURATION = -2
+
+
+class Record(Mapping):
+    # Read-only, dict-style access to the fields kept in __slots__, so code
+    # written against plain track and playlist dicts works unchanged. Fields
+    # that were never given are absent, as missing keys would be.
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (field for field in self.__slots__ if hasattr(self, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        # A dict literal, as stored in the track cache
+        return repr(dict(self))
+
+
+def _intern(text):
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+class Track(Record):
+    __slots__ = ('id', 'name', 'artists', 'album', 'uri', 'isrc', 'duration')
+
+    def __init__(self, id, name, artists, **fields):
+        self.id = id
+        self.name = name
+        # Artist names repeat across a library, so every copy shares one string
+        interned = tuple(_intern(artist) for artist in artists)
+        # A tuple already holding the shared strings is kept, so track lists can share it
+        already_shared = type(artists) is tuple and all(map(operator.is_, interned, artists))
+        self.artists = artists if already_shared else interned
+        for field, value in fields.items():
+            setattr(self, field, _intern(value) if field == 'album' else value)
+
+    @classmethod
+    def from_mapping(cls, track):
+        if isinstance(track, cls):
+            return track
+        fields = {field: track[field] for field in cls.__slots__[3:] if field in track}
+        return cls(track['id'], track['name'], track['artists'], **fields)
+
+    @classmethod
+    def from_spotify(cls, track):
+        return cls(track['id'], track['name'], [artist['name'] for artist in track['artists']],
+                   album=track['album']['name'], uri=track['uri'],
+                   isrc=track.get('external_ids', {}).get('isrc'),
+                   duration=track['duration_ms'] // 1000 if track.get('duration_ms') is not None else None)
+
+    @classmethod
+    def from_tidal(cls, track):
+        return cls(track['id'], track['title'], [artist['name'] for artist in track.get('artists') or ()],
+                   album=(track.get('album') or {}).get('title'), uri=f"tidal:track:{track['id']}",
+                   isrc=track.get('isrc'), duration=track.get('duration'))
+
+
+class Playlist(Record):
+    __slots__ = ('id', 'name', 'tracks', 'version')
+
+    def __init__(self, id, name, tracks, version=None):
+        self.id = id
+        self.name = name
+        self.tracks = tracks
+        self.version = version
+
+
+class TrackList(Sequence):
+    # Read-only list of tracks kept in columns rather than one object per
+    # track: names share one string sliced by offsets, numeric ids and
+    # durations sit in arrays, and artist lists are shared between the tracks
+    # that have the same ones. Tracks are rebuilt as they are read.
+    __slots__ = ('_ids', '_names', '_name_offsets', '_artists', '_albums', '_uri_prefix', '_uris', '_isrcs',
+                 '_durations', '_absent')
+
+    def __init__(self, tracks=()):
+        tracks = [Track.from_mapping(track) for track in tracks]
+        ids = [track.id for track in tracks]
+        self._ids = array('q', ids) if all(type(track_id) is int for track_id in ids) else ids
+        self._names = ''.join(track.name for track in tracks)
+        self._name_offsets = array('L', [0])
+        for track in tracks:
+            self._name_offsets.append(self._name_offsets[-1] + len(track.name))
+
+        shared_artists = {}
+        self._artists = [shared_artists.setdefault(track.artists, track.artists) for track in tracks]
+        self._albums = [track.get('album') for track in tracks]
+        # Uris are not stored when each is the id behind the same prefix
+        self._uris = [track.get('uri') for track in tracks]
+        first_uri = self._uris[0] if self._uris else None
+        spotify = isinstance(first_uri, str) and first_uri.startswith('spotify:')
+        self._uri_prefix = 'spotify:track:' if spotify else 'tidal:track:'
+        if all(uri == f'{self._uri_prefix}{track.id}' for track, uri in zip(tracks, self._uris)):
+            self._uris = None
+        self._isrcs = [track.get('isrc') for track in tracks]
+        self._durations = array('l', [
+            _UNSET_DURATION if 'duration' not in track else
+            _NO_DURATION if track.duration is None else track.duration
+            for track in tracks])
+        # Fields some track was given without; only those are checked per track
+        self._absent = {field: [field not in track for track in tracks]
+                        for field in ('album', 'uri', 'isrc')
+                        if any(field not in track for track in tracks)}
+
+    def _has(self, field, index):
+        absent = self._absent.get(field)
+        return absent is None or not absent[index]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('track index out of range')
+
+        track_id = self._ids[index]
+        fields = {}
+        if self._has('album', index):
+            fields['album'] = self._albums[index]
+        if self._has('uri', index):
+            fields['uri'] = self._uris[index] if self._uris is not None else f'{self._uri_prefix}{track_id}'
+        if self._has('isrc', index):
+            fields['isrc'] = self._isrcs[index]
+        duration = self._durations[index]
+        if duration != _UNSET_DURATION:
+            fields['duration'] = None if duration == _NO_DURATION else duration
+        name = self._names[self._name_offsets[index]:self._name_offsets[index + 1]]
+        return Track(track_id, name, self._artists[index], **fields)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def compact(tracks):
+    # A TrackList of the tracks if they all are Track records; anything else,
+    # such as hand-built dicts, is kept as it is
+    if tracks and all(isinstance(track, Track) for track in tracks):
+        return TrackList(tracks)
+    return tracks
+
+
+def to_json(value):
+    # json.dumps `default` hook for the models
+    if isinstance(value, Record):
+        return dict(value)
+    if isinstance(value, TrackList):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+
+INSERT = 'insert'
+DELETE = 'delete'
+
+
+def track_id(track):
+    return track['id']
+
+
+def index_positions(tracks, key=track_id):
+    return _index_keys([key(track) for track in tracks])
+
+
+def _index_keys(keys):
+    positions = defaultdict(list)
+    for position, track_key in enumerate(keys):
+        positions[track_key].append(position)
+    return positions
+
+
+def _surplus_positions(keys, other_positions):
+    # Occurrences are paired up in order, so a track that appears twice on one
+    # side and once on the other leaves only its second copy as surplus.
+    seen = defaultdict(int)
+    surplus = []
+    for position, track_key in enumerate(keys):
+        seen[track_key] += 1
+        if seen[track_key] > len(other_positions.get(track_key, ())):
+            surplus.append(position)
+    return surplus
+
+
+def diff_playlists(source_tracks, target_tracks, key=track_id):
+    source_keys = [key(track) for track in source_tracks]
+    target_keys = [key(track) for track in target_tracks]
+    source_positions = _index_keys(source_keys)
+    target_positions = _index_keys(target_keys)
+
+    # Deletes run highest position first so the remaining positions stay valid,
+    # inserts follow in source order.
+    operations = [{'op': DELETE, 'position': position, 'track': target_tracks[position]}
+                  for position in reversed(_surplus_positions(target_keys, source_positions))]
+    operations += [{'op': INSERT, 'position': position, 'track': source_tracks[position]}
+                   for position in _surplus_positions(source_keys, target_positions)]
+    return operations
+
+
+def inserts(operations):
+    return [op for op in operations if op['op'] == INSERT]
+
+
+def deletes(operations):
+    return [op for op in operations if op['op'] == DELETE]
+
+
+def _propagate(own_base, own_current, other_base, other_current, key):
+    # Changes on one side since the base are found by platform id; whether the
+    # other side already has an equivalent track is decided by `key`.
+    own_changes = diff_playlists(own_current, own_base)
+    other_changes = diff_playlists(other_current, other_base)
+
+    own_counts = Counter(key(track) for track in own_current)
+    other_counts = Counter(key(track) for track in other_current)
+    other_added = Counter(key(op['track']) for op in inserts(other_changes))
+
+    # A removal only takes back copies the other side had at the base, never
+    # ones it added since
+    removable = Counter()
+    for op in deletes(own_changes):
+        removable[key(op['track'])] += 1
+    for track_key in removable:
+        removable[track_key] = min(removable[track_key], other_counts[track_key] - other_added[track_key])
+
+    operations = []
+    for position in range(len(other_current) - 1, -1, -1):
+        track_key = key(other_current[position])
+        if removable[track_key] > 0:
+            removable[track_key] -= 1
+            other_counts[track_key] -= 1
+            operations.append({'op': DELETE, 'position': position, 'track': other_current[position]})
+
+    # An addition already made on both sides is only kept once
+    for op in inserts(own_changes):
+        track_key = key(op['track'])
+        if other_counts[track_key] < own_counts[track_key]:
+            other_counts[track_key] += 1
+            operations.append(op)
+    return operations
+
+
+def three_way_merge(base_a, current_a, base_b, current_b, key=track_id):
+    # Returns the operations to apply to side b and to side a so that each change
+    # made on either side since the common base lands exactly once on the other.
+    # With empty bases this is a union of both playlists.
+    return (_propagate(base_a, current_a, base_b, current_b, key),
+            _propagate(base_b, current_b, base_a, current_a, key))
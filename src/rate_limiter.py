@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _header_seconds(value, now):
+    # Rate limit headers give either seconds to wait or an epoch timestamp
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if seconds > 1e9:
+        seconds -= now
+    return max(seconds, 0.0)
+
+
+class TokenBucket:
+    # Paces every request to one platform, from any thread: each request takes
+    # a token, and tokens refill at `rate` per second up to `capacity`. A
+    # throttled response pauses the whole bucket until the server's
+    # Retry-After has passed, so no caller keeps bouncing off the limit.
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.resume_at = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self.resume_at - now
+                if wait <= 0:
+                    self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            now = self._clock()
+            if now + seconds > self.resume_at:
+                self.resume_at = now + seconds
+                logger.warning(f"Rate limited, pausing requests for {seconds:.1f} seconds")
+            # The bucket starts empty again once the pause is over
+            self.tokens = 0.0
+            self._updated = self.resume_at
+
+    def observe(self, status_code, headers):
+        # Pauses the bucket as the response's rate limit headers ask; returns
+        # the pause in seconds, or None if there is none
+        seconds = None
+        if status_code == 429:
+            seconds = _header_seconds(headers.get('Retry-After'), time.time())
+            if seconds is None:
+                seconds = 1.0
+        elif headers.get('X-RateLimit-Remaining') == '0':
+            seconds = _header_seconds(headers.get('X-RateLimit-Reset'), time.time())
+        if seconds:
+            self.pause(seconds)
+        return seconds
@@ -0,0 +1,65 @@
+import json
+import threading
+from collections import OrderedDict
+
+import requests
+
+# Bodies kept parsed in memory, so a page revalidated again is not parsed again
+PARSED_ENTRIES = 256
+
+
+class CachedResponse(requests.Response):
+    # Stands in for a 304: the stored body, with its JSON parsed at most once
+    # per process
+    def __init__(self, cache, key, etag, body, not_modified):
+        super().__init__()
+        self.status_code = 200
+        self._content = body
+        self.encoding = 'utf-8'
+        self.headers.update((name, value) for name, value in not_modified.headers.items()
+                            if name.lower() not in ('content-length', 'content-encoding'))
+        self.headers['ETag'] = etag
+        self.url = not_modified.url
+        self.request = not_modified.request
+        self.from_cache = True
+        self._cache = cache
+        self._key = (key, etag)
+
+    def json(self, **kwargs):
+        return self._cache.parsed(self._key, self._content)
+
+
+class ResponseCache:
+    # GET responses carrying an ETag, stored in the database by URL and
+    # revalidated with If-None-Match. The database keeps at most max_bytes of
+    # bodies, evicting the least recently used.
+    def __init__(self, db, max_bytes):
+        self.db = db
+        self.max_bytes = max_bytes
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        # Returns (etag, body) of the stored response, or None
+        return self.db.get_cached_response(url)
+
+    def store(self, url, response):
+        etag = response.headers.get('ETag')
+        if etag and len(response.content) <= self.max_bytes:
+            self.db.store_cached_response(url, etag, response.content, self.max_bytes)
+
+    def replay(self, url, etag, body, not_modified):
+        self.db.touch_cached_response(url)
+        return CachedResponse(self, url, etag, body, not_modified)
+
+    def parsed(self, key, body):
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                return self._parsed[key]
+        value = json.loads(body)
+        with self._lock:
+            self._parsed[key] = value
+            while len(self._parsed) > PARSED_ENTRIES:
+                self._parsed.popitem(last=False)
+        return value
@@ -1,10 +1,14 @@
 import datetime
 import logging
+import math
 
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 
 import utils
+from models import Playlist, Track
+from response_cache import ResponseCache
+from http_session import page_concurrency, platform_session, platform_url, request_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -14,31 +18,39 @@ class AuthenticationError(Exception):
 
 
 class SpotifyClient:
+    # Spotify accepts at most 100 items per playlist add/remove request
+    write_chunk_size = 100
+    # and at most 50 tracks per lookup
+    track_lookup_size = 50
+    # Items per page when listing playlists and playlist tracks, the most allowed
+    playlist_page_size = 50
+    track_page_size = 100
+    # Playlist track attributes the sync uses
+    track_fields = ('total,items(track(id,name,uri,duration_ms,artists(name),album(name),'
+                    'external_ids(isrc)))')
+
     def __init__(self, config, database):
         self.config = config
         self.db = database
         self.sp = None
         self.auth_manager = None
         self.token_info = None
+        self.http = platform_session(config, 'spotify')
+        # Playlist pages unchanged since they were stored cost a 304
+        cache_megabytes = config.get('spotify', {}).get('response_cache_mb', 64)
+        self.http.cache = ResponseCache(database, int(cache_megabytes * 1024 * 1024)) if cache_megabytes else None
+        # Pages of one listing requested at once, paced by the session's rate limiter
+        self.page_workers = page_concurrency(config)
 
     def authenticate(self, auth_code=None):
-        redirect_uri = "http://localhost:8888/callback/spotify"
-
-        self.auth_manager = SpotifyOAuth(
-            client_id=self.config['spotify']['client_id'],
-            client_secret=self.config['spotify']['client_secret'],
-            redirect_uri=redirect_uri,
-            scope="playlist-read-private playlist-modify-private",
-            cache_handler=None,
-            show_dialog=True
-        )
+        self.auth_manager = self._oauth()
 
         try:
             if auth_code:
                 self.token_info = self.auth_manager.get_access_token(auth_code)
                 if not self.token_info:
                     raise AuthenticationError("Failed to get access token")
-                self.sp = spotipy.Spotify(auth=self.token_info['access_token'])
+                self.sp = self._spotify(self.token_info['access_token'])
                 self.save_token()
                 logger.info("Spotify authentication successful")
             else:
@@ -62,21 +74,35 @@ class SpotifyClient:
             expires_at = datetime.datetime.fromisoformat(expires_at)
             if expires_at > datetime.datetime.now():
                 self.token_info = {'access_token': token, 'expires_at': expires_at.timestamp()}
-                self.sp = spotipy.Spotify(auth=token)
+                self.sp = self._spotify(token)
                 logger.info("Spotify token loaded from database")
                 return True
         return False
 
-    def get_auth_url(self):
-        redirect_uri = "http://localhost:8888/callback/spotify"
-        self.auth_manager = SpotifyOAuth(
+    def _oauth(self):
+        auth_manager = SpotifyOAuth(
             client_id=self.config['spotify']['client_id'],
             client_secret=self.config['spotify']['client_secret'],
-            redirect_uri=redirect_uri,
+            redirect_uri="http://localhost:8888/callback/spotify",
             scope="playlist-read-private playlist-modify-private",
             cache_handler=None,
-            show_dialog=True
+            show_dialog=True,
+            requests_session=self.http,
+            requests_timeout=request_timeout(self.config)
         )
+        if platform_url(self.config, 'spotify', ''):
+            auth_manager.OAUTH_AUTHORIZE_URL = platform_url(self.config, 'spotify', 'authorize')
+            auth_manager.OAUTH_TOKEN_URL = platform_url(self.config, 'spotify', 'api/token')
+        return auth_manager
+
+    def _spotify(self, access_token):
+        client = spotipy.Spotify(auth=access_token, requests_session=self.http,
+                                 requests_timeout=request_timeout(self.config))
+        client.prefix = platform_url(self.config, 'spotify', 'v1/') or client.prefix
+        return client
+
+    def get_auth_url(self):
+        self.auth_manager = self._oauth()
         return self.auth_manager.get_authorize_url()
 
     def disconnect(self, platform):
@@ -86,6 +112,7 @@ class SpotifyClient:
             self.token_info = None
             self.db.clear_cached_playlists('spotify')
             self.db.clear_cached_tracks('spotify')
+            self.db.clear_cached_responses()
             self.db.clear_token('spotify')
             logger.info("Spotify client disconnected and database records purged")
         else:
@@ -97,73 +124,83 @@ class SpotifyClient:
             self.authenticate()
         playlists = []
         try:
-            results = self.sp.current_user_playlists()
-            while results:
+            def fetch_page(offset):
+                return self.sp.current_user_playlists(limit=self.playlist_page_size, offset=offset)
+
+            for results in self._offset_pages(fetch_page, self.playlist_page_size):
                 for item in results['items']:
-                    playlists.append({
-                        'id': item['id'],
-                        'name': item['name'],
-                        'tracks': item['tracks']['total']
-                    })
-                if results['next']:
-                    results = self.sp.next(results)
-                else:
-                    results = None
+                    playlists.append(Playlist(item['id'], item['name'], item['tracks']['total'],
+                                              item.get('snapshot_id')))
         except Exception as e:
             logger.error(f"Error fetching Spotify playlists: {str(e)}")
             raise
         return playlists
 
-    def get_playlist_tracks(self, playlist_id):
-        tracks = []
-        results = self.sp.playlist_items(playlist_id, additional_types=('track',))
-        while results:
-            for item in results['items']:
-                if item['track']:
-                    track = item['track']
-                    tracks.append({
-                        'id': track['id'],
-                        'name': track['name'],
-                        'artists': [artist['name'] for artist in track['artists']],
-                        'album': track['album']['name'],
-                        'uri': track['uri']
-                    })
-            if results['next']:
-                results = self.sp.next(results)
-            else:
-                results = None
-        return tracks
+    def get_playlist_tracks(self, playlist_id, fields=track_fields):
+        return [track for page in self._playlist_track_pages(playlist_id, fields) for track in page]
+
+    def iter_playlist_track_pages(self, playlist_id, prefetch=1, fields=track_fields):
+        # Yields the playlist's tracks a page at a time, fetching up to
+        # `prefetch` pages ahead while the caller works on the current one
+        return utils.prefetch(self._playlist_track_pages(playlist_id, fields), prefetch)
+
+    def _offset_pages(self, fetch_page, page_size):
+        return utils.offset_pages(fetch_page, page_size, lambda page: page['total'], self.page_workers)
+
+    def _playlist_track_pages(self, playlist_id, fields=track_fields):
+        # `fields` limits each page to the attributes the sync uses; None
+        # returns the whole items
+        def fetch_page(offset):
+            return self.sp.playlist_items(playlist_id, fields=fields, limit=self.track_page_size, offset=offset,
+                                          additional_types=('track',))
+
+        for results in self._offset_pages(fetch_page, self.track_page_size):
+            yield [Track.from_spotify(item['track']) for item in results['items'] if item.get('track')]
 
     def get_playlist_by_name(self, name):
         playlists = self.get_playlists()
         return next((p for p in playlists if p['name'] == name), None)
 
-    def search_tracks(self, query):
-        try:
-            results = self.sp.search(q=query, type='track', limit=1)
-            if results and 'tracks' in results and 'items' in results['tracks'] and results['tracks']['items']:
-                track = results['tracks']['items'][0]
+    def search_tracks(self, query, limit=1):
+        # Errors are left to the caller, so a failed search is not taken for no results
+        results = self.sp.search(q=query, type='track', limit=limit)
+        if results and 'tracks' in results and 'items' in results['tracks'] and results['tracks']['items']:
+            return [Track.from_spotify(track) for track in results['tracks']['items'] if track]
+        logger.info(f"No tracks found for query: {query}")
+        return []
+
+    def search_by_isrc(self, isrc):
+        return self.search_tracks(f'isrc:{isrc}')
+
+    def get_track_isrcs(self, track_ids):
+        # One request per 50 tracks, the most the tracks endpoint accepts
+        isrcs = {}
+        for start in range(0, len(track_ids), self.track_lookup_size):
+            for track in self.sp.tracks(track_ids[start:start + self.track_lookup_size])['tracks']:
                 if track:
-                    return [{
-                        'id': track['id'],
-                        'name': track['name'],
-                        'artists': [artist['name'] for artist in track['artists']],
-                        'album': track['album']['name'],
-                        'uri': track['uri']
-                    }]
-            logger.info(f"No tracks found for query: {query}")
-            return []
-        except Exception as e:
-            logger.error(f"Error searching for tracks: {str(e)}")
-            return []
+                    isrcs[track['id']] = track.get('external_ids', {}).get('isrc')
+        return isrcs
 
     def create_playlist(self, name):
         user_id = self.sp.me()['id']
         playlist = self.sp.user_playlist_create(user_id, name, public=False)
         return playlist['id']
 
+    def estimate_write_calls(self, create, adds, removes):
+        # Creating needs the user id first; writes are one request per chunk
+        calls = 2 if create else 0
+        calls += math.ceil(adds / self.write_chunk_size) + math.ceil(removes / self.write_chunk_size)
+        return calls
+
     def add_tracks_to_playlist(self, playlist_id, track_uris):
         self.sp.playlist_add_items(playlist_id, track_uris)
 
-    def remove_tracks_from_playlist(self, playlist_id, track_uris):
-        self.sp.playlist_remove_all_occurrences_of_items(playlist_id, track_uris)
+    def remove_tracks_from_playlist(self, playlist_id, track_uris, positions=None):
+        if positions is None:
+            self.sp.playlist_remove_all_occurrences_of_items(playlist_id, track_uris)
+            return
+        occurrences = {}
+        for uri, position in zip(track_uris, positions):
+            occurrences.setdefault(uri, []).append(position)
+        items = [{'uri': uri, 'positions': uri_positions} for uri, uri_positions in occurrences.items()]
+        self.sp.playlist_remove_specific_occurrences_of_items(playlist_id, items)
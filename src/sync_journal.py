@@ -0,0 +1,63 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLANNED = 'planned'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class SyncJournal:
+    # Records, per run, the planned entries of every playlist (or pair) and
+    # whether they were applied, so an interrupted run can pick up where it stopped
+    def __init__(self, db, run_id):
+        self.db = db
+        self.run_id = run_id
+
+    @classmethod
+    def start(cls, db, resume=False):
+        run_id = db.get_unfinished_sync_run() if resume else None
+        if run_id is not None:
+            logger.info(f"Resuming interrupted sync run {run_id}")
+        else:
+            if resume:
+                logger.info("No interrupted sync run found, starting a new one")
+            run_id = db.start_sync_run()
+        return cls(db, run_id)
+
+    @staticmethod
+    def _is_pair(item):
+        return 'spotify' in item and 'tidal' in item
+
+    @classmethod
+    def item_key(cls, item, source_platform):
+        if cls._is_pair(item):
+            return f"pair:{item['spotify']['id']}:{item['tidal']['id']}"
+        return f"{source_platform}:{item['id']}"
+
+    def get_item(self, item_key):
+        return self.db.get_journal_item(self.run_id, item_key)
+
+    def find_item(self, item, source_platform):
+        # Returns (item_key, item, source_platform, status, entries). A one-way
+        # item whose target playlist was created before the run was interrupted
+        # comes back as a pair, and resumes as the journaled one-way item.
+        candidates = [(self.item_key(item, source_platform), item, source_platform)]
+        if self._is_pair(item):
+            candidates += [(self.item_key(item[platform], platform), item[platform], platform)
+                           for platform in ('spotify', 'tidal')]
+        for item_key, candidate, platform in candidates:
+            status, entries = self.get_item(item_key)
+            if status is not None:
+                return item_key, candidate, platform, status, entries
+        return candidates[0] + (None, None)
+
+    def record_planned(self, item_key, name, entries):
+        self.db.store_journal_item(self.run_id, item_key, name, PLANNED, entries=entries)
+
+    def record_result(self, item_key, name, result):
+        self.db.store_journal_item(self.run_id, item_key, name, FAILED if result['errors'] else COMPLETED,
+                                   result=result)
+
+    def finish(self):
+        self.db.finish_sync_run(self.run_id)
@@ -1,19 +1,80 @@
+import datetime
 import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
 
+import playlist_diff
+import sync_plan
 import utils
 from database import Database
+from library_snapshot import LibrarySnapshot
+from match_index import MatchIndex
+from models import Track
 from spotify_client import SpotifyClient
+from sync_journal import SyncJournal, COMPLETED
 from tidal_client import TidalClient, AuthenticationError, PlaylistModificationError
 
 logger = logging.getLogger(__name__)
 
 
+# Source platform of a work item that merges both playlists of a pair
+BOTH = 'both'
+# Most tracks matched together by one worker ahead of the sync
+PREMATCH_BATCH_SIZE = 500
+
+
 class SyncError(Exception):
     pass
 
 
+class ConcurrencyLimitedClient:
+    # Proxies a platform client so that at most `limit` calls run against it at once
+    def __init__(self, client, limit):
+        self._client = client
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def limited(*args, **kwargs):
+            with self._slots:
+                return attr(*args, **kwargs)
+
+        return limited
+
+
 class SyncManager:
-    def __init__(self, config):
+    def __init__(self, config, jobs=None):
+        sync_config = config.get('sync', {})
+        self.jobs = max(1, jobs or sync_config.get('jobs', 1))
+        self.platform_concurrency = {
+            'spotify': sync_config.get('spotify_concurrency', self.jobs),
+            'tidal': sync_config.get('tidal_concurrency', self.jobs),
+        }
+        self.requests_per_second = {
+            'spotify': config.get('spotify', {}).get('requests_per_second', 5.0),
+            'tidal': config.get('tidal', {}).get('requests_per_second', 5.0),
+        }
+        # Search results scored per track, and the score a match needs
+        self.search_candidates = sync_config.get('search_candidates', 5)
+        self.match_threshold = sync_config.get('match_threshold', 0.7)
+        # Days a track that found no match is not looked for again
+        self.miss_ttl_days = sync_config.get('miss_ttl_days', 7)
+        self.match_indexes = {}
+        # Guards the match indexes and the track lookups in flight
+        self.match_lock = threading.Lock()
+        self.track_lookups = {}
+        # Whether settled track lookups are kept for the rest of the run
+        self.keep_lookups = False
+        # Journal of the sync run in progress, if it is being journaled
+        self.journal = None
+
         logger.info("Initializing Database")
         self.db = Database(config)
         logger.info("Database initialized")
@@ -28,21 +89,138 @@ class SyncManager:
         self.tidal.load_token()  # Try to load existing token
         logger.info("TidalClient initialized")
 
+    def get_client(self, platform, limited=False):
+        client = self.spotify if platform == 'spotify' else self.tidal
+        if limited:
+            return ConcurrencyLimitedClient(client, self.platform_concurrency[platform])
+        return client
+
+    def create_snapshot(self):
+        limited = self.jobs > 1
+        return LibrarySnapshot({platform: self.get_client(platform, limited=limited)
+                                for platform in ('spotify', 'tidal')})
+
     def clear_cached_data(self, platform):
         logger.info(f"Clearing cached data for {platform}")
         self.db.clear_cached_playlists(platform)
         self.db.clear_cached_tracks(platform)
         self.db.clear_token(platform)
 
-    def sync_all_playlists(self):
-        spotify_playlists = self.spotify.get_playlists()
-        tidal_playlists = self.tidal.get_playlists()
+    @contextmanager
+    def _journaled_run(self, resume=False, journal=False):
+        # Only a journaled run can be resumed: it plans each item in full before
+        # writing, and is only marked finished when it returns, so an
+        # interrupted run stays open for --resume. Unjournaled runs stream the
+        # pages of one-way items instead.
+        if not (journal or resume):
+            yield
+            return
+        self.journal = SyncJournal.start(self.db, resume)
+        try:
+            yield
+            self.journal.finish()
+        finally:
+            self.journal = None
+
+    def sync_all_playlists(self, resume=False, journal=False):
+        with self._journaled_run(resume, journal):
+            return self._sync_all_playlists()
+
+    def _sync_all_playlists(self):
+        snapshot = self.create_snapshot()
+        spotify_playlists = list(snapshot.playlists('spotify'))
+        tidal_playlists = list(snapshot.playlists('tidal'))
 
         self.db.cache_playlists('spotify', spotify_playlists)
         self.db.cache_playlists('tidal', tidal_playlists)
 
-        for playlist in spotify_playlists + tidal_playlists:
-            self.sync_playlist(playlist)
+        work, skipped = self.select_changed_playlists(spotify_playlists, tidal_playlists)
+        report = self.sync_library(work, snapshot)
+        report['skipped'] = skipped
+
+        if any(result['added'] or result['removed'] for result in report['synced']):
+            # Our own writes moved the version markers, so record the ones the
+            # platforms report now
+            spotify_playlists = snapshot.reload_playlists('spotify')
+            tidal_playlists = snapshot.reload_playlists('tidal')
+        self.record_playlist_versions(report, spotify_playlists, tidal_playlists)
+        return report
+
+    def _unchanged_since_last_sync(self, spotify_playlist, tidal_playlist):
+        if spotify_playlist.get('version') is None or tidal_playlist.get('version') is None:
+            return False
+        stored = self.db.get_playlist_pair_versions(spotify_playlist['id'], tidal_playlist['id'])
+        return stored == (spotify_playlist['version'], tidal_playlist['version'])
+
+    @staticmethod
+    def _pair_work(spotify_playlists, tidal_playlists):
+        # The first playlist of each name on each platform forms a pair that is
+        # merged both ways; any other playlist is synced one way as before
+        spotify_by_name = {}
+        for playlist in spotify_playlists:
+            spotify_by_name.setdefault(playlist['name'], playlist)
+        tidal_by_name = {}
+        for playlist in tidal_playlists:
+            tidal_by_name.setdefault(playlist['name'], playlist)
+
+        work = []
+        paired = set()
+        for name, spotify_playlist in spotify_by_name.items():
+            if name in tidal_by_name:
+                work.append(({'name': name, 'spotify': spotify_playlist, 'tidal': tidal_by_name[name]}, BOTH))
+                paired.add(spotify_playlist['id'])
+                paired.add(tidal_by_name[name]['id'])
+        work += [(playlist, 'spotify') for playlist in spotify_playlists if playlist['id'] not in paired]
+        work += [(playlist, 'tidal') for playlist in tidal_playlists if playlist['id'] not in paired]
+        return work
+
+    def select_changed_playlists(self, spotify_playlists, tidal_playlists):
+        work = []
+        skipped = []
+        for item, source_platform in self._pair_work(spotify_playlists, tidal_playlists):
+            if source_platform == BOTH and self._unchanged_since_last_sync(item['spotify'], item['tidal']):
+                skipped.append(item['name'])
+            else:
+                work.append((item, source_platform))
+        if skipped:
+            logger.info(f"Skipping {len(skipped)} playlists unchanged since the last sync")
+        return work, skipped
+
+    @staticmethod
+    def select_named_playlists(playlist_names, playlist_by_name):
+        # `playlist_by_name(platform, name)` looks a playlist up in the listings
+        work = []
+        for name in playlist_names:
+            spotify_playlist = playlist_by_name('spotify', name)
+            tidal_playlist = playlist_by_name('tidal', name)
+
+            if spotify_playlist and tidal_playlist:
+                work.append(({'name': name, 'spotify': spotify_playlist, 'tidal': tidal_playlist}, BOTH))
+            elif spotify_playlist:
+                work.append((spotify_playlist, 'spotify'))
+            elif tidal_playlist:
+                work.append((tidal_playlist, 'tidal'))
+            else:
+                utils.log_warning(f"Playlist '{name}' not found on either platform")
+        return work
+
+    def record_playlist_versions(self, report, spotify_playlists, tidal_playlists):
+        incomplete = ({failure['playlist'] for failure in report['failed']} |
+                      {result['playlist'] for result in report['synced'] if result['errors']})
+        synced = {result['playlist'] for result in report['synced']} - incomplete
+
+        tidal_by_name = {}
+        for playlist in tidal_playlists:
+            tidal_by_name.setdefault(playlist['name'], playlist)
+        recorded = set()
+        for spotify_playlist in spotify_playlists:
+            name = spotify_playlist['name']
+            tidal_playlist = tidal_by_name.get(name)
+            if name not in synced or name in recorded or tidal_playlist is None:
+                continue
+            recorded.add(name)
+            self.db.store_playlist_pair_versions(spotify_playlist['id'], tidal_playlist['id'],
+                                                 spotify_playlist.get('version'), tidal_playlist.get('version'))
 
     def get_cached_playlists(self, platform):
         return self.db.get_cached_playlists(platform)
@@ -58,21 +236,230 @@ class SyncManager:
         self.db.cache_playlists(platform, playlists)
         return playlists
 
-    def sync_specific_playlists(self, playlist_names):
-        for name in playlist_names:
-            spotify_playlist = self.spotify.get_playlist_by_name(name)
-            tidal_playlist = self.tidal.get_playlist_by_name(name)
+    def sync_specific_playlists(self, playlist_names, resume=False, journal=False):
+        with self._journaled_run(resume, journal):
+            snapshot = self.create_snapshot()
+            return self.sync_library(self.select_named_playlists(playlist_names, snapshot.playlist_by_name), snapshot)
 
-            if spotify_playlist:
-                self.sync_playlist(spotify_playlist)
-            elif tidal_playlist:
-                self.sync_playlist(tidal_playlist)
+    def sync_library(self, work, snapshot):
+        # Matches the tracks of all the work up front, then syncs each item
+        # with its matches already settled
+        with self._shared_lookups():
+            self.prematch(work, snapshot)
+            return self.sync_many(work, snapshot)
+
+    @contextmanager
+    def _shared_lookups(self):
+        self.keep_lookups = True
+        try:
+            yield
+        finally:
+            self.keep_lookups = False
+            with self.match_lock:
+                self.track_lookups.clear()
+
+    def prematch(self, work, snapshot):
+        # Library-wide pass: collects the tracks every work item is going to
+        # add and resolves each distinct one once, in bulk. Unjournaled one-way
+        # items are left to stream their pages; their lookups are still shared.
+        def item_operations(entry):
+            item, source_platform = entry
+            if self.journal is None and source_platform != BOTH:
+                return []
+            if self.journal is not None and self.journal.find_item(item, source_platform)[3] == COMPLETED:
+                return []
+            try:
+                return self._work_item_operations(item, source_platform, snapshot)
+            except SyncError:
+                # Reported when the item itself is synced
+                return []
+
+        tracks = {'spotify': {}, 'tidal': {}}
+        for operations in self._map_parallel(item_operations, work):
+            for source_platform, platform_operations in operations:
+                for op in playlist_diff.inserts(platform_operations):
+                    tracks[source_platform].setdefault(op['track']['id'], op['track'])
+
+        for source_platform, platform_tracks in tracks.items():
+            operations = [{'op': playlist_diff.INSERT, 'track': track} for track in platform_tracks.values()]
+            batch_size = max(1, min(PREMATCH_BATCH_SIZE, -(-len(operations) // self.jobs)))
+            batches = [operations[start:start + batch_size] for start in range(0, len(operations), batch_size)]
+
+            def match_batch(batch):
+                try:
+                    self.match_tracks(batch, source_platform, snapshot.clients)
+                except Exception as e:
+                    # Left for the playlists to look up themselves
+                    logger.warning(f"Error matching {source_platform} tracks ahead of the sync: {str(e)}")
+
+            self._map_parallel(match_batch, batches)
+        logger.info(f"Matched {sum(len(platform_tracks) for platform_tracks in tracks.values())} "
+                    f"distinct tracks ahead of the sync")
+
+    def _work_item_operations(self, item, source_platform, snapshot):
+        # Returns the (source platform, operations) the work item is going to apply
+        with self._sync_errors(item['name']):
+            if source_platform == BOTH:
+                _, _, tidal_operations, spotify_operations = self._pair_operations(
+                    item['spotify'], item['tidal'], snapshot)
+                return [('spotify', tidal_operations), ('tidal', spotify_operations)]
+            _, _, _, operations = self._playlist_operations(item, source_platform, snapshot)
+            return [(source_platform, operations)]
+
+    def _map_parallel(self, func, items):
+        if self.jobs == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(func, items))
+
+    def sync_many(self, work, snapshot=None, sync=None):
+        # Playlists sharing a name are synced in sequence by the same worker so
+        # both directions of a pair never write to each other concurrently.
+        # `sync` replaces sync_work_item, e.g. to plan or apply instead.
+        sync = sync or self.sync_work_item
+        groups = OrderedDict()
+        for playlist, source_platform in work:
+            groups.setdefault(playlist['name'], []).append((playlist, source_platform))
+
+        report = {'synced': [], 'failed': []}
+        report_lock = threading.Lock()
+        snapshot = snapshot or self.create_snapshot()
+
+        def sync_group(group):
+            for playlist, source_platform in group:
+                try:
+                    result = sync(playlist, source_platform, snapshot)
+                    with report_lock:
+                        report['synced'].append(result)
+                except SyncError as e:
+                    with report_lock:
+                        report['failed'].append({
+                            'playlist': playlist['name'],
+                            'platform': source_platform,
+                            'error': str(e)
+                        })
+
+        self._map_parallel(sync_group, groups.values())
+
+        logger.info(f"Processed {len(report['synced'])} playlists, {len(report['failed'])} failed")
+        return report
+
+    def sync_work_item(self, item, source_platform, snapshot=None):
+        if self.journal is not None:
+            return self.sync_journaled_item(item, source_platform, snapshot)
+        if source_platform == BOTH:
+            return self.sync_pair(item['spotify'], item['tidal'], snapshot)
+        return self.sync_playlist(item, source_platform, snapshot)
+
+    def sync_journaled_item(self, item, source_platform, snapshot=None):
+        # The planned entries are journaled before any write and the outcome
+        # once they are applied. Resuming skips completed items and re-applies
+        # planned ones against the target's current tracks, so no write that
+        # already landed is repeated.
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(item['name']):
+            item_key, item, source_platform, status, entries = self.journal.find_item(item, source_platform)
+            if status == COMPLETED:
+                logger.info(f"Playlist {item['name']} was already synced by the resumed run")
+                return {'playlist': item['name'], 'added': 0, 'removed': 0, 'unmatched': 0, 'errors': []}
+
+            if entries is None:
+                if source_platform == BOTH:
+                    entries = self.plan_pair(item['spotify'], item['tidal'], snapshot)
+                else:
+                    entries = [self.plan_playlist(item, source_platform, snapshot)]
+                self.journal.record_planned(item_key, item['name'], entries)
             else:
-                utils.log_warning(f"Playlist '{name}' not found on either platform")
+                logger.info(f"Resuming journaled sync of playlist {item['name']}")
+                entries = [self.resume_plan_entry(entry, snapshot) for entry in entries]
+
+            if source_platform == BOTH:
+                result = self.apply_pair_plan(entries, snapshot)
+            else:
+                result = self.apply_playlist_plan(entries[0], source_platform, snapshot)
+            self.journal.record_result(item_key, item['name'], result)
+            return result
+
+    def resume_plan_entry(self, entry, snapshot):
+        # Rebuilds the entry's writes from where the target is now to the
+        # journaled end state; tracks were matched when it was planned
+        target_platform = entry['target_platform']
+        if entry['create']:
+            target_playlist = snapshot.playlist_by_name(target_platform, entry['name'])
+        else:
+            target_playlist = snapshot.playlist_by_id(target_platform, entry['target_id'])
+        if target_playlist is None:
+            if not entry['create']:
+                raise SyncError(f"Playlist {entry['name']} no longer exists on {target_platform}")
+            return entry
+
+        target_tracks = self._fetch_tracks(snapshot, target_platform, target_playlist)
+        operations = playlist_diff.diff_playlists(entry['merged'], target_tracks)
+        return dict(entry,
+                    target_id=target_playlist['id'],
+                    target_version=target_playlist.get('version'),
+                    create=False,
+                    remove=[{'id': op['track']['id'], 'name': op['track']['name'], 'position': op['position']}
+                            for op in playlist_diff.deletes(operations)],
+                    add=[op['track'] for op in playlist_diff.inserts(operations)])
+
+    def plan_all_playlists(self):
+        snapshot = self.create_snapshot()
+        spotify_playlists = list(snapshot.playlists('spotify'))
+        tidal_playlists = list(snapshot.playlists('tidal'))
+        work, skipped = self.select_changed_playlists(spotify_playlists, tidal_playlists)
+        plan = self.plan_many(work, snapshot)
+        plan['skipped'] = skipped
+        return plan
+
+    def plan_specific_playlists(self, playlist_names):
+        snapshot = self.create_snapshot()
+        return self.plan_many(self.select_named_playlists(playlist_names, snapshot.playlist_by_name), snapshot)
+
+    def plan_many(self, work, snapshot):
+        def plan_work_item(item, source_platform, snapshot):
+            if source_platform == BOTH:
+                return self.plan_pair(item['spotify'], item['tidal'], snapshot)
+            return [self.plan_playlist(item, source_platform, snapshot, simulate=True)]
+
+        report = self.sync_many(work, snapshot, sync=plan_work_item)
+        entries = [entry for entries in report['synced'] for entry in entries]
+        return sync_plan.create_plan(entries, report['failed'], self.get_estimate(entries))
+
+    def get_estimate(self, entries):
+        return sync_plan.estimate_cost(entries, {'spotify': self.spotify, 'tidal': self.tidal},
+                                       self.requests_per_second, parallel=self.jobs > 1)
+
+    def apply_plan(self, plan):
+        entries = plan['playlists']
+        logger.info(f"Applying plan with {len(entries)} playlists, estimated "
+                    f"{plan['estimate']['api_calls']} API calls")
+
+        # Both sides of a merged pair are applied together so their base is only
+        # recorded once both succeeded
+        work = []
+        pairs = OrderedDict()
+        for entry in entries:
+            if entry.get('pair'):
+                pair_key = (entry['pair']['spotify_id'], entry['pair']['tidal_id'])
+                if pair_key not in pairs:
+                    pairs[pair_key] = {'name': entry['name'], 'entries': []}
+                    work.append((pairs[pair_key], BOTH))
+                pairs[pair_key]['entries'].append(entry)
+            else:
+                work.append((entry, entry['source_platform']))
+
+        def apply_work_item(item, source_platform, snapshot):
+            if source_platform == BOTH:
+                return self.apply_pair_plan(item['entries'], snapshot)
+            return self.apply_playlist_plan(item, source_platform, snapshot)
+
+        return self.sync_many(work, sync=apply_work_item)
 
     def get_common_playlists(self):
-        spotify_playlists = self.spotify.get_playlists()
-        tidal_playlists = self.tidal.get_playlists()
+        snapshot = self.create_snapshot()
+        spotify_playlists = snapshot.playlists('spotify')
+        tidal_playlists = snapshot.playlists('tidal')
 
         spotify_names = set(playlist['name'] for playlist in spotify_playlists)
         tidal_names = set(playlist['name'] for playlist in tidal_playlists)
@@ -82,97 +469,620 @@ class SyncManager:
         return list(common_names)
 
     def sync_single_playlist(self, source_platform, target_platform, playlist_id):
-        source_client = self.spotify if source_platform == 'spotify' else self.tidal
-        target_client = self.tidal if target_platform == 'tidal' else self.spotify
-
-        playlist = next((p for p in source_client.get_playlists() if p['id'] == playlist_id), None)
+        snapshot = self.create_snapshot()
+        playlist = snapshot.playlist_by_id(source_platform, playlist_id)
         if not playlist:
             return {"error": "Playlist not found"}
 
         try:
-            self.sync_playlist(playlist, source_platform)
+            self.sync_playlist(playlist, source_platform, snapshot)
             return {"message": f"Playlist '{playlist['name']}' synced successfully"}
         except SyncError as e:
             return {"error": str(e)}
 
-    def sync_playlist(self, playlist, source_platform='spotify'):
+    @staticmethod
+    def _write_in_chunks(write, playlist_id, track_ids, chunk_size, action, playlist_name, platform, first=0):
+        # Returns the number of tracks written and the errors of the chunks that
+        # failed. `first` is the position of track_ids[0] among all tracks
+        # written, for error messages
+        written = 0
+        errors = []
+        for start in range(0, len(track_ids), chunk_size):
+            chunk = track_ids[start:start + chunk_size]
+            try:
+                write(playlist_id, chunk)
+                written += len(chunk)
+            except Exception as e:
+                errors.append(SyncManager.chunk_write_error(action, first + start, chunk, playlist_name, platform, e))
+        return written, errors
+
+    @staticmethod
+    def chunk_write_error(action, start, chunk, playlist_name, platform, error):
+        message = (f"Error {action} tracks {start}-{start + len(chunk) - 1} "
+                   f"for playlist {playlist_name} on {platform}: {str(error)}")
+        logger.error(message)
+        return message
+
+    @contextmanager
+    def _sync_errors(self, playlist_name):
         try:
-            source_platform = 'spotify' if isinstance(playlist, dict) else 'tidal'
-            target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+            yield
+        except SyncError:
+            raise
+        except (AuthenticationError, PlaylistModificationError) as e:
+            logger.error(f"Error syncing playlist {playlist_name}: {str(e)}")
+            raise SyncError(f"Error syncing playlist {playlist_name}: {str(e)}")
+        except (ValueError, KeyError) as e:
+            logger.error(f"Data error syncing playlist {playlist_name}: {str(e)}")
+            raise SyncError(f"Data error syncing playlist {playlist_name}: {str(e)}")
+        except IOError as e:
+            logger.error(f"I/O error syncing playlist {playlist_name}: {str(e)}")
+            raise SyncError(f"I/O error syncing playlist {playlist_name}: {str(e)}")
+        except Exception as e:
+            logger.exception(f"Unexpected error syncing playlist {playlist_name}: {str(e)}")
+            raise SyncError(f"Unexpected error syncing playlist {playlist_name}: {str(e)}")
 
-            source_client = self.spotify if source_platform == 'spotify' else self.tidal
-            target_client = self.tidal if target_platform == 'tidal' else self.spotify
+    def _fetch_tracks(self, snapshot, platform, playlist):
+        try:
+            tracks = snapshot.tracks(platform, playlist['id'])
+        except Exception as e:
+            logger.error(f"Error fetching tracks for playlist {playlist['name']} from {platform}: {str(e)}")
+            raise SyncError(f"Error fetching tracks for playlist {playlist['name']} from {platform}: {str(e)}")
+        self.catalog_tracks(platform, tracks)
+        return tracks
 
-            # Get source playlist tracks
+    def _fetch_track_pages(self, snapshot, platform, playlist):
+        pages = snapshot.track_pages(platform, playlist['id'])
+        while True:
             try:
-                source_tracks = source_client.get_playlist_tracks(playlist['id'])
+                page = next(pages)
+            except StopIteration:
+                return
             except Exception as e:
-                logger.error(f"Error fetching tracks for playlist {playlist['name']} from {source_platform}: {str(e)}")
-                raise SyncError(
-                    f"Error fetching tracks for playlist {playlist['name']} from {source_platform}: {str(e)}")
+                logger.error(f"Error fetching tracks for playlist {playlist['name']} from {platform}: {str(e)}")
+                raise SyncError(f"Error fetching tracks for playlist {playlist['name']} from {platform}: {str(e)}")
+            self.catalog_tracks(platform, page)
+            yield page
+
+    def match_index(self, platform):
+        # Built from the tracks cached by earlier runs the first time it is needed
+        with self.match_lock:
+            if platform not in self.match_indexes:
+                self.match_indexes[platform] = MatchIndex(self.db.get_cached_tracks(platform))
+                logger.info(f"Loaded {len(self.match_indexes[platform])} {platform} tracks into the match index")
+            return self.match_indexes[platform]
 
-            # Check if playlist exists on target platform
-            target_playlist = next((p for p in target_client.get_playlists() if p['name'] == playlist['name']), None)
+    def catalog_tracks(self, platform, tracks):
+        # Every track read from a platform is kept as a local match candidate
+        self.db.cache_tracks(platform, tracks)
+        self.match_index(platform).add_all(tracks)
+
+    def sync_playlist(self, playlist, source_platform='spotify', snapshot=None):
+        # One-way sync as a pipeline: each source page is matched and its
+        # additions written while the next page is still being fetched.
+        # Removals are only known once the whole source is in, so they go last;
+        # additions land at the end of the playlist and leave their positions be.
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(playlist['name']):
+            target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+            target_client = snapshot.clients[target_platform]
 
+            target_playlist = snapshot.playlist_by_name(target_platform, playlist['name'])
             if target_playlist is None:
-                # Create playlist on target platform if it doesn't exist
-                try:
-                    target_playlist_id = target_client.create_playlist(playlist['name'])
-                except Exception as e:
-                    logger.error(f"Error creating playlist {playlist['name']} on {target_platform}: {str(e)}")
-                    raise SyncError(f"Error creating playlist {playlist['name']} on {target_platform}: {str(e)}")
+                target_playlist_id = self._create_target_playlist(snapshot, target_platform, playlist['name'])
+                target_tracks = []
             else:
                 target_playlist_id = target_playlist['id']
+                target_tracks = self._fetch_tracks(snapshot, target_platform, target_playlist)
+            target_positions = playlist_diff.index_positions(target_tracks)
+            resolve = self.counterpart_resolver(target_tracks, target_platform)
 
-            # Get target playlist tracks
-            try:
-                target_tracks = target_client.get_playlist_tracks(target_playlist_id)
-            except Exception as e:
-                logger.error(f"Error fetching tracks for playlist {playlist['name']} from {target_platform}: {str(e)}")
-                raise SyncError(
-                    f"Error fetching tracks for playlist {playlist['name']} from {target_platform}: {str(e)}")
-
-            # Find tracks to add and remove
-            source_track_ids = set(track['id'] for track in source_tracks)
-            target_track_ids = set(track['id'] for track in target_tracks)
-
-            tracks_to_add = source_track_ids - target_track_ids
-            tracks_to_remove = target_track_ids - source_track_ids
-
-            # Add new tracks
-            for track_id in tracks_to_add:
-                track = next(track for track in source_tracks if track['id'] == track_id)
-                matching_track = utils.find_matching_track(track, target_client)
-                if matching_track:
-                    try:
-                        target_client.add_tracks_to_playlist(target_playlist_id, [matching_track['id']])
-                    except Exception as e:
-                        logger.error(f"Error adding track {track['name']} to playlist on {target_platform}: {str(e)}")
-                else:
-                    logger.warning(
-                        f"No matching track found for {track['name']} by {', '.join(track['artists'])} on the target platform")
+            chunk_size = target_client.write_chunk_size
+            seen = Counter()
+            matches = {}
+            source_tracks = []
+            added_tracks = []
+            pending = []
+            errors = []
+            written = 0
+            added = 0
+            unmatched = 0
+            for page in self._fetch_track_pages(snapshot, source_platform, playlist):
+                # Source tracks count against target copies of the same recording
+                keys = resolve(page, source_platform)
+                operations = []
+                for track in page:
+                    key = keys[track['id']]
+                    seen[key] += 1
+                    if seen[key] > len(target_positions.get(key, ())):
+                        operations.append({'op': playlist_diff.INSERT, 'track': track})
+                matches.update(self.match_tracks(
+                    [op for op in operations if op['track']['id'] not in matches], source_platform, snapshot.clients))
+                additions, page_unmatched = self._resolve_additions(operations, matches)
+                unmatched += len(page_unmatched)
+                source_tracks += [self._compact_track(track) for track in page]
+                added_tracks += [self._compact_track(track) for track in additions]
 
-            # Remove tracks
-            for track_id in tracks_to_remove:
-                track = next(track for track in target_tracks if track['id'] == track_id)
-                try:
-                    target_client.remove_tracks_from_playlist(target_playlist_id, [track['id']])
-                except Exception as e:
-                    logger.error(f"Error removing track {track['name']} from playlist on {target_platform}: {str(e)}")
+                pending += [track['id'] for track in additions]
+                full = len(pending) - len(pending) % chunk_size
+                if full:
+                    chunk_added, chunk_errors = self._write_in_chunks(
+                        target_client.add_tracks_to_playlist, target_playlist_id, pending[:full], chunk_size,
+                        'adding', playlist['name'], target_platform, first=written)
+                    added += chunk_added
+                    errors += chunk_errors
+                    written += full
+                    pending = pending[full:]
+            chunk_added, chunk_errors = self._write_in_chunks(
+                target_client.add_tracks_to_playlist, target_playlist_id, pending, chunk_size, 'adding',
+                playlist['name'], target_platform, first=written)
+            added += chunk_added
+            errors += chunk_errors
+            written += len(pending)
+
+            # Target copies beyond those the source has, highest position first
+            removals = sorted(({'id': target_tracks[position]['id'], 'name': target_tracks[position]['name'],
+                                'position': position}
+                               for track_id, positions in target_positions.items()
+                               for position in positions[seen[track_id]:]),
+                              key=lambda removal: removal['position'], reverse=True)
+            removed, removal_errors = self._write_in_chunks(self._removal_writer(target_client), target_playlist_id,
+                                                            removals, chunk_size, 'removing', playlist['name'],
+                                                            target_platform)
+            errors += removal_errors
+            if removals or written:
+                snapshot.invalidate_tracks(target_platform, target_playlist_id)
+            if not errors:
+                removed_positions = {removal['position'] for removal in removals}
+                kept = [self._compact_track(track) for position, track in enumerate(target_tracks)
+                        if position not in removed_positions]
+                self.record_one_way_base(source_platform, playlist['id'], target_platform, target_playlist_id,
+                                         source_tracks, kept + added_tracks)
 
-            # Update cache
             self.db.cache_playlist(source_platform, playlist['id'], utils.get_current_timestamp())
             self.db.cache_playlist(target_platform, target_playlist_id, utils.get_current_timestamp())
 
-        except (AuthenticationError, PlaylistModificationError) as e:
-            logger.error(f"Error syncing playlist {playlist['name']}: {str(e)}")
-            raise SyncError(f"Error syncing playlist {playlist['name']}: {str(e)}")
-        except (ValueError, KeyError) as e:
-            logger.error(f"Data error syncing playlist {playlist['name']}: {str(e)}")
-            raise SyncError(f"Data error syncing playlist {playlist['name']}: {str(e)}")
-        except IOError as e:
-            logger.error(f"I/O error syncing playlist {playlist['name']}: {str(e)}")
-            raise SyncError(f"I/O error syncing playlist {playlist['name']}: {str(e)}")
+            return {
+                'playlist': playlist['name'],
+                'added': added,
+                'removed': removed,
+                'unmatched': unmatched,
+                'errors': errors
+            }
+
+    def sync_pair(self, spotify_playlist, tidal_playlist, snapshot=None):
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(spotify_playlist['name']):
+            entries = self.plan_pair(spotify_playlist, tidal_playlist, snapshot)
+            return self.apply_pair_plan(entries, snapshot)
+
+    def shared_key(self, tracks, platform, counterparts, counterpart_platform):
+        # Returns a diff key putting the tracks in the id space of their
+        # counterparts on the other platform; see counterpart_resolver
+        keys = self.counterpart_resolver(counterparts, counterpart_platform)(tracks, platform)
+
+        def key(track):
+            return keys.get(track['id'], track['id'])
+        return key
+
+    def counterpart_resolver(self, counterparts, counterpart_platform):
+        # Returns resolve(tracks, platform), mapping the id of each track to
+        # the counterpart it was matched to, else the one with its ISRC, else
+        # the one with its canonical track key. A track with none of these
+        # maps to (platform, id), which no counterpart shares.
+        counterpart_ids = {str(track['id']): track['id'] for track in counterparts}
+        counterpart_isrcs = self.known_isrcs(counterparts, counterpart_platform)
+        by_isrc = {}
+        by_canonical_key = {}
+        for track in counterparts:
+            if counterpart_isrcs.get(track['id']):
+                by_isrc.setdefault(counterpart_isrcs[track['id']], track['id'])
+            by_canonical_key.setdefault(utils.canonical_track_key(track), track['id'])
+
+        def resolve(tracks, platform):
+            matched = self.db.get_track_counterparts(platform, [track['id'] for track in tracks])
+            isrcs = self.known_isrcs(tracks, platform)
+            keys = {}
+            for track in tracks:
+                shared = counterpart_ids.get(matched.get(track['id']))
+                if shared is None and isrcs.get(track['id']):
+                    shared = by_isrc.get(isrcs[track['id']])
+                if shared is None:
+                    shared = by_canonical_key.get(utils.canonical_track_key(track))
+                keys[track['id']] = shared if shared is not None else (platform, track['id'])
+            return keys
+        return resolve
+
+    def match_tracks(self, operations, source_platform, clients):
+        # Resolves each distinct source track of the insert operations once. A
+        # track another worker is already looking up is waited for rather than
+        # looked up again, as is one settled earlier in a library-wide pass.
+        tracks = {}
+        for op in playlist_diff.inserts(operations):
+            tracks.setdefault(op['track']['id'], op['track'])
+        owned, waiting = self._claim_lookups(tracks.values(), source_platform)
+        try:
+            matches = self.lookup_tracks(owned, source_platform, clients)
+        except BaseException as e:
+            self._settle_lookups(owned, source_platform, {}, error=e)
+            raise
+        self._settle_lookups(owned, source_platform, matches)
+        for track, lookup in waiting:
+            matches[track['id']] = lookup.result()
+        return matches
+
+    def _claim_lookups(self, tracks, source_platform):
+        # Splits the tracks into those this caller looks up, and those already
+        # claimed by another lookup paired with its future
+        owned = []
+        waiting = []
+        with self.match_lock:
+            for track in tracks:
+                key = (source_platform, track['id'])
+                if key in self.track_lookups:
+                    waiting.append((track, self.track_lookups[key]))
+                else:
+                    self.track_lookups[key] = Future()
+                    owned.append(track)
+        return owned, waiting
+
+    def _settle_lookups(self, tracks, source_platform, matches, error=None):
+        with self.match_lock:
+            for track in tracks:
+                key = (source_platform, track['id'])
+                lookup = self.track_lookups[key]
+                if error is None:
+                    lookup.set_result(matches.get(track['id']))
+                else:
+                    lookup.set_exception(error)
+                if error is not None or not self.keep_lookups:
+                    del self.track_lookups[key]
+
+    def lookup_tracks(self, tracks, source_platform, clients):
+        # From the match table if matched before, else from the local index,
+        # by ISRC, and by text search only if all of those fail
+        target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+        target_client = clients[target_platform]
+        matches = {}
+        unknown = []
+        for track in tracks:
+            matches[track['id']] = self.known_match(track, source_platform, target_platform)
+            if matches[track['id']] is None:
+                unknown.append(track)
+        unknown = self.skip_recent_misses(unknown, source_platform, target_platform, matches)
+
+        isrcs = self.hydrate_isrcs(unknown, source_platform, clients[source_platform])
+        unresolved = []
+        for track in unknown:
+            isrc = isrcs.get(track['id'])
+            match, method, confidence = self.index_match(track, isrc, target_platform)
+            if match is None and isrc:
+                match = utils.find_track_by_isrc(track, isrc, target_client)
+                method = 'isrc'
+            if match is None:
+                unresolved.append(track)
+                continue
+            self.remember_match(track, source_platform, match, target_platform, method, confidence)
+            matches[track['id']] = match
+
+        if unresolved:
+            found = utils.find_matching_tracks(unresolved, target_client, self.search_candidates,
+                                               self.match_threshold)
+            missed = []
+            for track in unresolved:
+                match, score = found[track['id']]
+                if match:
+                    self.remember_match(track, source_platform, match, target_platform, 'search', score)
+                elif score is not None:
+                    # The search worked but found nothing good enough
+                    missed.append(track['id'])
+                matches[track['id']] = match
+            self.db.store_track_misses(source_platform, missed)
+        return matches
+
+    def skip_recent_misses(self, tracks, source_platform, target_platform, matches):
+        # Tracks that found no match within the last miss_ttl_days are only
+        # looked for in the local index; returns the tracks still to look up
+        since = (datetime.datetime.now() - datetime.timedelta(days=self.miss_ttl_days)).isoformat()
+        missed = self.db.get_track_misses(source_platform, [track['id'] for track in tracks], since)
+        for track in tracks:
+            if track['id'] in missed:
+                match, method, confidence = self.index_match(track, track.get('isrc'), target_platform)
+                if match:
+                    self.remember_match(track, source_platform, match, target_platform, method, confidence)
+                matches[track['id']] = match
+        if missed:
+            logger.info(f"Skipping lookups of {len(missed)} tracks that recently had no match")
+        return [track for track in tracks if track['id'] not in missed]
+
+    def index_match(self, track, isrc, target_platform):
+        # Returns (match, 'index', confidence) from the local match index, or Nones
+        found = self.match_index(target_platform).find(track, isrc)
+        if found is None:
+            return None, None, None
+        return found[0], 'index', found[1]
+
+    def known_isrcs(self, tracks, source_platform):
+        # ISRCs known without asking the platform, carried by the track itself or
+        # hydrated on an earlier run; None means the track has none
+        isrcs = {track['id']: track['isrc'] for track in tracks if 'isrc' in track}
+        isrcs.update(self.db.get_track_isrcs(source_platform,
+                                             [track['id'] for track in tracks if track['id'] not in isrcs]))
+        return isrcs
+
+    def hydrate_isrcs(self, tracks, source_platform, source_client):
+        isrcs = self.known_isrcs(tracks, source_platform)
+        missing = [track['id'] for track in tracks if track['id'] not in isrcs]
+        if missing:
+            try:
+                fetched = source_client.get_track_isrcs(missing)
+            except Exception as e:
+                logger.error(f"Error fetching ISRCs from {source_platform}: {str(e)}")
+                return isrcs
+            self.store_isrcs(source_platform, missing, fetched)
+            isrcs.update(fetched)
+        return isrcs
+
+    def store_isrcs(self, platform, track_ids, isrcs):
+        self.db.store_track_isrcs(platform, {track_id: isrcs.get(track_id) for track_id in track_ids})
+
+    def known_match(self, track, source_platform, target_platform):
+        match = self.db.get_track_match(source_platform, track['id'])
+        if match is None:
+            return None
+        return self.db.get_cached_track(target_platform, match[f'{target_platform}_id'])
+
+    def remember_match(self, track, source_platform, match, target_platform, method='search', confidence=None):
+        # Both tracks are cached so the match can be served either way round
+        self.catalog_tracks(source_platform, [track])
+        self.catalog_tracks(target_platform, [match])
+        track_ids = {source_platform: track['id'], target_platform: match['id']}
+        if confidence is None:
+            confidence = 1.0 if method == 'isrc' else utils.match_confidence(track, match)
+        self.db.store_track_match(track_ids['spotify'], track_ids['tidal'], confidence, method)
+
+    def plan_playlist(self, playlist, source_platform='spotify', snapshot=None, simulate=False):
+        # Works out every write needed to bring the target playlist in line with
+        # the source without touching either platform. With simulate, the snapshot
+        # is updated as if the plan had been applied, so that planning the other
+        # direction of the pair sees the post-sync state.
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(playlist['name']):
+            target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+            source_tracks, target_playlist, target_tracks, operations = self._playlist_operations(
+                playlist, source_platform, snapshot)
+            matches = self.match_tracks(operations, source_platform, snapshot.clients)
+            entry = self.build_plan_entry(playlist, source_platform, target_playlist, target_tracks, operations,
+                                          matches, source_tracks=source_tracks)
+
+            if simulate and target_playlist is not None and (entry['remove'] or entry['add']):
+                snapshot.replace_tracks(target_platform, target_playlist['id'], entry['merged'])
+            return entry
+
+    def plan_pair(self, spotify_playlist, tidal_playlist, snapshot=None):
+        # Three-way merge against the pair's track lists as of its last clean
+        # sync: each side only receives the changes made on the other side since
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(spotify_playlist['name']):
+            spotify_tracks, tidal_tracks, tidal_operations, spotify_operations = self._pair_operations(
+                spotify_playlist, tidal_playlist, snapshot)
+            matches = (self.match_tracks(tidal_operations, 'spotify', snapshot.clients),
+                       self.match_tracks(spotify_operations, 'tidal', snapshot.clients))
+            return self.build_pair_entries(spotify_playlist, tidal_playlist, spotify_tracks, tidal_tracks,
+                                           (tidal_operations, spotify_operations), matches)
+
+    def _playlist_operations(self, playlist, source_platform, snapshot):
+        # Returns the source tracks, the target playlist (None if missing), its
+        # tracks, and the operations bringing it in line with the source
+        target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+        source_tracks = self._fetch_tracks(snapshot, source_platform, playlist)
+
+        # Check if playlist exists on target platform
+        target_playlist = snapshot.playlist_by_name(target_platform, playlist['name'])
+        if target_playlist is None:
+            target_tracks = []
+        else:
+            target_tracks = self._fetch_tracks(snapshot, target_platform, target_playlist)
+        operations = self.diff_playlist_tracks(source_tracks, source_platform, target_tracks, target_platform)
+        return source_tracks, target_playlist, target_tracks, operations
+
+    def diff_playlist_tracks(self, source_tracks, source_platform, target_tracks, target_platform):
+        key = self.shared_key(source_tracks, source_platform, target_tracks, target_platform)
+        return playlist_diff.diff_playlists(source_tracks, target_tracks, key=key)
+
+    def _pair_operations(self, spotify_playlist, tidal_playlist, snapshot):
+        # Returns both track lists and the operations for the tidal and the
+        # spotify side, merged against the pair's base
+        spotify_tracks = self._fetch_tracks(snapshot, 'spotify', spotify_playlist)
+        tidal_tracks = self._fetch_tracks(snapshot, 'tidal', tidal_playlist)
+        tidal_operations, spotify_operations = self.merge_pair_tracks(spotify_playlist, tidal_playlist,
+                                                                      spotify_tracks, tidal_tracks)
+        return spotify_tracks, tidal_tracks, tidal_operations, spotify_operations
+
+    def merge_pair_tracks(self, spotify_playlist, tidal_playlist, spotify_tracks, tidal_tracks):
+        # Returns the operations for the tidal and the spotify side
+        base = self.db.get_playlist_pair_base(spotify_playlist['id'], tidal_playlist['id']) or {}
+
+        key = self.shared_key(tidal_tracks + base.get('tidal', []), 'tidal',
+                              spotify_tracks + base.get('spotify', []), 'spotify')
+        return playlist_diff.three_way_merge(
+            base.get('spotify', []), spotify_tracks, base.get('tidal', []), tidal_tracks, key=key)
+
+    @staticmethod
+    def _compact_track(track):
+        return Track(track['id'], track['name'], track['artists'])
+
+    def _resolve_additions(self, operations, matches):
+        # Returns the matched tracks of the insert operations in order, and the
+        # source tracks that could not be matched
+        additions = []
+        unmatched = []
+        for op in playlist_diff.inserts(operations):
+            track = op['track']
+            matching_track = matches.get(track['id'])
+            if matching_track:
+                additions.append(matching_track)
+            else:
+                unmatched.append(self._compact_track(track))
+                utils.log_warning(
+                    f"No matching track found for {track['name']} by {', '.join(track['artists'])} on the target platform")
+        return additions, unmatched
+
+    def build_plan_entry(self, playlist, source_platform, target_playlist, target_tracks, operations, matches,
+                         source_tracks=None):
+        # One-way entries carry their source tracks, which become the source
+        # side of the pair's base once the entry is applied
+        target_platform = 'tidal' if source_platform == 'spotify' else 'spotify'
+
+        # Resolve all additions first, in source order, so they can be written in batches
+        additions, unmatched = self._resolve_additions(operations, matches)
+
+        # Deletes are ordered highest position first, so every chunk leaves
+        # the positions of the following chunks untouched
+        removals = [{'id': op['track']['id'], 'name': op['track']['name'], 'position': op['position']}
+                    for op in playlist_diff.deletes(operations)]
+
+        # The target's track list once the entry is applied
+        removed_positions = {removal['position'] for removal in removals}
+        merged = [self._compact_track(track) for position, track in enumerate(target_tracks)
+                  if position not in removed_positions] + [self._compact_track(track) for track in additions]
+
+        entry = {
+            'name': playlist['name'],
+            'source_platform': source_platform,
+            'source_id': playlist['id'],
+            'target_platform': target_platform,
+            'target_id': target_playlist['id'] if target_playlist else None,
+            'target_version': target_playlist.get('version') if target_playlist else None,
+            'create': target_playlist is None,
+            'remove': removals,
+            'add': additions,
+            'unmatched': unmatched,
+            'merged': merged
+        }
+        if source_tracks is not None:
+            entry['source_tracks'] = [self._compact_track(track) for track in source_tracks]
+        return entry
+
+    def build_pair_entries(self, spotify_playlist, tidal_playlist, spotify_tracks, tidal_tracks, operations,
+                           matches):
+        # `operations` and `matches` hold the tidal side's, then the spotify side's
+        pair = {'spotify_id': spotify_playlist['id'], 'tidal_id': tidal_playlist['id']}
+        entries = []
+        for (source_playlist, source_platform, target_playlist, target_tracks), side_operations, side_matches in zip(
+                ((spotify_playlist, 'spotify', tidal_playlist, tidal_tracks),
+                 (tidal_playlist, 'tidal', spotify_playlist, spotify_tracks)), operations, matches):
+            entry = self.build_plan_entry(source_playlist, source_platform, target_playlist, target_tracks,
+                                          side_operations, side_matches)
+            entry['pair'] = pair
+            entries.append(entry)
+        return entries
+
+    def apply_pair_plan(self, entries, snapshot=None):
+        snapshot = snapshot or self.create_snapshot()
+        results = [self.apply_playlist_plan(entry, entry['source_platform'], snapshot) for entry in entries]
+        self.record_pair_base(entries, results)
+        return self.pair_result(entries, results)
+
+    @staticmethod
+    def pair_result(entries, results):
+        return {
+            'playlist': entries[0]['name'],
+            'added': sum(result['added'] for result in results),
+            'removed': sum(result['removed'] for result in results),
+            'unmatched': sum(result['unmatched'] for result in results),
+            'errors': [error for result in results for error in result['errors']]
+        }
+
+    def record_pair_base(self, entries, results):
+        # A side's base only moves together with the other's, otherwise changes
+        # that failed to reach one side would be taken for already synced
+        if any(result['errors'] for result in results):
+            return
+        pair = entries[0]['pair']
+        self.db.store_playlist_pair_base(pair['spotify_id'], pair['tidal_id'],
+                                         {entry['target_platform']: entry['merged'] for entry in entries})
+
+    def record_one_way_base(self, source_platform, source_id, target_platform, target_id, source_tracks,
+                            target_tracks):
+        # After a clean one-way sync the two playlists are merged as a pair from
+        # the next run on, against what each side holds now; without a base
+        # that merge would be a plain union and undo deletions
+        ids = {source_platform: source_id, target_platform: target_id}
+        self.db.store_playlist_pair_base(ids['spotify'], ids['tidal'],
+                                         {source_platform: source_tracks, target_platform: target_tracks})
+
+    @staticmethod
+    def _create_target_playlist(snapshot, platform, name):
+        # Create playlist on target platform if it doesn't exist
+        try:
+            playlist_id = snapshot.clients[platform].create_playlist(name)
+            snapshot.add_playlist(platform, {'id': playlist_id, 'name': name, 'tracks': 0})
+            return playlist_id
         except Exception as e:
-            logger.exception(f"Unexpected error syncing playlist {playlist['name']}: {str(e)}")
-            raise SyncError(f"Unexpected error syncing playlist {playlist['name']}: {str(e)}")
+            raise SyncManager.creation_error(platform, name, e)
+
+    @staticmethod
+    def creation_error(platform, name, error):
+        logger.error(f"Error creating playlist {name} on {platform}: {str(error)}")
+        return SyncError(f"Error creating playlist {name} on {platform}: {str(error)}")
+
+    @staticmethod
+    def _removal_writer(target_client):
+        def remove_chunk(playlist_id, chunk):
+            target_client.remove_tracks_from_playlist(playlist_id, [removal['id'] for removal in chunk],
+                                                      [removal['position'] for removal in chunk])
+        return remove_chunk
+
+    def apply_playlist_plan(self, entry, source_platform=None, snapshot=None):
+        snapshot = snapshot or self.create_snapshot()
+        with self._sync_errors(entry['name']):
+            target_platform = entry['target_platform']
+            target_client = snapshot.clients[target_platform]
+
+            if entry['create']:
+                target_playlist_id = self._create_target_playlist(snapshot, target_platform, entry['name'])
+            else:
+                target_playlist_id = entry['target_id']
+
+            self.check_target_version(entry, snapshot.playlist_by_id(target_platform, target_playlist_id))
+
+            removals = entry['remove']
+            uris_to_add = [track['id'] for track in entry['add']]
+
+            removed, removal_errors = self._write_in_chunks(self._removal_writer(target_client), target_playlist_id,
+                                                            removals, target_client.write_chunk_size, 'removing',
+                                                            entry['name'], target_platform)
+            added, add_errors = self._write_in_chunks(target_client.add_tracks_to_playlist, target_playlist_id,
+                                                      uris_to_add, target_client.write_chunk_size, 'adding',
+                                                      entry['name'], target_platform)
+            errors = removal_errors + add_errors
+            if removals or uris_to_add:
+                snapshot.invalidate_tracks(target_platform, target_playlist_id)
+            return self.record_applied_entry(entry, target_playlist_id, added, removed, errors)
+
+    @staticmethod
+    def check_target_version(entry, current):
+        # Removals address tracks by position, which is only safe on the
+        # playlist version the plan was computed against
+        if entry['remove'] and entry['target_version'] is not None:
+            if current is None or current.get('version') != entry['target_version']:
+                raise SyncError(f"Playlist {entry['name']} on {entry['target_platform']} changed since it was planned")
+
+    def record_applied_entry(self, entry, target_playlist_id, added, removed, errors):
+        # Stores what applying the entry left behind and returns its result
+        if not errors and 'source_tracks' in entry:
+            self.record_one_way_base(entry['source_platform'], entry['source_id'], entry['target_platform'],
+                                     target_playlist_id, entry['source_tracks'], entry['merged'])
+
+        # Update cache
+        self.db.cache_playlist(entry['source_platform'], entry['source_id'], utils.get_current_timestamp())
+        self.db.cache_playlist(entry['target_platform'], target_playlist_id, utils.get_current_timestamp())
+
+        return {
+            'playlist': entry['name'],
+            'added': added,
+            'removed': removed,
+            'unmatched': len(entry['unmatched']),
+            'errors': errors
+        }
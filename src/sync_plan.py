@@ -0,0 +1,59 @@
+import json
+import logging
+
+import utils
+from models import to_json
+
+logger = logging.getLogger(__name__)
+
+PLAN_FORMAT_VERSION = 1
+
+
+def estimate_cost(entries, clients, requests_per_second, parallel=False):
+    calls = {platform: 0 for platform in clients}
+    for entry in entries:
+        calls[entry['target_platform']] += clients[entry['target_platform']].estimate_write_calls(
+            entry['create'], len(entry['add']), len(entry['remove']))
+
+    seconds = {platform: calls[platform] / requests_per_second[platform] for platform in calls}
+    return {
+        'api_calls': sum(calls.values()),
+        'seconds': max(seconds.values()) if parallel else sum(seconds.values()),
+        'platforms': {platform: {'api_calls': calls[platform], 'seconds': seconds[platform]}
+                      for platform in calls}
+    }
+
+
+def create_plan(entries, failed, estimate):
+    return {
+        'format_version': PLAN_FORMAT_VERSION,
+        'created_at': utils.get_current_timestamp(),
+        'playlists': entries,
+        'failed': failed,
+        'estimate': estimate
+    }
+
+
+def summarize_plan(plan):
+    entries = plan['playlists']
+    estimate = plan['estimate']
+    return (f"{len(entries)} playlists "
+            f"({sum(1 for entry in entries if entry['create'])} to create): "
+            f"{sum(len(entry['add']) for entry in entries)} tracks to add, "
+            f"{sum(len(entry['remove']) for entry in entries)} to remove, "
+            f"{sum(len(entry['unmatched']) for entry in entries)} unmatched. "
+            f"Estimated {estimate['api_calls']} API calls, about {estimate['seconds']:.0f} seconds")
+
+
+def save_plan(plan, path):
+    with open(path, 'w') as f:
+        json.dump(plan, f, indent=2, default=to_json)
+    logger.info(f"Sync plan saved to {path}")
+
+
+def load_plan(path):
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get('format_version') != PLAN_FORMAT_VERSION:
+        raise ValueError(f"Unsupported sync plan format in {path}")
+    return plan
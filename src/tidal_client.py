@@ -1,9 +1,14 @@
 import datetime
 import logging
+import math
 
 import requests
 import tidalapi
-from tidalapi.exceptions import AuthenticationError, TooManyRequests, ObjectNotFound
+from tidalapi.exceptions import AuthenticationError, TooManyRequests, ObjectNotFound, InvalidISRC
+
+import utils
+from models import Playlist, Track
+from http_session import page_concurrency, platform_session, platform_url
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +18,25 @@ class PlaylistModificationError(Exception):
 
 
 class TidalClient:
+    # Tracks requested per page when reading a playlist
+    track_page_size = 100
+    # Positions deleted per request; they all go in the request path
+    removal_batch_size = 100
+    # Tracks added per request: tidalapi posts each add as a single request,
+    # which Tidal applies to at most 100 tracks
+    max_write_chunk_size = 100
+    # Items per page when listing playlists and favorites, the most allowed
+    collection_page_size = 50
+
     def __init__(self, config, database):
         logger.info("Initializing TidalClient")
         self.config = config
         self.db = database
         self.session = None
         self.login_future = None
+        self.write_chunk_size = min(config.get('tidal', {}).get('write_chunk_size', 50), self.max_write_chunk_size)
+        # Pages of one listing requested at once, paced by the session's rate limiter
+        self.page_workers = page_concurrency(config)
         logger.info("Config loaded")
         self.login()
         logger.info("TidalClient initialization completed")
@@ -26,7 +44,7 @@ class TidalClient:
     def login(self, auth_code=None):
         try:
             logger.info("Starting Tidal login process")
-            self.session = tidalapi.Session()
+            self.session = self._new_session()
 
             if auth_code:
                 logger.info("Auth code provided, completing OAuth flow")
@@ -56,8 +74,20 @@ class TidalClient:
             logger.exception(f"Unexpected error during Tidal authentication: {str(e)}")
             return False
 
+    def _new_session(self):
+        # Every session talks over the same pooled connections
+        session = tidalapi.Session()
+        session.request_session = platform_session(self.config, 'tidal')
+        if platform_url(self.config, 'tidal', ''):
+            # The device login link still comes from Tidal itself; stored tokens sign in anywhere
+            session.config.api_v1_location = platform_url(self.config, 'tidal', 'v1/')
+            session.config.api_v2_location = platform_url(self.config, 'tidal', 'v2/')
+            session.config.openapi_v2_location = platform_url(self.config, 'tidal', 'openapi/v2/')
+            session.config.api_oauth2_token = platform_url(self.config, 'tidal', 'v1/oauth2/token')
+        return session
+
     def get_auth_url(self):
-        self.session = tidalapi.Session()
+        self.session = self._new_session()
         self.login_future = self.session.login_oauth()
         logger.info(f"Tidal auth URL: {self.login_future[0].verification_uri_complete}")
         return self.login_future[0].verification_uri_complete
@@ -113,7 +143,7 @@ class TidalClient:
                 session_data = eval(token)
                 expires_at = datetime.datetime.fromisoformat(expires_at)
                 if expires_at > datetime.datetime.now():
-                    self.session = tidalapi.Session()
+                    self.session = self._new_session()
                     self.session.load_oauth_session(
                         session_data['token_type'],
                         session_data['access_token'],
@@ -133,32 +163,79 @@ class TidalClient:
 
     def get_playlists(self):
         self.check_session()
-        playlists = self.session.user.playlists()
-        return [{
-            'id': playlist.id,
-            'name': playlist.name,
-            'tracks': playlist.num_tracks
-        } for playlist in playlists]
+        return [self._playlist(self.session.parse_playlist(item))
+                for item in self._collection(f'users/{self.session.user.id}/playlists')]
+
+    def get_favorite_playlists(self):
+        self.check_session()
+        return [self._playlist(self.session.parse_playlist(item['item']))
+                for item in self._collection(f'users/{self.session.user.id}/favorites/playlists')]
+
+    def get_favorite_tracks(self):
+        self.check_session()
+        return [Track.from_tidal(item['item'])
+                for item in self._collection(f'users/{self.session.user.id}/favorites/tracks')]
+
+    def _playlist(self, playlist):
+        return Playlist(playlist.id, playlist.name, playlist.num_tracks, self.get_playlist_version(playlist))
+
+    def _collection(self, path):
+        return [item for page in self._json_pages(path, self.collection_page_size) for item in page['items']]
+
+    def _json_pages(self, path, page_size):
+        # Raw JSON pages of a limit/offset listing, in order; all pages after
+        # the first are requested at once
+        def fetch_page(offset):
+            return self.session.request.request('GET', path, params={'limit': page_size, 'offset': offset}).json()
+
+        return utils.offset_pages(fetch_page, page_size,
+                                  lambda page: page.get('totalNumberOfItems', len(page['items'])),
+                                  self.page_workers)
+
+    @staticmethod
+    def get_playlist_version(playlist):
+        # Tidal has no snapshot id; the last update time together with the track
+        # count changes whenever the playlist contents do
+        last_updated = getattr(playlist, 'last_updated', None)
+        if last_updated is None:
+            return None
+        return f"{last_updated.isoformat()}/{playlist.num_tracks}"
 
     def get_playlist_tracks(self, playlist_id):
-        playlist = self.session.playlist(playlist_id)
-        tracks = playlist.tracks()
-        return [{
-            'id': track.id,
-            'name': track.name,
-            'artists': [artist.name for artist in track.artists],
-            'album': track.album.name,
-            'uri': f'tidal:track:{track.id}'
-        } for track in tracks]
+        return [track for page in self._playlist_track_pages(playlist_id) for track in page]
+
+    def iter_playlist_track_pages(self, playlist_id, prefetch=1):
+        # Yields the playlist's tracks a page at a time, fetching up to
+        # `prefetch` pages ahead while the caller works on the current one
+        return utils.prefetch(self._playlist_track_pages(playlist_id), prefetch)
+
+    def _playlist_track_pages(self, playlist_id):
+        # Reads the raw JSON pages straight into Track records, without
+        # building tidalapi's model objects for every track
+        for page in self._json_pages(f'playlists/{playlist_id}/tracks', self.track_page_size):
+            if page['items']:
+                yield [Track.from_tidal(item) for item in page['items'] if item.get('id') is not None]
 
     def create_playlist(self, name):
         playlist = self.session.user.create_playlist(name, "Created by Spotify-Tidal Sync")
         return playlist.id
 
+    def estimate_write_calls(self, create, adds, removes):
+        # Every write call loads the playlist first; tidalapi then posts each
+        # chunk of additions in a single request, and removals go in batches,
+        # each followed by re-reading the playlist for its new ETag
+        calls = 1 if create else 0
+        calls += 3 * math.ceil(adds / self.write_chunk_size)
+        for start in range(0, removes, self.write_chunk_size):
+            calls += 1 + 2 * math.ceil(min(self.write_chunk_size, removes - start) / self.removal_batch_size)
+        return calls
+
     def add_tracks_to_playlist(self, playlist_id, track_ids):
         try:
             playlist = self.session.playlist(playlist_id)
-            playlist.add(track_ids)
+            # Copies of a track already in the playlist are wanted: the sync
+            # matches duplicates one for one
+            playlist.add(track_ids, allow_duplicates=True)
         except ObjectNotFound as e:
             raise PlaylistModificationError(f"Playlist or track not found: {str(e)}")
         except TooManyRequests as e:
@@ -171,11 +248,12 @@ class TidalClient:
             logger.exception("Unexpected error when adding tracks to Tidal playlist")
             raise PlaylistModificationError(f"Unexpected error when adding tracks to Tidal playlist: {str(e)}")
 
-    def remove_tracks_from_playlist(self, playlist_id, track_ids):
+    def remove_tracks_from_playlist(self, playlist_id, track_ids, positions=None):
         try:
+            if positions is None:
+                positions = self.track_positions(playlist_id, track_ids)
             playlist = self.session.playlist(playlist_id)
-            for track_id in track_ids:
-                playlist.remove_by_id(track_id)
+            self._remove_positions(playlist, positions)
         except ObjectNotFound as e:
             raise PlaylistModificationError(f"Playlist or track not found: {str(e)}")
         except TooManyRequests as e:
@@ -188,27 +266,53 @@ class TidalClient:
             logger.exception("Unexpected error when removing tracks from Tidal playlist")
             raise PlaylistModificationError(f"Unexpected error when removing tracks from Tidal playlist: {str(e)}")
 
+    def track_positions(self, playlist_id, track_ids):
+        # Position of the first copy of each track, read from one pass over the playlist
+        wanted = {}
+        for track_id in track_ids:
+            wanted[str(track_id)] = wanted.get(str(track_id), 0) + 1
+        positions = []
+        tracks = self.get_playlist_tracks(playlist_id)
+        for position, track in enumerate(tracks):
+            if wanted.get(str(track['id'])):
+                wanted[str(track['id'])] -= 1
+                positions.append(position)
+        return positions
+
+    def _remove_positions(self, playlist, positions):
+        # Highest positions first, so the batches still to go keep their
+        # positions; tidalapi re-reads the playlist's ETag once per batch
+        positions = sorted(set(positions), reverse=True)
+        for start in range(0, len(positions), self.removal_batch_size):
+            playlist.remove_by_indices(positions[start:start + self.removal_batch_size])
+
     def get_playlist_by_name(self, name):
         playlists = self.get_playlists()
         return next((p for p in playlists if p['name'] == name), None)
 
-    def search_tracks(self, query):
+    def search_tracks(self, query, limit=1):
+        # Errors are left to the caller, so a failed search is not taken for no results
+        results = self.session.search(query, models=[tidalapi.Track], limit=limit)
+        return [self._track(track) for track in results['tracks'][:limit]]
+
+    def search_by_isrc(self, isrc):
         try:
-            results = self.session.search('track', query)
-            if results and hasattr(results, 'tracks') and results.tracks:
-                track = results.tracks[0]
-                return [{
-                    'id': track.id,
-                    'name': track.name,
-                    'artists': [artist.name for artist in track.artists],
-                    'album': track.album.name,
-                    'uri': f'tidal:track:{track.id}'
-                }]
-            return []
-        except Exception as e:
-            logger.error(f"Error searching for tracks: {str(e)}")
+            return [self._track(track) for track in self.session.get_tracks_by_isrc(isrc)]
+        except (ObjectNotFound, InvalidISRC):
             return []
 
+    def get_track_isrcs(self, track_ids):
+        # Tidal has no bulk track lookup, so this costs a request per track;
+        # playlist reads already carry the ISRC of every track
+        return {track_id: self.session.track(track_id).isrc for track_id in track_ids}
+
+    @staticmethod
+    def _track(track):
+        # Track record of a tidalapi Track, as search results come as those
+        return Track(track.id, track.name, [artist.name for artist in track.artists], album=track.album.name,
+                     uri=f'tidal:track:{track.id}', isrc=getattr(track, 'isrc', None),
+                     duration=getattr(track, 'duration', None))
+
     def disconnect(self, platform):
         if platform == 'tidal':
             self.session = None
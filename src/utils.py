@@ -1,9 +1,15 @@
 import datetime
 import logging
+import queue
 import random
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 
+import match_scoring
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -12,6 +18,86 @@ def log_warning(message):
     logger.warning(message)
 
 
+def prefetch(iterable, depth=1):
+    # Iterates `iterable` on a background thread, staying at most `depth` items
+    # ahead of the consumer. Errors are re-raised in the consumer, and closing
+    # the generator stops the producer at its next item.
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def offset_pages(fetch_page, page_size, total, workers):
+    # Yields the pages of a limit/offset listing in order. The first page
+    # tells the total, as given by `total(page)`, so the others can be
+    # requested ahead, `workers` at a time: at most that many pages are in
+    # flight or waiting to be yielded, the next one being asked for as each
+    # page is handed over.
+    first = fetch_page(0)
+    yield first
+    offsets = iter(range(page_size, total(first), page_size))
+    pages = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for offset in offsets:
+            pages.append(executor.submit(fetch_page, offset))
+            if len(pages) >= workers:
+                break
+        while pages:
+            page = pages.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pages.append(executor.submit(fetch_page, offset))
+            yield page
+    finally:
+        # A caller that stops early leaves the remaining pages unrequested
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_retry_after(error):
+    # spotipy reports throttling as SpotifyException(429) with the response headers,
+    # tidalapi as TooManyRequests (which TidalClient re-raises wrapped)
+    for e in (error, error.__context__):
+        if e is None:
+            continue
+        if getattr(e, 'http_status', None) == 429:
+            return float((getattr(e, 'headers', None) or {}).get('Retry-After', 1))
+        retry_after = getattr(e, 'retry_after', None)
+        if retry_after is not None:
+            return float(retry_after) if retry_after > 0 else 1.0
+    return None
+
+
 def retry_with_backoff(retries=3, backoff_in_seconds=1):
     def decorator(func):
         @wraps(func)
@@ -24,8 +110,11 @@ def retry_with_backoff(retries=3, backoff_in_seconds=1):
                     if x == retries:
                         logger.exception(f"Function {func.__name__} failed after {retries} retries")
                         raise
-                    sleep = (backoff_in_seconds * 2 ** x +
-                             random.uniform(0, 1))
+                    # The server's Retry-After when it gave one
+                    sleep = get_retry_after(e)
+                    if sleep is None:
+                        sleep = (backoff_in_seconds * 2 ** x +
+                                 random.uniform(0, 1))
                     logger.warning(f"Retrying {func.__name__} in {sleep:.2f} seconds after error: {str(e)}")
                     time.sleep(sleep)
                     x += 1
@@ -35,28 +124,71 @@ def retry_with_backoff(retries=3, backoff_in_seconds=1):
     return decorator
 
 
-def find_matching_track(track, platform_client):
+def canonical_track_key(track):
+    # Platform independent identity used to tell whether two playlists already
+    # hold the same recording
+    artist = track['artists'][0] if track['artists'] else ''
+    return track['name'].casefold().strip(), artist.casefold().strip()
+
+
+def match_confidence(track, match):
+    # Full confidence when name and lead artist agree, less for a search's best guess
+    return 1.0 if canonical_track_key(track) == canonical_track_key(match) else 0.5
+
+
+def build_search_query(track):
+    return f"{track['name']} {' '.join(track['artists'])}"
+
+
+def select_matching_track(track, search_results):
+    # Compare track details to find the best match
+    for result in search_results:
+        if (result['name'].lower() == track['name'].lower() and
+            any(artist.lower() in [a.lower() for a in track['artists']] for artist in result['artists'])):
+            return result
+
+    logger.info(f"No exact matching track found for: {build_search_query(track)}")
+
+    # If no exact match, return the first result as a best guess
+    return search_results[0] if search_results else None
+
+
+def search_candidates(track, platform_client, limit):
+    # None if the search failed, as opposed to finding nothing
     try:
-        # This is a simplified implementation. You may need to improve it based on the available data
-        search_query = f"{track['name']} {' '.join(track['artists'])}"
-        search_results = platform_client.search_tracks(search_query)
-
-        if search_results:
-            # Compare track details to find the best match
-            for result in search_results:
-                if (result['name'].lower() == track['name'].lower() and
-                    any(artist.lower() in [a.lower() for a in track['artists']] for artist in result['artists'])):
-                    return result
-        
-        logger.info(f"No exact matching track found for: {search_query}")
-        
-        # If no exact match, return the first result as a best guess
-        return search_results[0] if search_results else None
-    except KeyError as e:
-        logger.error(f"KeyError in find_matching_track: {str(e)}")
+        return platform_client.search_tracks(build_search_query(track), limit)
+    except Exception as e:
+        logger.exception(f"Error searching candidates for {build_search_query(track)}: {str(e)}")
         return None
+
+
+def find_matching_tracks(tracks, platform_client, limit=5, threshold=0.7):
+    # Searches the top `limit` candidates of each track and scores all of them
+    # in one batch. Returns {track_id: (match, score)}; match is None when no
+    # candidate reaches the threshold, and score is None when the search failed.
+    candidate_lists = [search_candidates(track, platform_client, limit) for track in tracks]
+    return score_matches(tracks, candidate_lists, threshold)
+
+
+def score_matches(tracks, candidate_lists, threshold):
+    results = match_scoring.best_matches(tracks, [candidates or [] for candidates in candidate_lists], threshold)
+    for track, candidates, (match, score) in zip(tracks, candidate_lists, results):
+        if match is None and candidates:
+            logger.info(f"Best candidate for {build_search_query(track)} scored {score:.2f}, "
+                        f"below the threshold of {threshold}")
+    return {track['id']: (None, None) if candidates is None else result
+            for track, candidates, result in zip(tracks, candidate_lists, results)}
+
+
+def find_matching_track(track, platform_client, limit=5, threshold=0.7):
+    return find_matching_tracks([track], platform_client, limit, threshold)[track['id']][0]
+
+
+def find_track_by_isrc(track, isrc, platform_client):
+    try:
+        return select_matching_track(track, platform_client.search_by_isrc(isrc))
     except Exception as e:
-        logger.exception(f"Error finding matching track: {str(e)}")
+        logger.exception(f"Error finding track by ISRC {isrc}: {str(e)}")
         return None
 
 
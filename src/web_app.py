@@ -1,16 +1,29 @@
 import logging
 
 from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for
+from flask.json.provider import DefaultJSONProvider
 
 from config import load_config
+from models import to_json
 from sync_manager import SyncManager
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class ModelJSONProvider(DefaultJSONProvider):
+    # Playlists and tracks are read-only Mapping records rather than dicts
+    @staticmethod
+    def default(value):
+        try:
+            return to_json(value)
+        except TypeError:
+            return DefaultJSONProvider.default(value)
+
+
 logger.info("Initializing Flask app")
 app = Flask(__name__, static_folder='static')
+app.json = ModelJSONProvider(app)
 
 logger.info("Loading configuration")
 config = load_config()
@@ -93,12 +106,12 @@ def sync():
     sync_manager = get_sync_manager()
     if data.get('all'):
         logger.info("Syncing all playlists")
-        sync_manager.sync_all_playlists()
-        return jsonify({"message": "All playlists synced successfully"}), 200
+        report = sync_manager.sync_all_playlists()
+        return jsonify({"message": "All playlists synced", "report": report}), 200
     elif data.get('playlists'):
         logger.info(f"Syncing specific playlists: {data['playlists']}")
-        sync_manager.sync_specific_playlists(data['playlists'])
-        return jsonify({"message": "Specified playlists synced successfully"}), 200
+        report = sync_manager.sync_specific_playlists(data['playlists'])
+        return jsonify({"message": "Specified playlists synced", "report": report}), 200
     else:
         logger.warning("Invalid sync request")
         return jsonify({"error": "Invalid request"}), 400
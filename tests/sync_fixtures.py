@@ -0,0 +1,18 @@
+import sys
+from unittest.mock import MagicMock, patch
+
+
+def platform_client():
+    client = MagicMock()
+    client.get_track_isrcs.return_value = {}
+    return client
+
+
+def build_sync_manager(sync_manager_class, jobs=1, **sync_config):
+    # Builds the manager through __init__ with mock platform clients and an
+    # in-memory database. The class is passed in because the tests import the
+    # module both as sync_manager and as src.sync_manager.
+    module = sys.modules[sync_manager_class.__module__]
+    with patch.object(module, 'SpotifyClient', side_effect=lambda config, db: platform_client()), \
+            patch.object(module, 'TidalClient', side_effect=lambda config, db: platform_client()):
+        return sync_manager_class({'database': {'path': ':memory:'}, 'sync': sync_config}, jobs=jobs)
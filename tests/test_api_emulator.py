@@ -0,0 +1,107 @@
+import unittest
+
+import requests
+
+import http_session
+from api_emulator import ApiEmulator, Library, store_tokens, TIDAL_ID_BASE
+from database import Database
+from spotify_client import SpotifyClient
+from tidal_client import TidalClient
+
+
+class TestApiEmulator(unittest.TestCase):
+    def setUp(self):
+        self.emulator = ApiEmulator(Library(playlists=3, tracks_per_playlist=120, favorite_tracks=30))
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.config = self.emulator.client_config({
+            'spotify': {'client_id': 'id', 'client_secret': 'secret', 'requests_per_second': 1000},
+            'tidal': {'requests_per_second': 1000},
+            'sync': {'page_concurrency': 2},
+            'database': {'path': ':memory:'},
+        })
+        http_session._sessions.clear()
+        self.addCleanup(http_session._sessions.clear)
+        self.db = Database(self.config)
+        store_tokens(self.db)
+
+    def test_spotify_client(self):
+        spotify = SpotifyClient(self.config, self.db)
+        self.assertTrue(spotify.authenticate())
+
+        playlists = spotify.get_playlists()
+        self.assertEqual([playlist['tracks'] for playlist in playlists], [120, 120, 120])
+        tracks = spotify.get_playlist_tracks(playlists[0]['id'])
+        self.assertEqual(len(tracks), 120)
+
+        spotify.remove_tracks_from_playlist(playlists[0]['id'], [tracks[0]['uri']], positions=[0])
+        spotify.add_tracks_to_playlist(playlists[0]['id'], [tracks[0]['uri']])
+        self.assertEqual(spotify.get_playlist_tracks(playlists[0]['id'])[-1], tracks[0])
+        self.assertEqual(spotify.search_by_isrc(tracks[1]['isrc'])[0]['id'], tracks[1]['id'])
+
+    def test_unchanged_spotify_pages_are_not_modified(self):
+        spotify = SpotifyClient(self.config, self.db)
+        spotify.authenticate()
+        playlist_id = spotify.get_playlists()[0]['id']
+
+        first = spotify.get_playlist_tracks(playlist_id)
+        self.assertEqual(spotify.get_playlist_tracks(playlist_id), first)
+
+        self.assertEqual(self.emulator.stats()['statuses']['spotify 304'], 2)
+
+    def test_tidal_client(self):
+        tidal = TidalClient(self.config, self.db)
+        self.assertTrue(tidal.session.check_login())
+
+        playlists = tidal.get_playlists()
+        self.assertEqual(len(playlists), 2)
+        self.assertEqual(len(tidal.get_favorite_tracks()), 30)
+        tracks = tidal.get_playlist_tracks(playlists[0]['id'])
+        self.assertEqual(len(tracks), playlists[0]['tracks'])
+
+        tidal.remove_tracks_from_playlist(playlists[0]['id'], [tracks[0]['id']])
+        tidal.add_tracks_to_playlist(playlists[0]['id'], [tracks[0]['id']])
+        self.assertEqual(tidal.get_playlist_tracks(playlists[0]['id'])[-1]['id'], tracks[0]['id'])
+        tidal.add_tracks_to_playlist(playlists[0]['id'], [tracks[1]['id']])
+        self.assertEqual(len(tidal.get_playlist_tracks(playlists[0]['id'])), len(tracks) + 1)
+
+        new_id = tidal.create_playlist('New')
+        self.assertEqual(tidal.get_playlist_tracks(new_id), [])
+        self.assertEqual(tidal.search_by_isrc(tracks[1]['isrc'])[0]['id'], tracks[1]['id'])
+        self.assertEqual(tidal.search_tracks(f"{tracks[1]['name']} {tracks[1]['artists'][0]}", 5)[0]['name'],
+                         tracks[1]['name'])
+
+    def test_rate_limit(self):
+        self.emulator.stop()
+        self.emulator = ApiEmulator(Library(playlists=1, tracks_per_playlist=10), rate_limits={'tidal': 2})
+        self.emulator.start()
+        url = f'{self.emulator.tidal_url}v1/tracks/{TIDAL_ID_BASE}'
+
+        statuses = [requests.get(url, headers={'Authorization': 'Bearer emulator'}) for _ in range(3)]
+
+        self.assertEqual([response.status_code for response in statuses], [200, 200, 429])
+        self.assertEqual(statuses[2].headers['Retry-After'], '1')
+
+    def test_fault_injection(self):
+        self.emulator.error_rate = 1.0
+        response = requests.get(f'{self.emulator.spotify_url}v1/me', headers={'Authorization': 'Bearer emulator'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_server_errors_are_retried(self):
+        self.config['sync']['page_concurrency'] = 1
+        spotify = SpotifyClient(self.config, self.db)
+        spotify.authenticate()
+        self.emulator.error_rate = 0.3
+
+        playlists = spotify.get_playlists()
+        tracks = [spotify.get_playlist_tracks(playlist['id'], fields=None) for playlist in playlists]
+
+        self.assertEqual([len(playlist_tracks) for playlist_tracks in tracks], [120, 120, 120])
+        self.assertGreater(self.emulator.stats()['statuses']['spotify 503'], 0)
+
+    def test_requests_need_a_token(self):
+        self.assertEqual(requests.get(f'{self.emulator.spotify_url}v1/me').status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from spotipy.exceptions import SpotifyException
+
+from async_sync_manager import AsyncPlatformClient, AsyncSyncManager
+from utils import get_retry_after
+from sync_fixtures import build_sync_manager
+from sync_manager import SyncManager
+
+
+class TestAsyncPlatformClient(unittest.TestCase):
+    def test_get_retry_after(self):
+        self.assertEqual(get_retry_after(SpotifyException(429, -1, 'slow down', headers={'Retry-After': '2'})), 2.0)
+        self.assertIsNone(get_retry_after(ValueError('bad')))
+
+    def test_calls_run_on_the_client_threads(self):
+        client = MagicMock()
+        client.search_tracks.side_effect = lambda query, limit: [threading.current_thread()]
+
+        async def search():
+            async_client = AsyncPlatformClient(client, 2)
+            try:
+                return await async_client.search_tracks('query')
+            finally:
+                async_client.close()
+
+        self.assertIsNot(asyncio.run(search())[0], threading.current_thread())
+
+
+class TestAsyncSyncManager(unittest.TestCase):
+    def setUp(self):
+        sync_manager = build_sync_manager(SyncManager, spotify_concurrency=4, tidal_concurrency=4)
+        self.spotify = sync_manager.spotify
+        self.spotify.write_chunk_size = 100
+        self.tidal = sync_manager.tidal
+        self.tidal.write_chunk_size = 2
+        self.async_sync_manager = AsyncSyncManager(sync_manager)
+
+    def test_sync_all_playlists(self):
+        self.spotify.get_playlists.return_value = [{'id': 's1', 'name': 'Mix', 'tracks': 5}]
+        self.tidal.get_playlists.return_value = [{'id': 't1', 'name': 'Mix', 'tracks': 0}]
+        tracks = [{'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(5)]
+        self.spotify.get_playlist_tracks.return_value = tracks
+        self.tidal.get_playlist_tracks.return_value = []
+        self.tidal.search_tracks.side_effect = lambda query, limit: [
+            {'id': 'm' + query.split()[1], 'name': f'Track {query.split()[1]}', 'artists': ['Artist']}]
+
+        with patch('utils.log_warning'):
+            report = asyncio.run(self.async_sync_manager.sync_all_playlists())
+
+        self.assertEqual(len(report['synced']), 1)
+        self.assertEqual(report['failed'], [])
+        written = [track_id for call in self.tidal.add_tracks_to_playlist.call_args_list for track_id in call.args[1]]
+        self.assertEqual(written, ['m0', 'm1', 'm2', 'm3', 'm4'])
+        self.assertEqual(self.tidal.add_tracks_to_playlist.call_count, 3)
+        self.spotify.add_tracks_to_playlist.assert_not_called()
+        self.assertEqual(len(self.async_sync_manager.db.get_playlist_pair_base('s1', 't1')['tidal']), 5)
+
+    def test_database_work_stays_off_the_event_loop(self):
+        self.spotify.get_playlists.return_value = [{'id': 's1', 'name': 'Mix', 'tracks': 2}]
+        self.tidal.get_playlists.return_value = [{'id': 't1', 'name': 'Mix', 'tracks': 0}]
+        self.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(2)]
+        self.tidal.get_playlist_tracks.return_value = []
+        self.tidal.search_tracks.side_effect = lambda query, limit: [
+            {'id': 'm' + query.split()[1], 'name': f'Track {query.split()[1]}', 'artists': ['Artist']}]
+        db = self.async_sync_manager.db
+        threads = set()
+
+        def on_thread(method):
+            def record(*args, **kwargs):
+                threads.add(threading.current_thread())
+                return method(*args, **kwargs)
+            return record
+
+        with patch.object(db, 'get_track_match', on_thread(db.get_track_match)), \
+                patch.object(db, 'store_track_match', on_thread(db.store_track_match)), \
+                patch.object(db, 'cache_tracks', on_thread(db.cache_tracks)), \
+                patch('utils.log_warning'):
+            report = asyncio.run(self.async_sync_manager.sync_all_playlists())
+
+        self.assertEqual(report['synced'][0]['added'], 2)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_failed_chunks_are_not_counted(self):
+        self.spotify.get_playlists.return_value = [{'id': 's1', 'name': 'Mix', 'tracks': 5}]
+        self.tidal.get_playlists.return_value = []
+        self.tidal.create_playlist.return_value = 't1'
+        tracks = [{'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(5)]
+        self.spotify.get_playlist_tracks.return_value = tracks
+        self.tidal.get_playlist_tracks.return_value = []
+        self.tidal.search_tracks.side_effect = lambda query, limit: [
+            {'id': 'm' + query.split()[1], 'name': f'Track {query.split()[1]}', 'artists': ['Artist']}]
+        self.tidal.add_tracks_to_playlist.side_effect = [None, Exception('API Error'), None]
+
+        with patch('utils.log_warning'):
+            report = asyncio.run(self.async_sync_manager.sync_all_playlists())
+
+        self.assertEqual(report['synced'][0]['added'], 3)
+        self.assertEqual(report['synced'][0]['errors'], ['Error adding tracks 2-3 for playlist Mix on tidal: API Error'])
+
+    def test_named_pair_is_merged(self):
+        self.spotify.get_playlists.return_value = [{'id': 's1', 'name': 'Mix', 'tracks': 1}]
+        self.tidal.get_playlists.return_value = [{'id': 't1', 'name': 'Mix', 'tracks': 2}]
+        self.spotify.get_playlist_tracks.return_value = [{'id': 's0', 'name': 'Track 0', 'artists': ['Artist']}]
+        self.tidal.get_playlist_tracks.return_value = [{'id': 't0', 'name': 'Track 0', 'artists': ['Artist']},
+                                                       {'id': 't1', 'name': 'Track 1', 'artists': ['Artist']}]
+        self.tidal.search_tracks.return_value = [{'id': 't0', 'name': 'Track 0', 'artists': ['Artist']}]
+        self.spotify.search_tracks.side_effect = lambda query, limit: [
+            {'id': 's' + query.split()[1], 'name': f'Track {query.split()[1]}', 'artists': ['Artist']}]
+
+        with patch('utils.log_warning') as log_warning:
+            report = asyncio.run(self.async_sync_manager.sync_specific_playlists(['Mix', 'Missing']))
+
+        log_warning.assert_any_call("Playlist 'Missing' not found on either platform")
+        self.assertEqual(report['failed'], [])
+        self.spotify.add_tracks_to_playlist.assert_called_once_with('s1', ['s1'])
+        self.tidal.add_tracks_to_playlist.assert_not_called()
+        base = self.async_sync_manager.db.get_playlist_pair_base('s1', 't1')
+        self.assertEqual([track['id'] for track in base['spotify']], ['s0', 's1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
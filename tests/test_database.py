@@ -78,5 +78,29 @@ class TestDatabase(unittest.TestCase):
         result = self.db.get_cached_track('spotify', 'non_existent_id')
         self.assertIsNone(result)
 
+    def test_get_track_counterparts(self):
+        self.db.store_track_match('s1', 111, 0.5, 'search')
+        self.db.store_track_match('s1', 222, 1.0, 'isrc')
+
+        self.assertEqual(self.db.get_track_counterparts('spotify', ['s1', 's2']), {'s1': '222'})
+        self.assertEqual(self.db.get_track_counterparts('tidal', [111]), {111: 's1'})
+
+    def test_sync_journal_is_pruned(self):
+        abandoned = self.db.start_sync_run()
+        self.db.store_journal_item(abandoned, 'spotify:s1', 'Mix', 'planned', entries=[])
+        run_id = self.db.start_sync_run()
+        self.db.store_journal_item(run_id, 'spotify:s1', 'Mix', 'completed', result={'errors': []})
+
+        self.assertEqual(self.db.get_journal_item(abandoned, 'spotify:s1'), (None, None))
+        self.assertEqual(self.db.get_unfinished_sync_run(), run_id)
+
+        self.db.finish_sync_run(run_id)
+
+        cursor = self.db.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM sync_journal')
+        self.assertEqual(cursor.fetchone()[0], 0)
+        cursor.execute('SELECT COUNT(*) FROM sync_runs')
+        self.assertEqual(cursor.fetchone()[0], 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import http_session
+from http_session import PooledSession, platform_session
+from rate_limiter import TokenBucket
+
+
+class TestHttpSession(unittest.TestCase):
+    def setUp(self):
+        self.config = {'sync': {'jobs': 2, 'spotify_concurrency': 8, 'tidal_concurrency': 1},
+                       'http': {'connect_timeout': 3.0, 'read_timeout': 10.0}}
+        http_session._sessions.clear()
+
+    def test_pool_matches_concurrency(self):
+        self.assertEqual(http_session.pool_size(self.config, 'spotify'), 8)
+        self.assertEqual(http_session.pool_size(self.config, 'tidal'), 2)
+
+        adapter = platform_session(self.config, 'spotify').get_adapter('https://api.spotify.com')
+        self.assertEqual(adapter._pool_maxsize, 8)
+
+    def test_pool_covers_page_workers(self):
+        self.config['sync']['page_concurrency'] = 3
+        self.assertEqual(http_session.pool_size(self.config, 'spotify'), 24)
+        self.assertEqual(http_session.pool_size(self.config, 'tidal'), 6)
+
+    def test_session_is_shared(self):
+        session = platform_session(self.config, 'tidal')
+        session.close()
+        self.assertIs(platform_session(self.config, 'tidal'), session)
+        self.assertIsNot(platform_session(self.config, 'spotify'), session)
+
+    @patch('requests.Session.request')
+    def test_default_timeout(self, mock_request):
+        session = PooledSession(4, (3.0, 10.0))
+
+        session.get('https://api.spotify.com/v1/me')
+        session.get('https://api.spotify.com/v1/me', timeout=60)
+
+        self.assertEqual([call.kwargs['timeout'] for call in mock_request.call_args_list], [(3.0, 10.0), 60])
+
+
+    @patch('requests.Session.request')
+    def test_throttled_requests_are_sent_again(self, mock_request):
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '2'})
+        ok = MagicMock(status_code=200, headers={})
+        mock_request.side_effect = [throttled, ok]
+        limiter = MagicMock(spec=TokenBucket)
+        session = PooledSession(4, (3.0, 10.0), limiter)
+
+        self.assertIs(session.get('https://api.tidal.com/v1/tracks/1'), ok)
+
+        self.assertEqual(limiter.acquire.call_count, 2)
+        limiter.observe.assert_any_call(429, {'Retry-After': '2'})
+
+    @patch('requests.Session.request')
+    def test_gives_up_after_max_retries(self, mock_request):
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '2'})
+        mock_request.return_value = throttled
+        session = PooledSession(4, (3.0, 10.0), MagicMock(spec=TokenBucket), max_retries=2)
+
+        self.assertIs(session.get('https://api.tidal.com/v1/tracks/1'), throttled)
+        self.assertEqual(mock_request.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
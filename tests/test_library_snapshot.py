@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import MagicMock
+
+from library_snapshot import LibrarySnapshot
+
+
+class TestLibrarySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.spotify = MagicMock()
+        self.spotify.get_playlists.return_value = [{'id': '1', 'name': 'Mix'}, {'id': '2', 'name': 'Chill'}]
+        self.spotify.get_playlist_tracks.return_value = [{'id': 'a'}]
+        self.snapshot = LibrarySnapshot({'spotify': self.spotify, 'tidal': MagicMock()})
+
+    def test_playlists_are_listed_once(self):
+        self.assertEqual(self.snapshot.playlist_by_name('spotify', 'Chill')['id'], '2')
+        self.assertEqual(self.snapshot.playlist_by_id('spotify', '1')['name'], 'Mix')
+        self.assertIsNone(self.snapshot.playlist_by_name('spotify', 'Missing'))
+        self.spotify.get_playlists.assert_called_once()
+
+    def test_tracks_are_memoized_until_invalidated(self):
+        self.snapshot.tracks('spotify', '1')
+        self.snapshot.tracks('spotify', '1')
+        self.spotify.get_playlist_tracks.assert_called_once_with('1')
+        self.snapshot.invalidate_tracks('spotify', '1')
+        self.snapshot.tracks('spotify', '1')
+        self.assertEqual(self.spotify.get_playlist_tracks.call_count, 2)
+
+    def test_added_playlist_starts_empty(self):
+        self.snapshot.add_playlist('spotify', {'id': '3', 'name': 'New', 'tracks': 0})
+        self.assertEqual(self.snapshot.playlist_by_name('spotify', 'New')['id'], '3')
+        self.assertEqual(self.snapshot.tracks('spotify', '3'), [])
+        self.spotify.get_playlist_tracks.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from match_index import MatchIndex, normalize, normalize_title
+
+
+class TestNormalize(unittest.TestCase):
+    def test_accents_and_case(self):
+        self.assertEqual(normalize('Beyoncé'), 'beyonce')
+        self.assertEqual(normalize('  Sigur  Rós!'), 'sigur ros')
+
+    def test_title_decorations_are_dropped(self):
+        self.assertEqual(normalize_title('Song (feat. Someone)'), 'song')
+        self.assertEqual(normalize_title('Song ft. Someone'), 'song')
+        self.assertEqual(normalize_title('Song - Remastered 2011'), 'song')
+        self.assertEqual(normalize_title('Song [2009 Remaster]'), 'song')
+        self.assertEqual(normalize_title('Song (Live)'), 'song live')
+
+
+class TestMatchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MatchIndex([
+            {'id': 't1', 'name': 'Héroes - Remastered', 'artists': ['David Bowie'], 'duration': 371},
+            {'id': 't2', 'name': 'Heroes', 'artists': ['David Bowie'], 'duration': 210},
+            {'id': 't3', 'name': 'Heroes', 'artists': ['Someone Else'], 'duration': 371},
+            {'id': 't4', 'name': 'Changes', 'artists': ['David Bowie'], 'isrc': 'GBAYE0601477'},
+        ])
+
+    def test_fuzzy_match_with_duration_tiebreak(self):
+        match, confidence = self.index.find({'id': 's1', 'name': 'Heroes (feat. Nobody)',
+                                             'artists': ['David Bowie'], 'duration': 372})
+        self.assertEqual(match['id'], 't1')
+        self.assertEqual(confidence, 1.0)
+
+    def test_lead_artist_must_match(self):
+        self.assertIsNone(self.index.find({'id': 's1', 'name': 'Heroes', 'artists': ['Nobody']}))
+
+    def test_distant_duration_is_rejected(self):
+        index = MatchIndex([{'id': 't1', 'name': 'Heroes', 'artists': ['David Bowie'], 'duration': 371}])
+        self.assertIsNone(index.find({'id': 's1', 'name': 'Heroes', 'artists': ['David Bowie'], 'duration': 200}))
+
+    def test_isrc_match(self):
+        match, confidence = self.index.find({'id': 's1', 'name': 'Something else', 'artists': ['X']},
+                                            isrc='GBAYE0601477')
+        self.assertEqual(match['id'], 't4')
+
+    def test_different_title_is_not_matched(self):
+        self.assertIsNone(self.index.find({'id': 's1', 'name': 'Heroes and Villains', 'artists': ['David Bowie']}))
+
+    def test_tracks_added_later_are_found(self):
+        self.index.add_all([{'id': 't2', 'name': 'Heroes', 'artists': ['David Bowie'], 'duration': 210},
+                            {'id': 't5', 'name': 'Ashes to Ashes', 'artists': ['David Bowie'], 'duration': 263},
+                            {'id': 't5', 'name': 'Ashes to Ashes', 'artists': ['David Bowie'], 'duration': 263}])
+
+        self.assertEqual(len(self.index), 5)
+        match, confidence = self.index.find({'id': 's1', 'name': 'Ashes To Ashes', 'artists': ['David Bowie']})
+        self.assertEqual(dict(match), {'id': 't5', 'name': 'Ashes to Ashes', 'artists': ('David Bowie',),
+                                       'duration': 263})
+        self.assertEqual(self.index.find({'id': 's1', 'name': 'Changes'}, isrc='GBAYE0601477')[0]['id'], 't4')
+
+
+if __name__ == '__main__':
+    unittest.main()
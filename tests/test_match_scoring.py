@@ -0,0 +1,41 @@
+import unittest
+
+from match_scoring import best_matches, score_candidates
+
+
+class TestMatchScoring(unittest.TestCase):
+    def setUp(self):
+        self.tracks = [
+            {'id': 's1', 'name': 'Heroes', 'artists': ['David Bowie'], 'album': '"Heroes"', 'duration': 371},
+            {'id': 's2', 'name': 'Changes', 'artists': ['David Bowie'], 'album': 'Hunky Dory', 'duration': 217},
+        ]
+
+    def test_best_candidate_wins(self):
+        candidate_lists = [
+            [{'id': 't1', 'name': 'Heroes (Live)', 'artists': ['David Bowie'], 'duration': 420},
+             {'id': 't2', 'name': 'Heroes - 2017 Remaster', 'artists': ['David Bowie'], 'album': '"Heroes"',
+              'duration': 370}],
+            [{'id': 't3', 'name': 'Changes', 'artists': ['Black Sabbath'], 'album': 'Vol. 4', 'duration': 284},
+             {'id': 't4', 'name': 'Changes', 'artists': ['David Bowie', 'Someone'], 'album': 'Hunky Dory'}],
+        ]
+
+        results = best_matches(self.tracks, candidate_lists, threshold=0.7)
+
+        self.assertEqual([match['id'] for match, _ in results], ['t2', 't4'])
+        self.assertGreater(results[0][1], 0.99)
+
+    def test_weak_candidates_leave_track_unmatched(self):
+        candidate_lists = [[{'id': 't1', 'name': 'Ashes to Ashes', 'artists': ['David Bowie'], 'duration': 263}], []]
+
+        results = best_matches(self.tracks, candidate_lists, threshold=0.7)
+
+        self.assertEqual(results, [(None, results[0][1]), (None, 0.0)])
+        self.assertLess(results[0][1], 0.7)
+
+    def test_scores_align_with_candidates(self):
+        scores = score_candidates(self.tracks, [[], [{'id': 't1', 'name': 'Changes', 'artists': ['David Bowie']}]])
+        self.assertEqual([len(track_scores) for track_scores in scores], [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import ast
+import json
+import unittest
+
+from models import Playlist, Track, TrackList, compact, to_json
+
+
+def spotify_track(i, **fields):
+    return Track(f'sp{i}', f'Track {i}', ['Artist', 'Guest'], album='Album', uri=f'spotify:track:sp{i}',
+                 isrc=f'ISRC{i}', duration=180 + i, **fields)
+
+
+class TestTrack(unittest.TestCase):
+    def test_reads_like_a_dict(self):
+        track = Track('1', 'Song', ['Artist'], isrc=None)
+
+        self.assertEqual(track['name'], 'Song')
+        self.assertEqual(track['artists'], ('Artist',))
+        self.assertIn('isrc', track)
+        self.assertNotIn('album', track)
+        self.assertIsNone(track.get('album'))
+        self.assertEqual(track, {'id': '1', 'name': 'Song', 'artists': ('Artist',), 'isrc': None})
+        with self.assertRaises(KeyError):
+            track['album']
+
+    def test_repr_round_trips_through_the_track_cache(self):
+        track = spotify_track(1)
+        self.assertEqual(Track.from_mapping(ast.literal_eval(repr(track))), track)
+
+    def test_artist_names_are_shared(self):
+        first = Track('1', 'A', [''.join(['Art', 'ist'])])
+        second = Track('2', 'B', [''.join(['Arti', 'st'])])
+        self.assertIs(first.artists[0], second.artists[0])
+
+    def test_from_raw_json(self):
+        spotify = Track.from_spotify({'id': 's', 'name': 'Song', 'artists': [{'name': 'Artist'}],
+                                      'album': {'name': 'Album'}, 'uri': 'spotify:track:s',
+                                      'external_ids': {'isrc': 'X'}, 'duration_ms': 181500})
+        tidal = Track.from_tidal({'id': 7, 'title': 'Song', 'artists': [{'name': 'Artist'}],
+                                  'album': {'title': 'Album'}, 'isrc': 'X', 'duration': 181})
+        self.assertEqual((spotify['duration'], spotify['isrc']), (181, 'X'))
+        self.assertEqual((tidal['name'], tidal['uri'], tidal['album']), ('Song', 'tidal:track:7', 'Album'))
+
+
+class TestTrackList(unittest.TestCase):
+    def test_round_trips_tracks(self):
+        tracks = [spotify_track(i) for i in range(3)] + [Track('x', 'Bare', [])]
+        track_list = TrackList(tracks)
+
+        self.assertEqual(len(track_list), 4)
+        self.assertEqual(list(track_list), tracks)
+        self.assertEqual(track_list[-1], tracks[-1])
+        self.assertEqual(track_list[1:3], tracks[1:3])
+        self.assertEqual(track_list + [tracks[0]], tracks + [tracks[0]])
+
+    def test_numeric_ids_and_derived_uris(self):
+        tracks = [Track(i, f'Track {i}', ['Artist'], uri=f'tidal:track:{i}', duration=None) for i in range(3)]
+        track_list = TrackList(tracks)
+
+        self.assertEqual(list(track_list), tracks)
+        self.assertIsNone(track_list._uris)
+        self.assertIs(track_list[0]['artists'], track_list[2]['artists'])
+
+    def test_compact_keeps_plain_dicts(self):
+        tracks = [{'id': 'a'}]
+        self.assertIs(compact(tracks), tracks)
+        self.assertIsInstance(compact([spotify_track(1)]), TrackList)
+
+    def test_json(self):
+        encoded = json.dumps({'tracks': TrackList([spotify_track(1)]), 'playlist': Playlist('p', 'Mix', 1)},
+                             default=to_json)
+        decoded = json.loads(encoded)
+        self.assertEqual(decoded['tracks'][0]['artists'], ['Artist', 'Guest'])
+        self.assertEqual(decoded['playlist'], {'id': 'p', 'name': 'Mix', 'tracks': 1, 'version': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from playlist_diff import diff_playlists, index_positions, inserts, deletes, three_way_merge, INSERT, DELETE
+
+
+def tracks(*ids):
+    return [{'id': track_id, 'name': f'Track {track_id}'} for track_id in ids]
+
+
+class TestPlaylistDiff(unittest.TestCase):
+    def test_index_positions(self):
+        positions = index_positions(tracks('a', 'b', 'a'))
+        self.assertEqual(positions['a'], [0, 2])
+        self.assertEqual(positions['b'], [1])
+
+    def test_identical_playlists(self):
+        self.assertEqual(diff_playlists(tracks('a', 'b'), tracks('a', 'b')), [])
+
+    def test_inserts_keep_source_order_and_positions(self):
+        operations = diff_playlists(tracks('c', 'a', 'b'), tracks('a'))
+        self.assertEqual([(op['op'], op['position'], op['track']['id']) for op in operations],
+                         [(INSERT, 0, 'c'), (INSERT, 2, 'b')])
+
+    def test_deletes_run_highest_position_first(self):
+        operations = diff_playlists(tracks('b'), tracks('a', 'b', 'c'))
+        self.assertEqual([(op['op'], op['position']) for op in operations], [(DELETE, 2), (DELETE, 0)])
+
+    def test_duplicates(self):
+        operations = diff_playlists(tracks('a', 'b', 'a', 'a'), tracks('a', 'b', 'b'))
+        self.assertEqual([op['position'] for op in deletes(operations)], [2])
+        self.assertEqual([op['position'] for op in inserts(operations)], [2, 3])
+
+    def test_deletes_precede_inserts(self):
+        operations = diff_playlists(tracks('b'), tracks('a'))
+        self.assertEqual([op['op'] for op in operations], [DELETE, INSERT])
+
+
+
+class TestThreeWayMerge(unittest.TestCase):
+    # Both sides use the same ids here, so the default key lines them up
+
+    def test_first_sync_is_a_union(self):
+        for_b, for_a = three_way_merge([], tracks('a', 'b'), [], tracks('b', 'c'))
+        self.assertEqual([op['track']['id'] for op in for_b], ['a'])
+        self.assertEqual([op['track']['id'] for op in for_a], ['c'])
+
+    def test_each_change_lands_once_on_the_other_side(self):
+        base = tracks('a', 'b', 'c')
+        for_b, for_a = three_way_merge(base, tracks('a', 'c', 'd'), base, tracks('a', 'b', 'c', 'e'))
+        self.assertEqual([(op['op'], op['track']['id']) for op in for_b], [(DELETE, 'b'), (INSERT, 'd')])
+        self.assertEqual([(op['op'], op['track']['id']) for op in for_a], [(INSERT, 'e')])
+
+    def test_same_edit_on_both_sides_is_not_reapplied(self):
+        base = tracks('a', 'b')
+        for_b, for_a = three_way_merge(base, tracks('a', 'c'), base, tracks('a', 'c'))
+        self.assertEqual(for_b, [])
+        self.assertEqual(for_a, [])
+
+    def test_unchanged_pair(self):
+        base = tracks('a', 'b')
+        self.assertEqual(three_way_merge(base, tracks('a', 'b'), base, tracks('a', 'b')), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
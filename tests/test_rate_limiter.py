@@ -0,0 +1,41 @@
+import unittest
+
+from rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(2.0, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_requests_are_paced_after_the_burst(self):
+        for _ in range(4):
+            self.bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+
+    def test_retry_after_pauses_the_bucket(self):
+        self.assertEqual(self.bucket.observe(429, {'Retry-After': '3'}), 3.0)
+        self.bucket.acquire()
+        self.assertEqual(self.clock.now, 3.5)
+
+    def test_exhausted_rate_limit_headers_pause_the_bucket(self):
+        self.assertIsNone(self.bucket.observe(200, {'X-RateLimit-Remaining': '7', 'X-RateLimit-Reset': '10'}))
+        self.assertEqual(self.bucket.observe(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '10'}), 10.0)
+        self.assertEqual(self.bucket.resume_at, 10.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
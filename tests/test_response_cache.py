@@ -0,0 +1,90 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+from database import Database
+from http_session import PooledSession
+from response_cache import ResponseCache
+
+
+def _response(status_code, body=b'', etag=None):
+    response = MagicMock(status_code=status_code, content=body, url='https://api.spotify.com/v1/me/playlists')
+    response.headers = {'ETag': etag} if etag else {}
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.db = Database({'database': {'path': ':memory:'}})
+        self.db.create_tables()
+        self.cache = ResponseCache(self.db, 1024)
+        self.session = PooledSession(4, (3.0, 10.0), cache=self.cache)
+        self.url = 'https://api.spotify.com/v1/me/playlists'
+
+    @patch('requests.Session.request')
+    def test_not_modified_replays_stored_body(self, mock_request):
+        body = json.dumps({'items': [{'id': 'p1'}], 'total': 1}).encode()
+        mock_request.side_effect = [_response(200, body, '"v1"'), _response(304)]
+
+        first = self.session.get(self.url, params={'limit': 50, 'offset': 0})
+        second = self.session.get(self.url, params={'limit': 50, 'offset': 0})
+
+        headers = mock_request.call_args_list[1].kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.json(), {'items': [{'id': 'p1'}], 'total': 1})
+
+    @patch('requests.Session.request')
+    def test_replayed_body_is_parsed_once(self, mock_request):
+        body = json.dumps({'items': []}).encode()
+        mock_request.side_effect = [_response(200, body, '"v1"'), _response(304), _response(304)]
+        self.session.get(self.url)
+
+        with patch('response_cache.json.loads', wraps=json.loads) as loads:
+            first = self.session.get(self.url).json()
+            second = self.session.get(self.url).json()
+
+        self.assertEqual(loads.call_count, 1)
+        self.assertIs(first, second)
+
+    @patch('requests.Session.request')
+    def test_responses_without_etag_are_not_stored(self, mock_request):
+        mock_request.return_value = _response(200, b'{}')
+
+        self.session.get(self.url)
+        self.session.get(self.url)
+
+        self.assertIsNone(self.db.get_cached_response(self.url))
+        self.assertNotIn('headers', mock_request.call_args_list[1].kwargs)
+
+    def test_least_recently_used_bodies_are_evicted(self):
+        with patch('database.time.time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+            self.db.store_cached_response('a', '"a"', b'x' * 400, 1000)
+            self.db.store_cached_response('b', '"b"', b'x' * 400, 1000)
+            self.db.touch_cached_response('a')
+            self.db.store_cached_response('c', '"c"', b'x' * 400, 1000)
+
+        self.assertIsNotNone(self.db.get_cached_response('a'))
+        self.assertIsNone(self.db.get_cached_response('b'))
+        self.assertEqual(self.db.get_cached_response('c'), ('"c"', b'x' * 400))
+
+    def test_eviction_stops_once_the_cache_fits(self):
+        with patch('database.time.time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+            for url in 'abc':
+                self.db.store_cached_response(url, f'"{url}"', b'x' * 300, 1000)
+            self.assertIsNotNone(self.db.get_cached_response('a'))
+            self.db.store_cached_response('d', '"d"', b'x' * 500, 1000)
+
+        self.assertIsNone(self.db.get_cached_response('a'))
+        self.assertIsNone(self.db.get_cached_response('b'))
+        self.assertIsNotNone(self.db.get_cached_response('c'))
+        self.assertIsNotNone(self.db.get_cached_response('d'))
+        cursor = self.db.get_connection().cursor()
+        cursor.execute("EXPLAIN QUERY PLAN SELECT url, size FROM http_cache ORDER BY used_at")
+        self.assertIn('http_cache_used_at', ' '.join(str(row) for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    unittest.main()
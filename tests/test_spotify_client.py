@@ -48,6 +48,7 @@ class TestSpotifyClient(unittest.TestCase):
     def test_get_playlists(self, mock_spotify):
         mock_spotify.return_value.current_user_playlists.return_value = {
             'items': [{'id': '1', 'name': 'Playlist 1', 'tracks': {'total': 10}}],
+            'total': 1,
             'next': None
         }
         playlists = self.spotify_client.get_playlists()
@@ -58,6 +59,7 @@ class TestSpotifyClient(unittest.TestCase):
     def test_get_playlist_tracks(self, mock_spotify):
         mock_spotify.return_value.playlist_items.return_value = {
             'items': [{'track': {'id': '1', 'name': 'Track 1', 'artists': [{'name': 'Artist 1'}], 'album': {'name': 'Album 1'}, 'uri': 'spotify:track:1'}}],
+            'total': 1,
             'next': None
         }
         tracks = self.spotify_client.get_playlist_tracks('playlist_id')
@@ -90,5 +92,49 @@ class TestSpotifyClient(unittest.TestCase):
         self.spotify_client.remove_tracks_from_playlist('playlist_id', ['track_uri_1', 'track_uri_2'])
         mock_spotify.return_value.playlist_remove_all_occurrences_of_items.assert_called_once_with('playlist_id', ['track_uri_1', 'track_uri_2'])
 
+
+class TestSpotifyPaging(unittest.TestCase):
+    def setUp(self):
+        config = {'spotify': {'client_id': 'id', 'client_secret': 'secret'}, 'sync': {'spotify_concurrency': 4}}
+        self.client = SpotifyClient(config, MagicMock())
+        self.client.sp = MagicMock()
+
+    def playlist_items(self, playlist_id, fields, limit, offset, additional_types):
+        total = 250
+        items = [{'track': {'id': str(i), 'name': f'Track {i}', 'artists': [{'name': 'Artist'}],
+                            'album': {'name': 'Album'}, 'uri': f'spotify:track:{i}'}}
+                 for i in range(offset, min(offset + limit, total))]
+        return {'items': items, 'total': total}
+
+    def test_pages_are_reassembled_in_order(self):
+        self.client.sp.playlist_items.side_effect = self.playlist_items
+
+        tracks = self.client.get_playlist_tracks('p1')
+
+        self.assertEqual([track['id'] for track in tracks], [str(i) for i in range(250)])
+        offsets = sorted(call.kwargs['offset'] for call in self.client.sp.playlist_items.call_args_list)
+        self.assertEqual(offsets, [0, 100, 200])
+        self.assertTrue(all(call.kwargs['fields'] == SpotifyClient.track_fields
+                            for call in self.client.sp.playlist_items.call_args_list))
+
+    def test_fields_filter_is_optional(self):
+        self.client.sp.playlist_items.side_effect = self.playlist_items
+
+        self.client.get_playlist_tracks('p1', fields=None)
+
+        self.assertIsNone(self.client.sp.playlist_items.call_args.kwargs['fields'])
+
+    def test_playlists_are_paged_by_offset(self):
+        def current_user_playlists(limit, offset):
+            return {'items': [{'id': str(i), 'name': f'Playlist {i}', 'tracks': {'total': 0}}
+                              for i in range(offset, min(offset + limit, 120))], 'total': 120}
+        self.client.sp.current_user_playlists.side_effect = current_user_playlists
+
+        playlists = self.client.get_playlists()
+
+        self.assertEqual([playlist['id'] for playlist in playlists], [str(i) for i in range(120)])
+        self.assertEqual(self.client.sp.current_user_playlists.call_count, 3)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,21 @@
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
+
+import requests
+
+import utils
 from src.sync_manager import SyncManager, SyncError
+from sync_fixtures import build_sync_manager, platform_client
+from tidal_client import TidalClient
+
+
+def search_results(match):
+    # Stands in for utils.find_matching_tracks, resolving each track with `match`
+    def find_matching_tracks(tracks, client, limit, threshold):
+        return {track['id']: (match(track), 1.0) for track in tracks}
+    return find_matching_tracks
+
 
 class TestSyncManager(unittest.TestCase):
     def setUp(self):
@@ -74,5 +89,523 @@ class TestSyncManager(unittest.TestCase):
             self.sync_manager.sync_playlist(playlist)
             mock_log_warning.assert_called_once()
 
+
+class TestSyncPlaylistWrites(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager)
+        self.sync_manager.tidal.write_chunk_size = 100
+        self.sync_manager.tidal.get_playlists.return_value = [{'id': 't1', 'name': 'Playlist 1'}]
+        self.sync_manager.tidal.get_playlist_tracks.return_value = []
+        self.sync_manager.spotify.iter_playlist_track_pages.side_effect = self.track_pages
+
+    def track_pages(self, playlist_id):
+        tracks = self.sync_manager.spotify.get_playlist_tracks(playlist_id)
+        return iter([tracks[start:start + 100] for start in range(0, len(tracks), 100)])
+
+    @patch('utils.find_matching_tracks')
+    def test_adds_are_chunked_in_source_order(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist'], 'album': 'Album'} for i in range(250)
+        ]
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+
+        result = self.sync_manager.sync_playlist({'id': '1', 'name': 'Playlist 1'})
+
+        add = self.sync_manager.tidal.add_tracks_to_playlist
+        self.assertEqual(add.call_count, 3)
+        written = [track_id for call in add.call_args_list for track_id in call.args[1]]
+        self.assertEqual(written, ['m' + str(i) for i in range(250)])
+        self.assertEqual(result['added'], 250)
+        self.assertEqual(result['errors'], [])
+
+    @patch('utils.find_matching_tracks')
+    def test_chunk_errors_are_reported(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist'], 'album': 'Album'} for i in range(150)
+        ]
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = [None, Exception("API Error")]
+
+        result = self.sync_manager.sync_playlist({'id': '1', 'name': 'Playlist 1'})
+
+        self.assertEqual(len(result['errors']), 1)
+        self.assertIn("100-149", result['errors'][0])
+        self.assertEqual(result['added'], 100)
+
+    @patch('utils.find_matching_tracks')
+    def test_writes_start_before_last_page(self, mock_find_matching_tracks):
+        first_write = threading.Event()
+
+        def track_pages(playlist_id):
+            yield [{'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(100)]
+            yield [{'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(100, 200)]
+            # Only handed out once the first page has been written
+            self.assertTrue(first_write.wait(timeout=5))
+            yield [{'id': 'last', 'name': 'Last', 'artists': ['Artist']}]
+
+        self.sync_manager.spotify.iter_playlist_track_pages.side_effect = lambda playlist_id: utils.prefetch(
+            track_pages(playlist_id))
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = lambda playlist_id, track_ids: first_write.set()
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+
+        result = self.sync_manager.sync_playlist({'id': '1', 'name': 'Playlist 1'})
+
+        self.assertEqual(result['added'], 201)
+        self.assertEqual(result['errors'], [])
+
+    @patch('utils.find_matching_tracks')
+    def test_steady_state_writes_nothing(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(3)
+        ]
+        # Matches named differently, so only the remembered match ties them together
+        matched = [{'id': 'm' + str(i), 'name': f'Track {i} (Live)', 'artists': ['Band']} for i in range(3)]
+        mock_find_matching_tracks.side_effect = search_results(lambda track: matched[int(track['id'])])
+
+        self.sync_manager.sync_playlist({'id': '1', 'name': 'Playlist 1'})
+        self.sync_manager.tidal.get_playlist_tracks.return_value = matched
+        self.sync_manager.tidal.reset_mock(return_value=False, side_effect=False)
+        mock_find_matching_tracks.reset_mock()
+
+        result = self.sync_manager.sync_playlist({'id': '1', 'name': 'Playlist 1'})
+
+        self.assertEqual((result['added'], result['removed']), (0, 0))
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_not_called()
+        self.sync_manager.tidal.remove_tracks_from_playlist.assert_not_called()
+        mock_find_matching_tracks.assert_not_called()
+
+    @patch('utils.find_matching_tracks')
+    def test_same_isrc_counts_as_present(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': 'a', 'name': 'Track a', 'artists': ['Artist'], 'isrc': 'USRC17607839'}
+        ]
+        self.sync_manager.tidal.get_playlist_tracks.return_value = [
+            {'id': 'x', 'name': 'Track a - Single Version', 'artists': ['Artist'], 'isrc': 'USRC17607839'}
+        ]
+
+        entry = self.sync_manager.plan_playlist({'id': '1', 'name': 'Playlist 1'}, 'spotify')
+
+        self.assertEqual((entry['add'], entry['remove']), ([], []))
+        mock_find_matching_tracks.assert_not_called()
+
+    @patch('utils.find_matching_tracks')
+    def test_library_pass_matches_each_track_once(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(3)
+        ]
+        self.sync_manager.tidal.create_playlist.return_value = 't2'
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+        work = [({'id': '1', 'name': 'Playlist 1'}, 'spotify'), ({'id': '2', 'name': 'Playlist 2'}, 'spotify')]
+
+        report = self.sync_manager.sync_library(work, self.sync_manager.create_snapshot())
+
+        mock_find_matching_tracks.assert_called_once()
+        self.assertEqual([track['id'] for track in mock_find_matching_tracks.call_args.args[0]], ['0', '1', '2'])
+        self.assertEqual([result['added'] for result in report['synced']], [3, 3])
+        self.assertEqual(self.sync_manager.track_lookups, {})
+
+    @patch('src.sync_manager.PREMATCH_BATCH_SIZE', 2)
+    @patch('utils.find_matching_tracks')
+    def test_library_pass_batches_are_capped(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': str(i), 'name': f'Track {i}', 'artists': ['Artist']} for i in range(5)
+        ]
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+
+        pair = {'name': 'Playlist 1', 'spotify': {'id': '1', 'name': 'Playlist 1'},
+                'tidal': {'id': 't1', 'name': 'Playlist 1'}}
+        self.sync_manager.prematch([(pair, 'both')], self.sync_manager.create_snapshot())
+
+        self.assertEqual([len(call.args[0]) for call in mock_find_matching_tracks.call_args_list], [2, 2, 1])
+
+    @patch('utils.find_matching_tracks')
+    def test_plan_then_apply(self, mock_find_matching_tracks):
+        self.sync_manager.spotify.get_playlist_tracks.return_value = [
+            {'id': 'a', 'name': 'Track a', 'artists': ['Artist'], 'album': 'Album'}
+        ]
+        self.sync_manager.tidal.get_playlist_tracks.return_value = [
+            {'id': 'x', 'name': 'Track x', 'artists': ['Artist'], 'album': 'Album'}
+        ]
+        mock_find_matching_tracks.side_effect = search_results(
+            lambda track: {'id': 'ma', 'name': 'Track a', 'artists': ['Artist']})
+
+        entry = self.sync_manager.plan_playlist({'id': '1', 'name': 'Playlist 1'}, 'spotify')
+
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_not_called()
+        self.sync_manager.tidal.remove_tracks_from_playlist.assert_not_called()
+        self.assertEqual(entry['target_id'], 't1')
+        self.assertEqual(entry['remove'], [{'id': 'x', 'name': 'Track x', 'position': 0}])
+        self.assertEqual([track['id'] for track in entry['add']], ['ma'])
+
+        mock_find_matching_tracks.reset_mock()
+        result = self.sync_manager.apply_playlist_plan(entry)
+
+        mock_find_matching_tracks.assert_not_called()
+        self.sync_manager.tidal.remove_tracks_from_playlist.assert_called_once_with('t1', ['x'], [0])
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_called_once_with('t1', ['ma'])
+        self.assertEqual(result['added'], 1)
+        self.assertEqual(result['removed'], 1)
+
+    def test_failed_plan_chunks_are_not_counted(self):
+        entry = {'name': 'Playlist 1', 'source_platform': 'spotify', 'source_id': '1', 'target_platform': 'tidal',
+                 'target_id': 't1', 'target_version': None, 'create': False, 'unmatched': [],
+                 'remove': [{'id': 'x', 'name': 'Track x', 'position': 0}],
+                 'add': [{'id': f'm{i}', 'name': f'Track {i}', 'artists': ['Artist']} for i in range(150)]}
+        self.sync_manager.tidal.remove_tracks_from_playlist.side_effect = Exception("API Error")
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = [Exception("API Error"), None]
+
+        result = self.sync_manager.apply_playlist_plan(entry)
+
+        self.assertEqual(result['added'], 50)
+        self.assertEqual(result['removed'], 0)
+        self.assertEqual(len(result['errors']), 2)
+
+
+class TestSyncPair(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager)
+        self.sync_manager.spotify.write_chunk_size = 100
+        self.sync_manager.tidal.write_chunk_size = 100
+        self.spotify_playlist = {'id': 's1', 'name': 'Mix'}
+        self.tidal_playlist = {'id': 't1', 'name': 'Mix'}
+        self.spotify_tracks = [{'id': 'sa', 'name': 'A', 'artists': ['Artist']},
+                               {'id': 'sb', 'name': 'B', 'artists': ['Artist']}]
+        self.tidal_tracks = [{'id': 'tb', 'name': 'B', 'artists': ['Artist']},
+                             {'id': 'tc', 'name': 'C', 'artists': ['Artist']}]
+        self.sync_manager.spotify.get_playlist_tracks.side_effect = lambda playlist_id: list(self.spotify_tracks)
+        self.sync_manager.tidal.get_playlist_tracks.side_effect = lambda playlist_id: list(self.tidal_tracks)
+
+    @patch('utils.find_matching_tracks')
+    def test_merge_then_steady_state(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+
+        self.sync_manager.sync_pair(self.spotify_playlist, self.tidal_playlist)
+
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_called_once_with('t1', ['msa'])
+        self.sync_manager.spotify.add_tracks_to_playlist.assert_called_once_with('s1', ['mtc'])
+        self.sync_manager.spotify.remove_tracks_from_playlist.assert_not_called()
+        self.sync_manager.tidal.remove_tracks_from_playlist.assert_not_called()
+
+        # Both platforms now hold the merged playlist; the next sync writes nothing
+        self.spotify_tracks.append({'id': 'mtc', 'name': 'C', 'artists': ['Artist']})
+        self.tidal_tracks.append({'id': 'msa', 'name': 'A', 'artists': ['Artist']})
+        self.sync_manager.tidal.reset_mock()
+        self.sync_manager.spotify.reset_mock()
+
+        result = self.sync_manager.sync_pair(self.spotify_playlist, self.tidal_playlist)
+
+        self.assertEqual((result['added'], result['removed']), (0, 0))
+
+    @patch('utils.find_matching_tracks')
+    def test_removal_is_propagated(self, mock_find_matching_tracks):
+        self.sync_manager.db.store_playlist_pair_base('s1', 't1', {
+            'spotify': [dict(track) for track in self.spotify_tracks],
+            'tidal': [{'id': 'ta', 'name': 'A', 'artists': ['Artist']}, {'id': 'tb', 'name': 'B', 'artists': ['Artist']}]
+        })
+        self.tidal_tracks = [{'id': 'ta', 'name': 'A', 'artists': ['Artist']},
+                             {'id': 'tb', 'name': 'B', 'artists': ['Artist']}]
+        del self.spotify_tracks[0]
+
+        self.sync_manager.sync_pair(self.spotify_playlist, self.tidal_playlist)
+
+        self.sync_manager.tidal.remove_tracks_from_playlist.assert_called_once_with('t1', ['ta'], [0])
+        self.sync_manager.spotify.add_tracks_to_playlist.assert_not_called()
+        mock_find_matching_tracks.assert_not_called()
+
+
+class TestSyncMany(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager, jobs=4, spotify_concurrency=2, tidal_concurrency=2)
+
+    def test_failures_are_aggregated(self):
+        def sync_playlist(playlist, source_platform, snapshot=None):
+            if playlist['name'] == 'Broken':
+                raise SyncError("API Error")
+            return {'playlist': playlist['name']}
+
+        work = [({'id': str(i), 'name': f'Playlist {i}'}, 'spotify') for i in range(10)]
+        work.append(({'id': 'x', 'name': 'Broken'}, 'tidal'))
+        with patch.object(self.sync_manager, 'sync_playlist', side_effect=sync_playlist) as mock_sync_playlist:
+            report = self.sync_manager.sync_many(work)
+
+        self.assertEqual(mock_sync_playlist.call_count, 11)
+        self.assertEqual(len(report['synced']), 10)
+        self.assertEqual(report['failed'], [{'playlist': 'Broken', 'platform': 'tidal', 'error': 'API Error'}])
+
+    def test_same_name_synced_in_order(self):
+        calls = []
+        work = [({'id': '1', 'name': 'Mix'}, 'spotify'), ({'id': '2', 'name': 'Mix'}, 'tidal')]
+        with patch.object(self.sync_manager, 'sync_playlist',
+                          side_effect=lambda playlist, platform, snapshot=None: calls.append(platform)):
+            self.sync_manager.sync_many(work)
+        self.assertEqual(calls, ['spotify', 'tidal'])
+
+
+class TestPlaylistVersions(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager)
+        self.spotify_playlists = [{'id': 's1', 'name': 'Mix', 'version': 'snap1'},
+                                  {'id': 's2', 'name': 'Chill', 'version': 'snap2'}]
+        self.tidal_playlists = [{'id': 't1', 'name': 'Mix', 'version': '2024-01-01T00:00:00/3'}]
+
+    def test_everything_is_synced_the_first_time(self):
+        work, skipped = self.sync_manager.select_changed_playlists(self.spotify_playlists, self.tidal_playlists)
+        self.assertEqual([(item['name'], platform) for item, platform in work], [('Mix', 'both'), ('Chill', 'spotify')])
+        self.assertEqual(skipped, [])
+
+    def test_unchanged_pair_is_skipped(self):
+        report = {'synced': [{'playlist': 'Mix', 'errors': []}, {'playlist': 'Chill', 'errors': []}], 'failed': []}
+        self.sync_manager.record_playlist_versions(report, self.spotify_playlists, self.tidal_playlists)
+
+        work, skipped = self.sync_manager.select_changed_playlists(self.spotify_playlists, self.tidal_playlists)
+        self.assertEqual(skipped, ['Mix'])
+        self.assertEqual([(playlist['id'], platform) for playlist, platform in work], [('s2', 'spotify')])
+
+        self.tidal_playlists[0]['version'] = '2024-02-01T00:00:00/4'
+        work, skipped = self.sync_manager.select_changed_playlists(self.spotify_playlists, self.tidal_playlists)
+        self.assertEqual(skipped, [])
+
+    def test_failed_pair_is_not_recorded(self):
+        report = {'synced': [{'playlist': 'Mix', 'errors': ['Error adding tracks']}], 'failed': []}
+        self.sync_manager.record_playlist_versions(report, self.spotify_playlists, self.tidal_playlists)
+        self.assertIsNone(self.sync_manager.db.get_playlist_pair_versions('s1', 't1'))
+
+
+class TestTrackMatches(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager)
+        self.clients = {'spotify': platform_client(), 'tidal': platform_client()}
+        self.operations = [{'op': 'insert', 'position': 0,
+                            'track': {'id': 's1', 'name': 'Song', 'artists': ['Artist']}}]
+
+    @patch('utils.find_matching_tracks')
+    def test_known_matches_need_no_search(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(
+            lambda track: {'id': 't1', 'name': 'Song', 'artists': ['Artist']})
+
+        first = self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        second = self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        mock_find_matching_tracks.assert_called_once()
+        self.assertEqual(first, second)
+        match = self.sync_manager.db.get_track_match('tidal', 't1')
+        self.assertEqual((match['spotify_id'], match['confidence'], match['method']), ('s1', 1.0, 'search'))
+
+    @patch('utils.find_matching_tracks')
+    def test_matches_are_used_both_ways(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(
+            lambda track: {'id': 't1', 'name': 'Song', 'artists': ['Artist']})
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        mock_find_matching_tracks.reset_mock()
+
+        operations = [{'op': 'insert', 'position': 0, 'track': {'id': 't1', 'name': 'Song', 'artists': ['Artist']}}]
+        matches = self.sync_manager.match_tracks(operations, 'tidal', self.clients)
+
+        mock_find_matching_tracks.assert_not_called()
+        self.assertEqual(matches['t1']['id'], 's1')
+
+    @patch('utils.find_matching_tracks')
+    def test_concurrent_lookups_are_coalesced(self, mock_find_matching_tracks):
+        # Kept once settled, so the worker finds it however the threads interleave
+        self.sync_manager.keep_lookups = True
+        track = self.operations[0]['track']
+        owned, _ = self.sync_manager._claim_lookups([track], 'spotify')
+        results = []
+        worker = threading.Thread(target=lambda: results.append(
+            self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)))
+        worker.start()
+
+        match = {'id': 't1', 'name': 'Song', 'artists': ['Artist']}
+        self.sync_manager._settle_lookups(owned, 'spotify', {'s1': match})
+        worker.join()
+
+        self.assertEqual(results, [{'s1': match}])
+        mock_find_matching_tracks.assert_not_called()
+
+    @patch('utils.find_matching_tracks')
+    def test_failed_searches_are_not_stored(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: None)
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        self.assertIsNone(self.sync_manager.db.get_track_match('spotify', 's1'))
+
+    @patch('utils.find_matching_tracks')
+    def test_isrc_lookup_before_search(self, mock_find_matching_tracks):
+        self.clients['spotify'].get_track_isrcs.return_value = {'s1': 'USRC1'}
+        self.clients['tidal'].search_by_isrc.return_value = [{'id': 't1', 'name': 'Song (Remaster)',
+                                                              'artists': ['Artist']}]
+
+        matches = self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        mock_find_matching_tracks.assert_not_called()
+        self.clients['tidal'].search_by_isrc.assert_called_once_with('USRC1')
+        self.assertEqual(matches['s1']['id'], 't1')
+        match = self.sync_manager.db.get_track_match('spotify', 's1')
+        self.assertEqual((match['confidence'], match['method']), (1.0, 'isrc'))
+
+    @patch('utils.find_matching_tracks')
+    def test_local_index_before_search(self, mock_find_matching_tracks):
+        self.sync_manager.catalog_tracks('tidal', [{'id': 't1', 'name': 'Song - Remastered', 'artists': ['Artist']}])
+
+        matches = self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        mock_find_matching_tracks.assert_not_called()
+        self.assertEqual(matches['s1']['id'], 't1')
+        self.assertEqual(self.sync_manager.db.get_track_match('spotify', 's1')['method'], 'index')
+
+    @patch('utils.find_matching_tracks')
+    def test_isrcs_are_hydrated_once(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: None)
+        self.clients['spotify'].get_track_isrcs.return_value = {}
+
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        self.sync_manager.db.clear_track_misses()
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        # The track has no ISRC; that is remembered and it goes straight to text search
+        self.clients['spotify'].get_track_isrcs.assert_called_once_with(['s1'])
+        self.clients['tidal'].search_by_isrc.assert_not_called()
+        self.assertEqual(mock_find_matching_tracks.call_count, 2)
+
+    @patch('utils.find_matching_tracks')
+    def test_misses_are_not_looked_up_again(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: None)
+
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        matches = self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        self.assertEqual(matches, {'s1': None})
+        self.assertEqual(mock_find_matching_tracks.call_count, 1)
+        self.clients['spotify'].get_track_isrcs.assert_called_once()
+
+        # Once the miss expires the track is searched again
+        self.sync_manager.miss_ttl_days = 0
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        self.assertEqual(mock_find_matching_tracks.call_count, 2)
+
+    @patch('utils.find_matching_tracks')
+    def test_failed_searches_are_not_misses(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = lambda tracks, client, limit, threshold: {
+            track['id']: (None, None) for track in tracks}
+
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+        self.sync_manager.match_tracks(self.operations, 'spotify', self.clients)
+
+        self.assertEqual(mock_find_matching_tracks.call_count, 2)
+
+    def test_search_errors_are_not_misses(self):
+        tidal = TidalClient.__new__(TidalClient)
+        tidal.session = MagicMock()
+        tidal.session.search.side_effect = requests.exceptions.ReadTimeout('timed out')
+        self.clients['tidal'] = tidal
+
+        self.assertEqual(self.sync_manager.match_tracks(self.operations, 'spotify', self.clients), {'s1': None})
+
+        self.assertEqual(self.sync_manager.db.get_track_misses('spotify', ['s1'], ''), set())
+
+    def test_clear_misses(self):
+        self.sync_manager.db.store_track_misses('spotify', ['s1', 's2'])
+        self.sync_manager.db.store_track_misses('tidal', ['t1'])
+
+        self.assertEqual(self.sync_manager.db.clear_track_misses('spotify'), 2)
+        self.assertEqual(self.sync_manager.db.get_track_misses('tidal', ['t1'], ''), {'t1'})
+
+
+class TestSyncJournal(unittest.TestCase):
+    def setUp(self):
+        self.sync_manager = build_sync_manager(SyncManager)
+        self.sync_manager.tidal.write_chunk_size = 2
+        self.spotify_tracks = [{'id': s, 'name': s.upper(), 'artists': ['Artist']} for s in ('a', 'b', 'c')]
+        self.tidal_playlists = []
+        self.tidal_tracks = []
+        self.sync_manager.spotify.get_playlists.return_value = [{'id': 's1', 'name': 'Mix'}]
+        self.sync_manager.spotify.get_playlist_tracks.side_effect = lambda playlist_id: list(self.spotify_tracks)
+        self.sync_manager.tidal.get_playlists.side_effect = lambda: list(self.tidal_playlists)
+        self.sync_manager.tidal.get_playlist_tracks.side_effect = lambda playlist_id: list(self.tidal_tracks)
+
+        def create_playlist(name):
+            self.tidal_playlists.append({'id': 't1', 'name': name})
+            return 't1'
+
+        self.sync_manager.tidal.create_playlist.side_effect = create_playlist
+
+    def add_tracks(self, playlist_id, track_ids):
+        self.tidal_tracks += [{'id': track_id, 'name': track_id, 'artists': ['Artist']} for track_id in track_ids]
+
+    @patch('utils.find_matching_tracks')
+    def test_resume_continues_interrupted_run(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+
+        def add_then_crash(playlist_id, track_ids):
+            self.add_tracks(playlist_id, track_ids)
+            raise SystemExit(0)
+
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = add_then_crash
+        with self.assertRaises(SystemExit):
+            self.sync_manager.sync_specific_playlists(['Mix'], journal=True)
+        self.assertEqual([track['id'] for track in self.tidal_tracks], ['ma', 'mb'])
+
+        mock_find_matching_tracks.reset_mock()
+        self.sync_manager.tidal.reset_mock()
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = self.add_tracks
+        report = self.sync_manager.sync_specific_playlists(['Mix'], resume=True)
+
+        self.sync_manager.tidal.create_playlist.assert_not_called()
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_called_once_with('t1', ['mc'])
+        mock_find_matching_tracks.assert_not_called()
+        self.assertEqual(report['failed'], [])
+        self.assertIsNone(self.sync_manager.db.get_unfinished_sync_run())
+
+    @patch('utils.find_matching_tracks')
+    def test_unjournaled_runs_stream_pages(self, mock_find_matching_tracks):
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = self.add_tracks
+        self.sync_manager.spotify.iter_playlist_track_pages.side_effect = lambda playlist_id: iter(
+            [self.spotify_tracks[:2], self.spotify_tracks[2:]])
+
+        report = self.sync_manager.sync_specific_playlists(['Mix'])
+
+        self.sync_manager.spotify.get_playlist_tracks.assert_not_called()
+        self.assertEqual([track['id'] for track in self.tidal_tracks], ['ma', 'mb', 'mc'])
+        self.assertEqual(report['synced'][0]['added'], 3)
+        self.assertIsNone(self.sync_manager.db.get_unfinished_sync_run())
+
+    def delete_after_creating(self, mock_find_matching_tracks, journal):
+        # A playlist a one-way sync created is merged as a pair from then on
+        mock_find_matching_tracks.side_effect = search_results(lambda track: dict(track, id='m' + track['id']))
+        self.sync_manager.tidal.add_tracks_to_playlist.side_effect = self.add_tracks
+        self.sync_manager.spotify.iter_playlist_track_pages.side_effect = lambda playlist_id: iter(
+            [list(self.spotify_tracks)])
+        self.sync_manager.spotify.write_chunk_size = 100
+        self.sync_manager.sync_specific_playlists(['Mix'], journal=journal)
+        self.assertEqual([track['id'] for track in self.tidal_tracks], ['ma', 'mb', 'mc'])
+
+        del self.tidal_tracks[1]
+        self.sync_manager.tidal.add_tracks_to_playlist.reset_mock()
+        report = self.sync_manager.sync_specific_playlists(['Mix'], journal=journal)
+
+        self.sync_manager.tidal.add_tracks_to_playlist.assert_not_called()
+        self.sync_manager.spotify.remove_tracks_from_playlist.assert_called_once_with('s1', ['b'], [1])
+        self.assertEqual((report['synced'][0]['added'], report['synced'][0]['removed']), (0, 1))
+
+    @patch('utils.find_matching_tracks')
+    def test_deletion_after_streamed_creation_is_synced(self, mock_find_matching_tracks):
+        self.delete_after_creating(mock_find_matching_tracks, journal=False)
+
+    @patch('utils.find_matching_tracks')
+    def test_deletion_after_planned_creation_is_synced(self, mock_find_matching_tracks):
+        self.delete_after_creating(mock_find_matching_tracks, journal=True)
+
+    def test_completed_items_are_skipped_on_resume(self):
+        run_id = self.sync_manager.db.start_sync_run()
+        self.sync_manager.db.store_journal_item(run_id, 'spotify:s1', 'Mix', 'completed', entries=[],
+                                                result={'playlist': 'Mix', 'errors': []})
+
+        report = self.sync_manager.sync_specific_playlists(['Mix'], resume=True)
+
+        self.assertEqual(report['synced'][0]['added'], 0)
+        self.sync_manager.spotify.get_playlist_tracks.assert_not_called()
+        self.sync_manager.tidal.create_playlist.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import sync_plan
+
+
+def entry(platform, create=False, adds=0, removes=0):
+    return {'name': 'Mix', 'target_platform': platform, 'create': create,
+            'add': [{'id': str(i)} for i in range(adds)],
+            'remove': [{'id': str(i), 'position': i} for i in range(removes)],
+            'unmatched': []}
+
+
+class TestSyncPlan(unittest.TestCase):
+    def setUp(self):
+        self.spotify = MagicMock()
+        self.spotify.estimate_write_calls.return_value = 4
+        self.tidal = MagicMock()
+        self.tidal.estimate_write_calls.return_value = 10
+        self.clients = {'spotify': self.spotify, 'tidal': self.tidal}
+
+    def test_estimate_cost(self):
+        entries = [entry('spotify', create=True, adds=150), entry('tidal', removes=3)]
+        estimate = sync_plan.estimate_cost(entries, self.clients, {'spotify': 2.0, 'tidal': 5.0})
+
+        self.spotify.estimate_write_calls.assert_called_once_with(True, 150, 0)
+        self.tidal.estimate_write_calls.assert_called_once_with(False, 0, 3)
+        self.assertEqual(estimate['api_calls'], 14)
+        self.assertEqual(estimate['seconds'], 4.0)
+        self.assertEqual(estimate['platforms']['spotify'], {'api_calls': 4, 'seconds': 2.0})
+
+        parallel = sync_plan.estimate_cost(entries, self.clients, {'spotify': 2.0, 'tidal': 5.0}, parallel=True)
+        self.assertEqual(parallel['seconds'], 2.0)
+
+    def test_save_and_load(self):
+        plan = sync_plan.create_plan([entry('tidal', adds=2)], [], {'api_calls': 1, 'seconds': 0.2})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'plan.json')
+            sync_plan.save_plan(plan, path)
+            self.assertEqual(sync_plan.load_plan(path), plan)
+        self.assertIn("2 tracks to add", sync_plan.summarize_plan(plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -59,12 +59,12 @@ class TestTidalClient(unittest.TestCase):
     @patch('tidalapi.Session')
     def test_add_tracks_to_playlist(self, mock_session):
         self.tidal_client.add_tracks_to_playlist('playlist_id', ['track_id'])
-        mock_session.return_value.playlist.return_value.add.assert_called_once_with(['track_id'])
+        mock_session.return_value.playlist.return_value.add.assert_called_once_with(['track_id'], allow_duplicates=True)
 
     @patch('tidalapi.Session')
     def test_remove_tracks_from_playlist(self, mock_session):
-        self.tidal_client.remove_tracks_from_playlist('playlist_id', ['track_id'])
-        mock_session.return_value.playlist.return_value.remove_by_id.assert_called_once_with('track_id')
+        self.tidal_client.remove_tracks_from_playlist('playlist_id', ['track_id'], [3])
+        mock_session.return_value.playlist.return_value.remove_by_indices.assert_called_once_with([3])
 
     @patch('tidalapi.Session')
     def test_create_playlist(self, mock_session):
@@ -95,5 +95,106 @@ class TestTidalClient(unittest.TestCase):
         self.assertEqual(len(tracks), 1)
         self.assertEqual(tracks[0]['name'], 'Track 1')
 
+class TestTidalTrackPages(unittest.TestCase):
+    def test_pages_are_read_from_raw_json(self):
+        client = TidalClient.__new__(TidalClient)
+        client.track_page_size = 2
+        client.session = MagicMock()
+        pages = [[{'id': 1, 'title': 'A', 'artists': [{'name': 'X'}], 'album': {'title': 'Al'}, 'isrc': 'I1',
+                   'duration': 100},
+                  {'id': 2, 'title': 'B', 'artists': [{'name': 'X'}], 'album': {'title': 'Al'}, 'isrc': None,
+                   'duration': 120}],
+                 [{'id': 3, 'title': 'C', 'artists': [{'name': 'Y'}], 'album': None, 'duration': 90}]]
+        client.page_workers = 2
+        client.session.request.request.return_value.json.side_effect = [
+            {'items': page, 'totalNumberOfItems': 3} for page in pages]
+
+        tracks = client.get_playlist_tracks('p1')
+
+        self.assertEqual([(track['id'], track['name'], track['artists']) for track in tracks],
+                         [(1, 'A', ('X',)), (2, 'B', ('X',)), (3, 'C', ('Y',))])
+        self.assertEqual(client.session.request.request.call_args.kwargs['params'], {'limit': 2, 'offset': 2})
+        client.session.playlist.assert_not_called()
+
+
+class TestTidalRemovals(unittest.TestCase):
+    def setUp(self):
+        self.client = TidalClient.__new__(TidalClient)
+        self.client.write_chunk_size = 50
+        self.client.removal_batch_size = 2
+        self.client.session = MagicMock()
+        self.playlist = self.client.session.playlist.return_value
+
+    def test_positions_are_removed_in_batches_highest_first(self):
+        self.client.remove_tracks_from_playlist('p1', ['a', 'b', 'c', 'd', 'e'], [4, 0, 7, 2, 9])
+
+        self.assertEqual([call.args[0] for call in self.playlist.remove_by_indices.call_args_list],
+                         [[9, 7], [4, 2], [0]])
+        self.playlist.remove_by_id.assert_not_called()
+
+    def test_positions_are_found_in_one_read(self):
+        tracks = [{'id': 1}, {'id': 2}, {'id': 1}, {'id': 3}]
+        with patch.object(self.client, 'get_playlist_tracks', return_value=tracks) as mock_get_playlist_tracks:
+            self.client.remove_tracks_from_playlist('p1', [1, '3'])
+
+        mock_get_playlist_tracks.assert_called_once_with('p1')
+        self.playlist.remove_by_indices.assert_called_once_with([3, 0])
+
+    def test_estimate_counts_batches(self):
+        self.assertEqual(self.client.estimate_write_calls(False, 0, 5), 1 + 2 * 3)
+        self.assertEqual(self.client.estimate_write_calls(True, 120, 0), 1 + 3 * 3)
+
+    @patch.object(TidalClient, 'login')
+    def test_write_chunks_are_capped(self, mock_login):
+        client = TidalClient({'tidal': {'write_chunk_size': 500}}, MagicMock())
+        self.assertEqual(client.write_chunk_size, 100)
+
+
+class TestTidalCollections(unittest.TestCase):
+    def setUp(self):
+        self.client = TidalClient.__new__(TidalClient)
+        self.client.collection_page_size = 2
+        self.client.page_workers = 3
+        self.client.session = MagicMock()
+        self.client.session.user.id = 42
+
+    def respond(self, total, item):
+        def request(method, path, params):
+            offset = params['offset']
+            return MagicMock(**{'json.return_value': {
+                'items': [item(i) for i in range(offset, min(offset + params['limit'], total))],
+                'totalNumberOfItems': total}})
+        self.client.session.request.request.side_effect = request
+
+    def test_playlists_are_paged_by_offset(self):
+        self.respond(5, lambda i: {'uuid': f'p{i}'})
+        self.client.session.parse_playlist.side_effect = lambda item: MagicMock(
+            id=item['uuid'], num_tracks=1, last_updated=None)
+
+        playlists = self.client.get_playlists()
+
+        self.assertEqual([playlist['id'] for playlist in playlists], ['p0', 'p1', 'p2', 'p3', 'p4'])
+        offsets = sorted(call.kwargs['params']['offset'] for call in self.client.session.request.request.call_args_list)
+        self.assertEqual(offsets, [0, 2, 4])
+        self.assertEqual(self.client.session.request.request.call_args.args[1], 'users/42/playlists')
+
+    def test_favorite_tracks(self):
+        self.respond(3, lambda i: {'item': {'id': i, 'title': f'Track {i}', 'artists': [{'name': 'X'}]}})
+
+        tracks = self.client.get_favorite_tracks()
+
+        self.assertEqual([track['id'] for track in tracks], [0, 1, 2])
+
+    def test_favorite_playlists(self):
+        self.respond(3, lambda i: {'item': {'uuid': f'p{i}'}})
+        self.client.session.parse_playlist.side_effect = lambda item: MagicMock(
+            id=item['uuid'], num_tracks=1, last_updated=None)
+
+        playlists = self.client.get_favorite_playlists()
+
+        self.assertEqual([playlist['id'] for playlist in playlists], ['p0', 'p1', 'p2'])
+        self.assertEqual(self.client.session.request.request.call_args.args[1], 'users/42/favorites/playlists')
+
+
 if __name__ == '__main__':
     unittest.main()
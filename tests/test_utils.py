@@ -40,5 +40,31 @@ class TestUtils(unittest.TestCase):
         self.assertIsNotNone(timestamp)
         self.assertIsInstance(timestamp, str)
 
+    def test_prefetch_yields_items_in_order(self):
+        self.assertEqual(list(utils.prefetch(iter(range(5)), depth=2)), [0, 1, 2, 3, 4])
+
+    def test_prefetch_reraises_errors(self):
+        def pages():
+            yield 1
+            raise ValueError("Page error")
+
+        with self.assertRaises(ValueError):
+            list(utils.prefetch(pages()))
+
+    def test_offset_pages_are_requested_workers_ahead(self):
+        requested = []
+
+        def fetch_page(offset):
+            requested.append(offset)
+            return {'offset': offset, 'total': 100}
+
+        pages = utils.offset_pages(fetch_page, 10, lambda page: page['total'], 2)
+        seen = []
+        for page in pages:
+            seen.append(page['offset'])
+            # The page just yielded and at most two more have been asked for
+            self.assertLessEqual(len(requested), len(seen) + 2)
+        self.assertEqual(seen, list(range(0, 100, 10)))
+
 if __name__ == '__main__':
     unittest.main()
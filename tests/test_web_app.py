@@ -0,0 +1,26 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import web_app
+from models import Playlist
+
+
+class TestWebApp(unittest.TestCase):
+    def setUp(self):
+        self.client = web_app.app.test_client()
+
+    @patch('web_app.get_sync_manager')
+    def test_playlists_are_served_as_json(self, mock_get_sync_manager):
+        sync_manager = MagicMock()
+        sync_manager.tidal.session.check_login.return_value = True
+        sync_manager.refresh_playlists.return_value = [Playlist('p1', 'Mix', 3, 'v1')]
+        mock_get_sync_manager.return_value = sync_manager
+
+        for response in (self.client.get('/tidal_playlists'),
+                         self.client.post('/refresh_playlists', json={'platform': 'tidal'})):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), [{'id': 'p1', 'name': 'Mix', 'tracks': 3, 'version': 'v1'}])
+
+
+if __name__ == '__main__':
+    unittest.main()